@@ -61,8 +61,9 @@ class PawsAPI(object):
  
     def activate_op(self,op_uri):
         """
-        Import the Operation indicated by op_uri, and tag it as active.
-        The Operation becomes available to add to workflows via paws.api.add_op()
+        Tag the Operation indicated by op_uri as active.
+        The Operation becomes available to add to workflows via paws.api.add_op(),
+        and its module is imported when it is first added.
         """
         self._op_manager.set_op_enabled(op_uri)
 
@@ -128,7 +129,7 @@ class PawsAPI(object):
         if ops.load_flags[op_spec]:
             wf = self.get_wf(wfname)
             # get the op referred to by op_spec
-            op = self._op_manager.get_data_from_uri(op_spec)
+            op = self._op_manager.get_op(op_spec)
             # instantiate with default inputs
             op = op()
             op.load_defaults()
@@ -220,7 +221,7 @@ class PawsAPI(object):
         if tp == opmod.no_input: 
             val = None
         il = opmod.InputLocator(tp,val)
-        op.input_locator[input_name] = il
+        self.get_wf(wfname).set_input_locator(opname,input_name,il)
 
     def get_input_data(self,opname,input_name,wfname=None):
         if wfname is None:
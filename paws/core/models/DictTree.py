@@ -27,7 +27,11 @@ class DictTree(object):
         self.bad_chars = self.bad_chars.replace('-','')
         self.bad_chars = self.bad_chars.replace('.','')
         self.space_chars = [' ','\t','\n',os.linesep]
-        self._all_uris = []
+        # set of all uris that have been set in the tree,
+        # and a dict mapping each parent uri ('' for the root) 
+        # to the set of its child uris, for deleting subtrees
+        self._all_uris = set()
+        self._child_uris = {}
 
     def __getitem__(self,uri):
         return self.get_from_uri(uri)
@@ -41,9 +45,8 @@ class DictTree(object):
     def delete_uri(self,uri=''):
         """
         Delete the given uri, i.e., 
-        remove the corresponding key from the embedded dict.
-        This should not be relied on to be fast.
-        It has to go through all of the uris to remove children.
+        remove the corresponding key from the embedded dict,
+        along with the uris of all of its children.
         """
         try:
             itm = self._root
@@ -55,9 +58,7 @@ class DictTree(object):
                 # Note- parent items must implement __getitem__
                 del itm[k]
                 #itm.pop(k)
-                for i,testuri in zip(range(len(self._all_uris))[::-1],self._all_uris[::-1]):
-                    if uri in testuri:
-                        self._all_uris.pop(i)
+                self.unregister_uri(uri)
         except Exception as ex:
             msg = str('\n[{}] Encountered an error while trying to delete uri {}: \n'
             .format(__name__,uri))
@@ -82,12 +83,40 @@ class DictTree(object):
                     # Note- parent items must implement __setitem__
                     itm[k] = val
                 if not uri in self._all_uris:
-                    self._all_uris.append(uri)
+                    self.register_uri(uri)
         except Exception as ex:
             msg = str('\n[{}] Encountered an error while trying to set uri {} to val {}: \n'
             .format(__name__,uri,val)) + ex.message
             raise KeyError(msg)
 
+    def register_uri(self,uri):
+        """
+        Add uri to the set of uris in the tree,
+        and link it (and any unlinked parents) to its parent uri.
+        """
+        self._all_uris.add(uri)
+        while '.' in uri:
+            parent_uri = uri[:uri.rfind('.')]
+            child_uris = self._child_uris.setdefault(parent_uri,set())
+            if uri in child_uris:
+                return
+            child_uris.add(uri)
+            uri = parent_uri
+        self._child_uris.setdefault('',set()).add(uri)
+
+    def unregister_uri(self,uri):
+        """Remove uri and all of its child uris from the set of uris in the tree."""
+        parent_uri = ''
+        if '.' in uri:
+            parent_uri = uri[:uri.rfind('.')]
+        if parent_uri in self._child_uris:
+            self._child_uris[parent_uri].discard(uri)
+        rm_uris = [uri]
+        while any(rm_uris):
+            rm_uri = rm_uris.pop()
+            self._all_uris.discard(rm_uri)
+            rm_uris.extend(self._child_uris.pop(rm_uri,[]))
+
     def get_from_uri(self,uri=''):
         """
         Return the data stored at uri.
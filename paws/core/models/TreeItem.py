@@ -6,12 +6,17 @@ class TreeItem(object):
     It is labeled by a tag (TreeItem.tag)
     which must be unique across its sibling TreeItems.
     A root TreeItem should have None as its parent item.
+    Children are also indexed by tag,
+    so that they can be looked up without scanning the list.
+    TreeItem.children should not be modified directly-
+    use insert_child(), pop_child() and retain_children().
     """
 
     def __init__(self,parent_itm,tag):
         super(TreeItem,self).__init__()
         self.parent = parent_itm 
         self.children = []      # list of child TreeItems
+        self.child_rows = {}    # dict of child tags to their rows in self.children
         self.flags = {}         # dict for any added functionality (e.g. toggles, etc) 
         self.tag = tag          # string tag for indexing and display
         #self.data = None       # TreeItem contains a single object as its data 
@@ -19,6 +24,60 @@ class TreeItem(object):
     def n_children(self):
         return len(self.children)
 
+    def has_child(self,tag):
+        return tag in self.child_rows
+
+    def child(self,tag):
+        """Return the child TreeItem labeled by tag."""
+        return self.children[self.child_row(tag)]
+
+    def child_row(self,tag):
+        """
+        Return the row of the child TreeItem labeled by tag.
+        Raises a ValueError if there is no such child,
+        as children.index() would.
+        """
+        if not tag in self.child_rows:
+            raise ValueError('{} is not a child of {}'.format(tag,self.tag))
+        return self.child_rows[tag]
+
+    def insert_child(self,itm,row=None):
+        """
+        Insert TreeItem itm as a child at the given row
+        (default: after the last row).
+        """
+        if row is None or row == len(self.children):
+            self.child_rows[itm.tag] = len(self.children)
+            self.children.append(itm)
+        else:
+            self.children.insert(row,itm)
+            self.reindex_children(row)
+
+    def pop_child(self,row):
+        """
+        Remove and return the child TreeItem at the given row.
+        Removing the last row is O(1),
+        other rows require re-indexing the rows below them.
+        """
+        itm = self.children.pop(row)
+        self.child_rows.pop(itm.tag)
+        if row < len(self.children):
+            self.reindex_children(row)
+        return itm
+
+    def retain_children(self,tags):
+        """
+        Remove all children whose tags are not in tags
+        (which should support fast membership testing, e.g. a dict or set).
+        """
+        self.children = [c for c in self.children if c.tag in tags]
+        self.child_rows = {}
+        self.reindex_children()
+
+    def reindex_children(self,start_row=0):
+        for row in range(start_row,len(self.children)):
+            self.child_rows[self.children[row].tag] = row
+
     def build_uri(self):
         """
         Return the TreeModel uri of this TreeItem
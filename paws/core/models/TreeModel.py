@@ -56,9 +56,7 @@ class TreeModel(object):
         # remove the corresponding subtree or TreeItem.
         itm = self.get_from_uri(itm_uri)
         parent_itm = itm.parent 
-        child_keys = [c.tag for c in parent_itm.children]
-        rm_row = child_keys.index(itm.tag)
-        parent_itm.children.pop(rm_row)
+        parent_itm.pop_child(parent_itm.child_row(itm.tag))
 
     def tree_update(self,parent_itm,itm_tag,itm_data):
         """
@@ -71,24 +69,18 @@ class TreeModel(object):
         before passing it as an argument,
         so only need to recurse if itm_data is a dict.
         """
-        child_keys = [c.tag for c in parent_itm.children]
-        if itm_tag in child_keys:
-            # Find the row of existing itm_tag under parent,
-            itm_row = child_keys.index(itm_tag)
-            itm = parent_itm.children[itm_row]
+        if parent_itm.has_child(itm_tag):
+            # Find the existing itm_tag under parent,
+            itm = parent_itm.child(itm_tag)
             # Remove any grandchildren that do not represent the new data
-            new_keys = []
+            new_keys = {}
             if isinstance(itm_data,dict):
-                new_keys = itm_data.keys()
-            for gc_row in range(itm.n_children())[::-1]:
-                gc_itm = itm.children[gc_row]
-                if not gc_itm.tag in new_keys:
-                    itm.children.pop(gc_row) 
+                new_keys = itm_data
+            itm.retain_children(new_keys)
         else:
             # Put a new TreeItem at the end row
-            itm_row = parent_itm.n_children()
             itm = self.create_tree_item(parent_itm,itm_tag)
-            parent_itm.children.insert(itm_row,itm)
+            parent_itm.insert_child(itm)
         # If needed, recurse on itm_data.
         if isinstance(itm_data,dict):
             for tag,val in itm_data.items():
@@ -123,12 +115,10 @@ class TreeModel(object):
             path = uri.split('.')
             itm = self._root_item
             for k in path[:-1]:
-                child_keys = [c.tag for c in itm.children]
-                itm = itm.children[child_keys.index(k)]
+                itm = itm.child(k)
             k = path[-1]
             if k:
-                child_keys = [c.tag for c in itm.children]
-                return itm.children[child_keys.index(k)]
+                return itm.child(k)
             elif k == '':
                 return itm 
         except Exception as ex:
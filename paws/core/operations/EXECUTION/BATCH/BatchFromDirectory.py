@@ -1,10 +1,9 @@
-from collections import OrderedDict
 import glob
 import os
 
 from ...Operation import Operation
 from ... import Operation as opmod 
-from ... import optools
+from ....workflow import wftools
 
 class BatchFromDirectory(Operation):
     """
@@ -16,16 +15,35 @@ class BatchFromDirectory(Operation):
     """
 
     def __init__(self):
-        input_names = ['dir_path','regex','workflow','input_name']
+        input_names = ['dir_path','regex','workflow','input_name','n_workers','chunk_size',
+        'data_input_name','prefetch','prefetch_reader']
         output_names = ['batch_inputs','batch_outputs']
         super(BatchFromDirectory,self).__init__(input_names,output_names)
         self.input_doc['dir_path'] = 'path to directory containing batch of files to be used as input'
         self.input_doc['regex'] = 'string with * wildcards that will be substituted to indicate input files'
         self.input_doc['workflow'] = 'the Workflow to be executed'
         self.input_doc['input_name'] = 'name of the workflow input where the file paths will be used'
+        self.input_doc['n_workers'] = str('number of worker processes- '
+        + 'if greater than 1, each worker runs its own copy of the workflow, '
+        + 'and the Operations of the workflow itself are not updated')
+        self.input_doc['chunk_size'] = 'number of files sent to a worker process at a time'
+        self.input_doc['data_input_name'] = str('name of the workflow input where image data will be used- '
+        + 'if given, each file is read with prefetch_reader, '
+        + 'and the image data is fed to the workflow along with the file path. '
+        + 'Only supported if n_workers is 1')
+        self.input_doc['prefetch'] = str('number of files to read ahead on background threads '
+        + 'while the workflow runs, if data_input_name is given (0 to read each file when it is used)')
+        self.input_doc['prefetch_reader'] = str('image reader for data_input_name: '
+        + '"tifffile" (as LoadTif), "fabio" (as FabIOOpen), '
+        + 'or "PIL" (as LoadTif_PIL, giving a tuple of image data and metadata)')
         self.output_doc['batch_inputs'] = 'list of dicts of [input_name:input_value]'
         self.output_doc['batch_outputs'] = 'list of dicts of [output_name:output_value] for all Workflow outputs'
         self.input_type['workflow'] = opmod.entire_workflow
+        self.inputs['n_workers'] = 1
+        self.inputs['chunk_size'] = 1
+        self.inputs['data_input_name'] = None
+        self.inputs['prefetch'] = 0
+        self.inputs['prefetch_reader'] = 'tifffile'
         self.inputs['regex'] = '*.tif' 
         
     def run(self):
@@ -34,19 +52,9 @@ class BatchFromDirectory(Operation):
         rx = self.inputs['regex']
         inpname = self.inputs['input_name']
         batch_list = glob.glob(os.path.join(dirpath,rx))
-        input_dict_list = []
-        output_dict_list = []
-        n_batch = len(batch_list)
-        wf.write_log('STARTING BATCH')
-        for i,filename in zip(range(n_batch),batch_list):
-            inp_dict = OrderedDict() 
-            inp_dict[inpname] = filename
-            wf.set_wf_input(inpname,filename)
-            wf.write_log('BATCH RUN {} / {}'.format(i+1,n_batch))
-            wf.execute()
-            input_dict_list.append(inp_dict)
-            output_dict_list.append(wf.wf_outputs_dict())
-        wf.write_log('BATCH FINISHED')
+        input_dict_list,output_dict_list = wftools.run_file_batch(wf,batch_list,inpname,
+        self.inputs['n_workers'],self.inputs['chunk_size'],self.inputs['data_input_name'],
+        self.inputs['prefetch'],self.inputs['prefetch_reader'])
         self.outputs['batch_inputs'] = input_dict_list
         self.outputs['batch_outputs'] = output_dict_list 
 
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+
+from ...Operation import Operation
+from ... import Operation as opmod 
+from ....tools import h5tools
+
+class BatchFromHDF5Stack(Operation):
+    """
+    Use the frames of a stack in an HDF5 (or NeXus) file as inputs
+    for the repeated execution of a specified Workflow.
+    The file is opened once, and each frame is read from it in turn.
+    Specify, by workflow input name, where the frame index 
+    (and, optionally, the frame data) will be fed to the workflow.
+    Collect outputs from the Workflow for each of the frames.
+    """
+
+    def __init__(self):
+        input_names = ['file_path','dataset','frames','workflow','input_name','data_input_name']
+        output_names = ['batch_inputs','batch_outputs']
+        super(BatchFromHDF5Stack,self).__init__(input_names,output_names)
+        self.input_doc['file_path'] = 'path to an HDF5 file'
+        self.input_doc['dataset'] = 'path to the dataset in the HDF5 file, with frames indexed by the first axis'
+        self.input_doc['frames'] = str('range of frames to use '
+        + 'as a [start,stop,step] list or a "start:stop:step" string, '
+        + 'or a single frame index (negative to count from the end)- if None, all frames are used')
+        self.input_doc['workflow'] = 'the Workflow to be executed'
+        self.input_doc['input_name'] = 'name of the workflow input where the frame indices will be used'
+        self.input_doc['data_input_name'] = str('name of the workflow input where the frame data will be used- '
+        + 'if None, the workflow is expected to read the frame itself, e.g. with HDF5StackRead')
+        self.output_doc['batch_inputs'] = 'list of dicts of [input_name:input_value]'
+        self.output_doc['batch_outputs'] = 'list of dicts of [output_name:output_value] for all Workflow outputs'
+        self.input_type['workflow'] = opmod.entire_workflow
+        self.inputs['dataset'] = 'entry/data/data'
+        self.inputs['frames'] = None
+        self.inputs['data_input_name'] = None
+
+    def run(self):
+        wf = self.inputs['workflow']
+        p = self.inputs['file_path']
+        dset = self.inputs['dataset']
+        inpname = self.inputs['input_name']
+        datname = self.inputs['data_input_name']
+        n_frames = h5tools.n_frames(p,dset)
+        frame_range = h5tools.frame_index(self.inputs['frames'],n_frames)
+        if not isinstance(frame_range,slice):
+            frame_range = slice(frame_range,frame_range+1)
+        batch_list = range(*frame_range.indices(n_frames))
+        input_dict_list = []
+        output_dict_list = []
+        n_batch = len(batch_list)
+        wf.write_log('STARTING BATCH')
+        plan = wf.compile()
+        try:
+            for i,idx in zip(range(n_batch),batch_list):
+                inp_dict = OrderedDict() 
+                inp_dict[inpname] = idx
+                input_dict_list.append(inp_dict)
+                plan.set_input(inpname,idx)
+                if datname is not None:
+                    plan.set_input(datname,h5tools.read_frames(p,dset,idx))
+                wf.write_log('BATCH RUN {} / {}'.format(i+1,n_batch))
+                plan.execute()
+                output_dict_list.append(plan.wf_outputs_dict())
+        finally:
+            # do not hold the file open after the batch
+            h5tools.close_h5(p)
+        plan.store()
+        wf.write_log('BATCH FINISHED')
+        self.outputs['batch_inputs'] = input_dict_list
+        self.outputs['batch_outputs'] = output_dict_list
+
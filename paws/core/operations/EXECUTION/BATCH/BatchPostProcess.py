@@ -41,15 +41,18 @@ class BatchPostProcess(Operation):
         out_dict_list = []
         n_batch = len(out_list)
         wf.write_log('STARTING BATCH')
-        for d_out in out_list:
+        plan = wf.compile()
+        for i,d_out in zip(range(n_batch),out_list):
             inp_dict = OrderedDict() 
             for kout,kin in zip(out_keys,inp_keys):
                 inp_dict[kin] = d_out[kout]
-                wf.set_wf_input(kin,d_out[kout])
+                plan.set_input(kin,d_out[kout])
             wf.write_log('BATCH RUN {} / {}'.format(i+1,n_batch))
-            wf.execute()
+            plan.execute()
             inp_dict_list.append(inp_dict)
-            out_dict_list.append(wf.wf_outputs_dict())
+            out_dict_list.append(plan.wf_outputs_dict())
+        plan.store()
+        wf.write_log('BATCH FINISHED')
         self.outputs['batch_inputs'] = inp_dict_list
         self.outputs['batch_outputs'] = out_dict_list 
 
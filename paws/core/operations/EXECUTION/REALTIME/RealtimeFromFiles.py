@@ -1,101 +1,125 @@
-from ... import Operation as opmod 
-from ...Operation import Realtime 
+from ...Operation import Operation
+from ... import Operation as opmod
 from ... import optools
+from ....workflow.RealtimePipeline import RealtimePipeline
+from ....tools import imgtools
 
-class RealtimeFromFiles(Realtime):
+class RealtimeFromFiles(Operation):
     """
     Provides inputs to be used in repeated execution of a workflow
     from files with names matching a regex, as they arrive in a specified directory.
     Collects the outputs produced for each of the inputs.
+    File discovery, image reading, and workflow execution
+    run as a pipeline with bounded queues between the stages.
+    Only the inputs and outputs of the latest max_outputs files are kept.
+    Call stop() from another thread to end the run.
     """
 
+    # outputs depend on which files arrive during the run
+    cacheable = False
+
     def __init__(self):
-        input_names = ['dir_path','regex','new_files_only','input_route','realtime_ops','saved_items']
-        output_names = ['realtime_inputs','realtime_outputs']
+        input_names = ['dir_path','regex','new_files_only','workflow','input_name','data_input_name',
+        'queue_size','backpressure','max_files','max_outputs','idle_timeout','settle_time','header_ext']
+        output_names = ['realtime_inputs','realtime_outputs','metrics']
         super(RealtimeFromFiles,self).__init__(input_names,output_names)
         self.input_doc['dir_path'] = 'path to directory where files will be written and then used as input'
         self.input_doc['regex'] = 'string with * wildcards used to filter or locate input files'
         self.input_doc['new_files_only'] = 'if true, ignore existing files and only process new arrivals'
-        self.input_doc['input_route'] = 'inputs constructed by the realtime executor are directed to this uri'
-        self.input_doc['realtime_ops'] = str('list of ops to be included in the realtime execution- '
-        + 'the order of operations in realtime_ops is unimportant, as the proper execution stack is resolved at runtime')
-        self.input_doc['saved_items'] = 'list of ops to be saved in the realtime_outputs'
-        self.output_doc['realtime_inputs'] = str('iterator over dicts of [input_route:input_value] '
-        + 'generated in real time from the local filesystem')
-        self.output_doc['realtime_outputs'] = 'list of dicts of [output_route:output_value]'
-        self.input_src['dir_path'] = opmod.fs_input
-        self.input_src['regex'] = opmod.text_input 
-        self.input_src['new_files_only'] = opmod.text_input 
-        self.input_src['input_route'] = opmod.wf_input 
-        self.input_src['realtime_ops'] = opmod.wf_input 
-        self.input_src['saved_items'] = opmod.wf_input 
-        self.input_type['dir_path'] = opmod.path_type
-        self.input_type['regex'] = opmod.str_type
-        self.input_type['new_files_only'] = opmod.bool_type
-        self.input_type['input_route'] = opmod.path_type
-        self.input_type['realtime_ops'] = opmod.path_type 
-        self.input_type['saved_items'] = opmod.path_type 
-        self.inputs['regex'] = '*.tif' 
-        self.inputs['new_files_only'] = True 
-        self.inputs['realtime_ops'] = []
-        self.inputs['saved_items'] = []
-        
-    def run(self):
-        """
-        This should create an iterator 
-        whose next() gives a {uri:value} dict 
-        built from the latest-arrived file 
-        """
-        dirpath = self.inputs['dir_path']
-        rx = self.inputs['regex']
-        inproute = self.inputs['input_route']
-        process_existing_files = not self.inputs['new_files_only']
-        self.outputs['realtime_inputs'] = optools.FileSystemIterator(dirpath,rx,process_existing_files)
-        self.outputs['realtime_outputs'] = [] 
-
-    def input_iter(self):
-        return self.outputs['realtime_inputs']
-
-    def output_list(self):
-        return self.outputs['realtime_outputs']
-
-    def input_routes(self):
-        """Use the Realtime.input_locators to list uri's of all input routes- must return list."""
-        if isinstance(self.inputs['input_route'],list):
-            return self.inputs['input_route']
-        else:
-            return [self.inputs['input_route']]
-
-    def batch_ops(self):
-        """Use the Realtime.input_locator to list uri's of ops to be saved/stored after execution"""
-        if isinstance(self.inputs['realtime_ops'],list):
-            return self.inputs['realtime_ops']
-        else:
-            return [self.inputs['realtime_ops']]
+        self.input_doc['workflow'] = 'the Workflow to be executed'
+        self.input_doc['input_name'] = 'name of the workflow input where the file paths will be used'
+        self.input_doc['data_input_name'] = str('name of the workflow input where image data will be used- '
+        + 'if given, each file is read on a background thread, '
+        + 'and the image data is fed to the workflow along with the file path')
+        self.input_doc['queue_size'] = 'maximum number of files waiting between pipeline stages'
+        self.input_doc['backpressure'] = str('what to do when the workflow falls behind: '
+        + '"block" processes every file, '
+        + '"drop_oldest" skips the oldest waiting files, '
+        + '"latest" always skips ahead to the newest file')
+        self.input_doc['max_files'] = 'stop after this many files (no limit if None)'
+        self.input_doc['max_outputs'] = str('keep the inputs and outputs of only this many of the latest files '
+        + '(all files if None)')
+        self.input_doc['idle_timeout'] = 'stop after this many seconds without a new file (no limit if None)'
+        self.input_doc['settle_time'] = str('seconds that the size of a file must be unchanged '
+        + 'before it is used, when the file system can not report that the file was closed')
+        self.input_doc['header_ext'] = str('if given (e.g. ".txt"), each file is only used '
+        + 'once a header file with the same name and this extension is also written')
+        self.output_doc['realtime_inputs'] = 'list of dicts of [input_name:input_value] for the latest files'
+        self.output_doc['realtime_outputs'] = str('list of dicts of [output_name:output_value] '
+        + 'for all Workflow outputs, for the latest files')
+        self.output_doc['metrics'] = 'dict of pipeline metrics: file counts, queue depths, and lags in seconds'
+        self.input_type['workflow'] = opmod.entire_workflow
+        self.inputs['regex'] = '*.tif'
+        self.inputs['new_files_only'] = True
+        self.inputs['queue_size'] = 8
+        self.inputs['backpressure'] = 'block'
+        self.inputs['max_files'] = None
+        self.inputs['max_outputs'] = 100
+        self.inputs['idle_timeout'] = 60.
+        self.inputs['settle_time'] = 0.2
+        self.inputs['header_ext'] = None
+        # the RealtimePipeline, while run() is running
+        self._pipeline = None
 
-    def saved_items(self):
-        """Use the Realtime.input_locator to list uri's of ops to be included in realtime execution"""
-        if isinstance(self.inputs['saved_items'],list):
-            return self.inputs['saved_items']
-        else:
-            return [self.inputs['saved_items']]
-
-    def batch_outputs_tag(self):
-        return 'realtime_outputs'
-
-    @staticmethod
-    def delay():
-        """Amount of time to wait between execution attempts, in milliseconds"""
-        return 1000
-
-    def set_batch_ops(self,wf=None):
-        data = optools.locate_input(self.input_locator['realtime_ops'],wf)
-        self.inputs['realtime_ops'] = data
-        #self.input_locator['realtime_ops'].data = data 
-
-    def set_input_routes(self,wf=None):
-        data = optools.locate_input(self.input_locator['input_route'],wf)
-        self.inputs['input_route'] = data
-        #self.input_locator['input_route'].data = data 
+    def run(self):
+        wf = self.inputs['workflow']
+        inpname = self.inputs['input_name']
+        max_files = self.inputs['max_files']
+        max_outputs = self.inputs['max_outputs']
+        idle_timeout = self.inputs['idle_timeout']
+        reader = None
+        if self.inputs['data_input_name'] is not None:
+            reader = imgtools.read_image
+        plan = wf.compile()
+        fsi = optools.FileSystemIterator(self.inputs['dir_path'],self.inputs['regex'],
+        not self.inputs['new_files_only'],settle_time=self.inputs['settle_time'],
+        header_ext=self.inputs['header_ext'])
+        try:
+            rtp = RealtimePipeline(fsi.feed,plan,inpname,reader,self.inputs['data_input_name'],
+            self.inputs['queue_size'],self.inputs['backpressure'],wf.write_log)
+        except:
+            # stop the feed thread and close the watcher
+            fsi.close()
+            raise
+        input_dict_list = []
+        output_dict_list = []
+        self.outputs['realtime_inputs'] = input_dict_list
+        self.outputs['realtime_outputs'] = output_dict_list
+        n_files = 0
+        wf.write_log('STARTING REALTIME')
+        self._pipeline = rtp
+        try:
+            rtp.start()
+            while max_files is None or n_files < max_files:
+                result = rtp.process_next(idle_timeout)
+                if result is None:
+                    if rtp.stop_requested():
+                        wf.write_log('REALTIME stopped')
+                    else:
+                        wf.write_log('REALTIME stopped: no new files')
+                    break
+                inp_dict,out_dict = result
+                n_files += 1
+                input_dict_list.append(inp_dict)
+                output_dict_list.append(out_dict)
+                if max_outputs is not None and len(input_dict_list) > max_outputs:
+                    del input_dict_list[:-max_outputs]
+                    del output_dict_list[:-max_outputs]
+                m = rtp.metrics()
+                wf.write_log('REALTIME RUN {}: {} (queued: {}, dropped: {}, lag: {:.3f} s)'
+                .format(n_files,inp_dict[inpname],
+                m['feed_backlog']+m['file_queue_depth']+m.get('data_queue_depth',0),
+                m['n_dropped'],m['last_lag'] or 0.))
+        finally:
+            rtp.stop()
+            self._pipeline = None
+            plan.store()
+            self.outputs['metrics'] = rtp.metrics()
+        wf.write_log('REALTIME FINISHED')
 
+    def stop(self):
+        """Stop a run that is in progress (from another thread)."""
+        rtp = self._pipeline
+        if rtp is not None:
+            rtp.request_stop()
 
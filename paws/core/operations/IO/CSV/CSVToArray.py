@@ -2,6 +2,7 @@ import numpy as np
 
 from ... import Operation as opmod 
 from ...Operation import Operation
+from ....tools import csvtools
 
 class CSVToArray(Operation):
     """
@@ -14,12 +15,11 @@ class CSVToArray(Operation):
         super(CSVToArray, self).__init__(input_names, output_names)
         self.input_doc['path'] = "path to .csv file"
         self.output_doc['array'] = "numpy array built from csv file contents"
-        # source & type
-        self.input_src['path'] = opmod.fs_input
-        self.input_type['path'] = opmod.path_type
 
     def run(self):
         path = self.inputs['path']
-        self.outputs['array'] = np.loadtxt(path, dtype=float, delimiter=',')
+        names, data = csvtools.read_csv_columns(path, delimiter=',')
+        # single rows and columns come out 1-d, as from np.loadtxt
+        self.outputs['array'] = np.squeeze(data)
 
 
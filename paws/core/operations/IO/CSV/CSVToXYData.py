@@ -2,6 +2,7 @@ import numpy as np
 
 from ... import Operation as opmod 
 from ...Operation import Operation
+from ....tools import csvtools
 
 class CSVToXYData(Operation):
     """
@@ -20,12 +21,10 @@ class CSVToXYData(Operation):
 
     def run(self):
         p = self.inputs['file_path']
-        x = np.loadtxt(p, dtype=float, delimiter=',', usecols=[0])
-        y = np.loadtxt(p, dtype=float, delimiter=',', usecols=[1])
-        self.outputs['x'] = x
-        self.outputs['y'] = y
-        x_y = np.array([x,y]).T
-        self.outputs['x_y'] = x_y 
+        names, data = csvtools.read_csv_columns(p, delimiter=',')
+        self.outputs['x'] = data[:,0]
+        self.outputs['y'] = data[:,1]
+        self.outputs['x_y'] = data[:,:2]
         
 
 
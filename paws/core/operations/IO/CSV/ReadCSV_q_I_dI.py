@@ -2,6 +2,7 @@ import numpy as np
 
 from ... import Operation as opmod 
 from ...Operation import Operation
+from ....tools import csvtools
 
 class ReadCSV_q_I_dI(Operation):
     """
@@ -17,20 +18,16 @@ class ReadCSV_q_I_dI(Operation):
         self.output_doc['q'] = "1d array, first column of csv, presumed to be scattering vector q"
         self.output_doc['I'] = "1d array, second column of csv, presumed to be scattering intensity I"
         self.output_doc['dI'] = "1d array, third column of csv, presumed to be error estimate of I"
-        # source & type
-        self.input_src['path'] = opmod.fs_input
-        self.input_type['path'] = opmod.path_type
 
     def run(self):
         path = self.inputs['path']
-        ncols = np.loadtxt(path, delimiter=',', skiprows=1).shape[1]
+        names, data = csvtools.read_csv_columns(path, delimiter=',')
+        ncols = data.shape[1]
         if ncols == 2:
-            q, I = np.loadtxt(path, dtype=float, delimiter=',', unpack=True, skiprows=1)
+            q, I = data.T
             dI = None
         elif ncols == 3:
-            q, I, dI = np.loadtxt(path, dtype=float, delimiter=',', unpack=True, skiprows=1)
-        #elif ncols == 4:
-        #    col1, col2, col3, col4 = np.loadtxt(path, dtype=float, delimiter=',', unpack=True)
+            q, I, dI = data.T
         else:
             raise ValueError("Input file has the wrong number of columns.  I don't know what to do with this.")
         self.outputs['q'] = q
@@ -8,6 +8,8 @@ from ...Operation import Operation
 class WriteArrayCSV(Operation):
     """Write a 2d array to a csv file"""
 
+    cacheable = False
+
     def __init__(self):
         input_names = ['array','headers','dir_path','filename','filetag']
         output_names = ['file_path']
@@ -8,6 +8,8 @@ from ...Operation import Operation
 class WriteCSV_q_I_dI(Operation):
     """Write q, I, and (if available) dI to a csv-formatted file."""
 
+    cacheable = False
+
     def __init__(self):
         input_names = ['q','I','dI','image_location']
         output_names = ['csv_location']
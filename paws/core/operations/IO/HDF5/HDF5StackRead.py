@@ -0,0 +1,31 @@
+from ... import Operation as opmod 
+from ...Operation import Operation
+from ....tools import h5tools
+
+class HDF5StackRead(Operation):
+    """
+    Read one or more frames from a stack of frames
+    in a dataset of an HDF5 (or NeXus) file.
+    Only the chunks holding the requested frames are read,
+    and the file is kept open between runs.
+    """
+
+    def __init__(self):
+        input_names = ['file_path','dataset','index']
+        output_names = ['image_data','n_frames']
+        super(HDF5StackRead,self).__init__(input_names,output_names)
+        self.input_doc['file_path'] = 'path to an HDF5 file'
+        self.input_doc['dataset'] = 'path to the dataset in the HDF5 file, with frames indexed by the first axis'
+        self.input_doc['index'] = str('frame index (int), or a range of frames '
+        + 'as a [start,stop,step] list or a "start:stop:step" string- if None, all frames are read')
+        self.output_doc['image_data'] = 'array of the frame (2D), or of the range of frames (3D)'
+        self.output_doc['n_frames'] = 'number of frames in the dataset'
+        self.inputs['dataset'] = 'entry/data/data'
+        self.inputs['index'] = 0
+
+    def run(self):
+        p = self.inputs['file_path']
+        dset = self.inputs['dataset']
+        self.outputs['image_data'] = h5tools.read_frames(p,dset,self.inputs['index'])
+        self.outputs['n_frames'] = h5tools.n_frames(p,dset)
+
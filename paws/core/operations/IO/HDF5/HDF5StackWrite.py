@@ -0,0 +1,40 @@
+import numpy as np
+
+from ... import Operation as opmod 
+from ...Operation import Operation
+from ....tools import h5tools
+
+class HDF5StackWrite(Operation):
+    """
+    Append a frame (or a stack of frames) to a dataset of an HDF5 file.
+    The dataset is created by the first write,
+    with chunks of one frame, optionally compressed.
+    The file is kept open between runs.
+    """
+
+    cacheable = False
+
+    def __init__(self):
+        input_names = ['image_data','file_path','dataset','compression']
+        output_names = ['file_path','n_frames']
+        super(HDF5StackWrite,self).__init__(input_names,output_names)
+        self.input_doc['image_data'] = 'array of a frame (2D) or of a stack of frames (3D)'
+        self.input_doc['file_path'] = 'path to the HDF5 file- created if it does not exist'
+        self.input_doc['dataset'] = 'path to the dataset in the HDF5 file'
+        self.input_doc['compression'] = str('compression for a new dataset: '
+        + 'None, "gzip", "lzf", "lz4", or "blosc" (lz4 and blosc require hdf5plugin)')
+        self.output_doc['file_path'] = 'path to the HDF5 file'
+        self.output_doc['n_frames'] = 'number of frames in the dataset after writing'
+        self.input_type['image_data'] = opmod.workflow_item
+        self.inputs['dataset'] = 'entry/data/data'
+        self.inputs['compression'] = None
+
+    def run(self):
+        img = np.asarray(self.inputs['image_data'])
+        if img.ndim == 2:
+            img = img[np.newaxis,:,:]
+        p = self.inputs['file_path']
+        self.outputs['n_frames'] = h5tools.append_frames(p,self.inputs['dataset'],
+        img,self.inputs['compression'])
+        self.outputs['file_path'] = p
+
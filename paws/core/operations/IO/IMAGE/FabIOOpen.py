@@ -4,6 +4,7 @@ import fabio
 
 from ... import Operation as opmod 
 from ...Operation import Operation
+from ....tools import imgtools
 
 class FabIOOpen(Operation):
     """
@@ -11,10 +12,13 @@ class FabIOOpen(Operation):
     """
 
     def __init__(self):
-        input_names = ['path']
+        input_names = ['path','memmap']
         output_names = ['image_data','FabioImage','dir_path','filename']
         super(FabIOOpen,self).__init__(input_names,output_names) 
         self.input_doc['path'] = 'string representing the path to a .tif image'
+        self.input_doc['memmap'] = str('if true, uncompressed .tif and .edf images are returned '
+        + 'as read-only memory-mapped arrays, which are read from disk as they are used')
+        self.inputs['memmap'] = False
         self.output_doc['image_data'] = '2D array representing pixel values taken from the input file'
         self.output_doc['FabioImage'] = 'The object generated by fabio.open()'
         self.output_doc['dir_path'] = 'Path to the directory the image came from'
@@ -30,5 +34,10 @@ class FabIOOpen(Operation):
         file_noext = os.path.splitext(file_nopath)[0]
         self.outputs['dir_path'] = dir_path 
         self.outputs['filename'] = file_noext 
-        self.outputs['image_data'] = fabio.open(p).data
+        img = None
+        if self.inputs['memmap']:
+            img = imgtools.memmap_image(p)
+        if img is None:
+            img = fabio.open(p).data
+        self.outputs['image_data'] = img
 
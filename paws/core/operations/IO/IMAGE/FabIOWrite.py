@@ -15,6 +15,8 @@ class FabIOWrite(Operation):
     which should be dir_path+filename+filetag+ext.
     """
 
+    cacheable = False
+
     def __init__(self):
         input_names = ['image_data','header','dir_path','filename','filetag','ext','overwrite']
         output_names = ['file_path']
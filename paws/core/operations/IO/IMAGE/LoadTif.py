@@ -5,6 +5,7 @@ import numpy as np
 
 from ... import Operation as opmod 
 from ...Operation import Operation
+from ....tools import imgtools
 
 class LoadTif(Operation):
     """
@@ -13,10 +14,13 @@ class LoadTif(Operation):
     """
 
     def __init__(self):
-        input_names = ['file_path']
+        input_names = ['file_path','memmap']
         output_names = ['image_data','dir_path','filename']
         super(LoadTif,self).__init__(input_names,output_names)
         self.input_doc['file_path'] = 'path to a .tif image'
+        self.input_doc['memmap'] = str('if true, uncompressed images are returned '
+        + 'as read-only memory-mapped arrays, which are read from disk as they are used')
+        self.inputs['memmap'] = False
         self.output_doc['image_data'] = '2D array representing pixel values'
         self.output_doc['filename'] = 'Filename for image, path and extension stripped'
         
@@ -28,7 +32,12 @@ class LoadTif(Operation):
         self.outputs['dir_path'] = dir_path 
         self.outputs['filename'] = file_noext 
         try:
-            self.outputs['image_data'] = tifffile.imread(p)
+            img = None
+            if self.inputs['memmap']:
+                img = imgtools.memmap_tif(p)
+            if img is None:
+                img = tifffile.imread(p)
+            self.outputs['image_data'] = img
         except IOError as ex:
             ex.message = "[{}] IOError for file {}. \nError message:".format(__name__,p,ex.message)
             raise ex
@@ -7,6 +7,8 @@ class CheckDataSet(Operation):
     Output some indication of whether or not the query was successful.
     """
     
+    cacheable = False
+
     def __init__(self):
         input_names = ['client','dsid']
         output_names = ['ok_flag','status']
@@ -7,6 +7,8 @@ class CreateDataSet(Operation):
     Output the index of the created data set.
     """
 
+    cacheable = False
+
     def __init__(self):
         input_names = ['client','name','description','share']
         output_names = ['ok_flag','dsid']
@@ -11,6 +11,8 @@ class SavePIFAsJSON(Operation):
     Take a pypif.obj.System object and save it on the local filesystem in .json format
     """
 
+    cacheable = False
+
     def __init__(self):
         input_names = ['pif','dirpath','filename']
         output_names = ['response']
@@ -6,6 +6,8 @@ class ShipJSON(Operation):
     Take a .json file containing a pif or array of pifs, ship it to a Citrination data set.    
     """
 
+    cacheable = False
+
     def __init__(self):
         input_names = ['json_path','client','dsid','ship_flag']
         output_names = ['response']
@@ -11,6 +11,8 @@ class ShipToDataSet(Operation):
     Take a pypif.obj.System object and ship it to a given Citrination data set.    
     """
 
+    cacheable = False
+
     def __init__(self):
         input_names = ['pif','client','dsid','json_path','keep_json','ship_flag']
         output_names = ['response']
@@ -0,0 +1,34 @@
+from ... import Operation as opmod 
+from ...Operation import Operation
+from ....tools.spectrumstore import SpectrumStore
+
+class ReadSpectrumStore(Operation):
+    """
+    Read a binary spectrum store (see WriteSpectrumStore).
+    If an index is given, output the columns of that row,
+    otherwise output whole columns as read-only memory-mapped arrays,
+    with one row per frame.
+    """
+
+    # the store can grow without its path changing
+    cacheable = False
+
+    def __init__(self):
+        input_names = ['store_path','index']
+        output_names = ['columns','n_rows']
+        super(ReadSpectrumStore,self).__init__(input_names,output_names)
+        self.input_doc['store_path'] = 'path to the spectrum store directory'
+        self.input_doc['index'] = 'index of the row to read (optional)- if None, all rows are read'
+        self.output_doc['columns'] = 'dict of column names (e.g. q, I, dI, time, temp) and their values'
+        self.output_doc['n_rows'] = 'number of rows in the store'
+        self.inputs['index'] = None
+
+    def run(self):
+        store = SpectrumStore(self.inputs['store_path'])
+        idx = self.inputs['index']
+        if idx is None:
+            self.outputs['columns'] = dict([(name,store.column(name)) for name in store.column_names()])
+        else:
+            self.outputs['columns'] = store.row(int(idx))
+        self.outputs['n_rows'] = store.n_rows()
+
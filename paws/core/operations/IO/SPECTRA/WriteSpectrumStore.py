@@ -0,0 +1,41 @@
+from collections import OrderedDict
+
+from ... import Operation as opmod 
+from ...Operation import Operation
+from ....tools.spectrumstore import SpectrumStore
+
+class WriteSpectrumStore(Operation):
+    """
+    Append q, I, dI, time and temperature for one frame
+    as a row of a binary spectrum store (a directory of .npy columns).
+    Inputs that are None are not stored.
+    """
+
+    cacheable = False
+
+    def __init__(self):
+        input_names = ['store_path','q','I','dI','time','temp']
+        output_names = ['store_path','row_index']
+        super(WriteSpectrumStore,self).__init__(input_names,output_names)
+        self.input_doc['store_path'] = 'path to the spectrum store directory- created if it does not exist'
+        self.input_doc['q'] = '1d array of scattering vector magnitudes'
+        self.input_doc['I'] = '1d array of intensities at q'
+        self.input_doc['dI'] = '1d array of intensity error estimates (optional)'
+        self.input_doc['time'] = 'time of the frame, e.g. from TimeTempFromHeader (optional)'
+        self.input_doc['temp'] = 'temperature of the frame, e.g. from TimeTempFromHeader (optional)'
+        self.output_doc['store_path'] = 'path to the spectrum store directory'
+        self.output_doc['row_index'] = 'index of the row that was written'
+        self.input_type['q'] = opmod.workflow_item
+        self.input_type['I'] = opmod.workflow_item
+
+    def run(self):
+        store = SpectrumStore(self.inputs['store_path'])
+        row = OrderedDict()
+        for name in ['q','I','dI','time','temp']:
+            row[name] = self.inputs[name]
+        try:
+            self.outputs['row_index'] = store.append(row)
+        finally:
+            store.close()
+        self.outputs['store_path'] = self.inputs['store_path']
+
@@ -5,11 +5,36 @@ import importlib
 from ..models.TreeModel import TreeModel
 from ..models.TreeItem import TreeItem
 from .. import operations as ops
+from .. import pawstools
 from ..operations.Operation import Operation
 
+class OpSpec(object):
+    """
+    Stand-in for an enabled Operation whose module has not been imported yet.
+    Holds the module name, input and output names, and docstring
+    from the Operation manifest (see operations.op_manifest).
+    OpManager.get_op() imports the module and replaces the OpSpec
+    with the Operation class.
+    """
+
+    def __init__(self,op_uri,entry={}):
+        super(OpSpec,self).__init__()
+        self.op_uri = op_uri
+        self.module = entry.get('module',ops.__name__+'.'+op_uri)
+        self.input_names = entry.get('inputs')
+        self.output_names = entry.get('outputs')
+        self.doc = entry.get('doc','')
+
+    def __repr__(self):
+        return 'OpSpec({})'.format(self.op_uri)
+
 class OpManager(TreeModel):
     """
     Tree structure for categorized storage and retrieval of Operations.
+    Enabled Operations are stored as OpSpecs
+    until they are first requested with get_op(),
+    so that Operation modules (and their dependencies)
+    are only imported when they are used.
     """
 
     def __init__(self):
@@ -60,16 +85,18 @@ class OpManager(TreeModel):
         and the second element is the name of the Operation.
         load_cats() should be called before load_ops()
         and should ensure that all cats in cat_op_list exist in the tree.
+        Saves the Operation manifest if it was updated when the ops were found.
         """
         for cat_op in cat_op_list:
             self.add_op(cat_op[0],cat_op[1])
             self._n_ops += 1
+        ops.save_manifest()
 
     def add_op(self,cat,opname):
         """
         Add op name to the tree under category cat.
         If ops.load_flags indicates that this op should be enabled,
-        enable it (this causes it to import the module).
+        enable it (the module is not imported until get_op() is called).
         """
         op_uri = cat+'.'+opname
         if ops.load_flags[op_uri]:
@@ -82,10 +109,8 @@ class OpManager(TreeModel):
         opname = op_uri.split('.')[-1]
         if flag:
             self.write_log('Enabling Operation {}...'.format(op_uri))
-            mod = importlib.import_module('.'+op_uri,ops.__name__)
-            op = getattr(mod,opname)
-            optest = op()
-            self.set_item(op_uri,op)
+            if not self.is_op_loaded(op_uri):
+                self.set_item(op_uri,OpSpec(op_uri,ops.op_manifest.get(op_uri,{})))
             ops.load_flags[op_uri] = True
         else:
             # disable the op: set ops.load_flags so that
@@ -96,6 +121,30 @@ class OpManager(TreeModel):
         if flag:
             self.write_log('Finished enabling {}'.format(op_uri))
 
+    def is_op_loaded(self,op_uri):
+        """Return whether the module of op_uri has been imported."""
+        if not self.contains_uri(op_uri):
+            return False
+        op = self.get_data_from_uri(op_uri)
+        return isinstance(op,type) and issubclass(op,Operation)
+
+    def get_op(self,op_uri):
+        """
+        Return the Operation class for op_uri,
+        importing its module the first time it is requested.
+        Raises an OperationDisabledError if the Operation is not enabled.
+        """
+        op = self.get_data_from_uri(op_uri)
+        if isinstance(op,OpSpec):
+            self.write_log('Importing Operation {}...'.format(op_uri))
+            mod = importlib.import_module(op.module)
+            op = getattr(mod,op_uri.split('.')[-1])
+            self.set_item(op_uri,op)
+        elif op is None:
+            raise pawstools.OperationDisabledError(
+            'Operation {} is not enabled.'.format(op_uri))
+        return op
+
     def remove_op(self,op_uri):
         """Remove op from the tree by its full category.opname uri"""
         self.remove_item(op_uri)
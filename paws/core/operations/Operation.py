@@ -26,11 +26,45 @@ class InputLocator(object):
         self.val = val 
         self.data = None 
 
+class TrackedDict(OrderedDict):
+    """
+    An OrderedDict that keeps track of which keys 
+    have been set to new objects (or deleted) 
+    since the last call to TrackedDict.pop_changed().
+    Operation.inputs and Operation.outputs are TrackedDicts,
+    so that Workflows only need to re-index the items that changed
+    after an Operation runs.
+    """
+
+    def __init__(self,*args,**kwargs):
+        self.changed_keys = set()
+        super(TrackedDict,self).__init__(*args,**kwargs)
+
+    def __setitem__(self,key,val,*args,**kwargs):
+        if not (key in self and self[key] is val):
+            self.changed_keys.add(key)
+        super(TrackedDict,self).__setitem__(key,val,*args,**kwargs)
+
+    def __delitem__(self,key,*args,**kwargs):
+        self.changed_keys.add(key)
+        super(TrackedDict,self).__delitem__(key,*args,**kwargs)
+
+    def pop_changed(self):
+        """Return the set of changed keys, and start tracking anew."""
+        changed_keys = self.changed_keys
+        self.changed_keys = set()
+        return changed_keys
+
 class Operation(object):
     """
     Class template for implementing paws operations.
     """
 
+    # Operations with side effects (writing files, shipping data, etc.)
+    # or random outputs should set cacheable = False,
+    # so that their results are never restored from a Workflow result cache.
+    cacheable = True
+
     def __init__(self,input_names,output_names):
         """
         The input_names and output_names (lists of strings)
@@ -39,9 +73,9 @@ class Operation(object):
         These lists are used as keys to build dicts
         Operation.inputs and Operation.outputs.
         """
-        self.inputs = OrderedDict()
+        self.inputs = TrackedDict()
         self.input_locator = OrderedDict() 
-        self.outputs = OrderedDict() 
+        self.outputs = TrackedDict() 
         self.input_doc = OrderedDict() 
         self.input_type = OrderedDict() 
         self.output_doc = OrderedDict() 
@@ -10,29 +10,22 @@ class Rotation(Operation):
         input_names = ['image_data','rotation_deg']
         output_names = ['image_data']
         super(Rotation,self).__init__(input_names,output_names)        
-        self.input_src['rotation_deg'] = opmod.text_input
-        self.input_type['rotation_deg'] = opmod.int_type
         self.input_doc['image_data'] = '2d array representing intensity for each pixel'
         self.input_doc['rotation_deg'] = str('rotation in degrees counter-clockwise, '
                                     + 'must be either 90, 180, or 270')
-        self.output_doc['image_data'] = '2d array representing rotated image'
-        self.input_src['image_data'] = opmod.wf_input
-        self.input_src['rotation_deg'] = opmod.text_input
-        self.input_type['rotation_deg'] = opmod.int_type
+        self.output_doc['image_data'] = str('2d array representing rotated image- '
+        + 'a view of the input array, which is read-only if the input is (e.g. a read-only memmap)')
+        self.input_type['image_data'] = opmod.workflow_item
         self.inputs['rotation_deg'] = 90 
 
     def run(self):
         """Rotate self.inputs['image_data'] and save as self.outputs['image_data']"""
-        img = np.array(self.inputs['image_data'])
+        img = np.asarray(self.inputs['image_data'])
         rot_deg = int(self.inputs['rotation_deg'])
-        if rot_deg==90:
-            img_rot = np.rot90(img)
-        elif rot_deg==180:
-            img_rot = np.rot90(np.rot90(img))
-        elif rot_deg==270:
-            img_rot = np.rot90(np.rot90(np.rot90(img)))
-        else:
+        if not rot_deg in [90,180,270]:
             msg = '[{}] expected rot_deg = 90, 180, or 270, got {}'.format(__name__,rot_deg)
             raise ValueError(msg)
+        # np.rot90 returns a view, without copying the image
+        img_rot = np.rot90(img,rot_deg//90)
         # save results to self.outputs
         self.outputs['image_data'] = img_rot
@@ -1,15 +1,15 @@
 """
 Integrate an image, given calibration parameters.
 
-This module builds a PyFAI.AzimuthalIntegrator 
+This module builds (or reuses) a PyFAI.AzimuthalIntegrator 
 to integrate an input image to I(q).
 """
 
 import numpy as np
-import pyFAI
 
 from ... import Operation as opmod 
 from ...Operation import Operation
+from ....tools import integration
 
 class Integrate1d(Operation):
     """
@@ -36,13 +36,14 @@ class Integrate1d(Operation):
     def run(self):
         img = self.inputs['image_data']
         pd = self.inputs['poni_dict']
-        p = pyFAI.AzimuthalIntegrator()
-        p.setPyFAI(**pd)
         fpolz = self.inputs['fpolz']
-        # use a mask to screen negative pixels
-        # mask should be 1 for masked pixels, 0 for unmasked pixels
-        msk = np.ones(img.shape)*(img <= 0)
-        q, I_of_q = p.integrate1d(img, 1000, radial_range=(0.0005,1.0005), mask=msk, polarization_factor=fpolz, unit='q_A^-1')
+        npt = 1000
+        radial_range = (0.0005,1.0005)
+        unit = 'q_A^-1'
+        # reuse a cached integrator for frames with the same calibration,
+        # screening out non-positive pixels
+        q, I_of_q = integration.integrate1d(pd, img, npt, polarization_factor=fpolz,
+        radial_range=radial_range, unit=unit)
         # save results to self.outputs
         self.outputs['q'] = q
         self.outputs['I'] = I_of_q
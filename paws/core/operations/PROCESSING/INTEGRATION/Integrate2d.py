@@ -1,15 +1,15 @@
 """
 Integrate an image, given calibration parameters.
 
-This module builds a PyFAI.AzimuthalIntegrator 
+This module builds (or reuses) a PyFAI.AzimuthalIntegrator 
 to integrate an input image to I(q,chi).
 """
 
 import numpy as np
-import pyFAI
 
 from ... import Operation as opmod 
 from ...Operation import Operation
+from ....tools import integration
 
 class Integrate2d(Operation):
     """
@@ -36,14 +36,12 @@ class Integrate2d(Operation):
     def run(self):
         img = self.inputs['image_data']
         pd = self.inputs['poni_dict']
-        p = pyFAI.AzimuthalIntegrator()
-        p.setPyFAI(**pd)
         fpolz = pd['fpolz']
-        # use a mask to screen negative pixels
-        # mask should be 1 for masked pixels, 0 for unmasked pixels
-        s = int(img.shape[0])
-        msk = np.ones((s,s))*(img <= 0)
-        I_q_chi, q, chi = p.integrate2d(img, 1000, mask=msk, polarization_factor=fpolz, unit='q_A^-1')
+        npt = 1000
+        unit = 'q_A^-1'
+        # reuse a cached integrator for frames with the same calibration,
+        # screening out non-positive pixels
+        I_q_chi, q, chi = integration.integrate2d(pd, img, npt, polarization_factor=fpolz, unit=unit)
         I_at_q = np.sum(I_q_chi,axis=0)
         #q = q * 1E9
         # save results to self.outputs
@@ -2,11 +2,13 @@ import numpy as np
 
 from ... import Operation as opmod 
 from ...Operation import Operation
+from ....tools import peaktools
 
 class FindPeaksByWindow(Operation):
     """
-    Walk a 1d array and find its local maxima.
-    A maximum is found if it is the highest point within windowsize of itself.
+    Find the local maxima of a 1d array.
+    A maximum is found if it is the highest point within windowsize of itself
+    (see paws.core.tools.peaktools.window_maxima()).
     An optional threshold for the peak intensity relative to the window-average
     can be used to filter out peaks due to noise.
     """
@@ -19,14 +21,8 @@ class FindPeaksByWindow(Operation):
         self.input_doc['y'] = '1d array of y values (amplitudes)'
         self.input_doc['windowsize'] = 'the window is this many points in either direction of a given point'
         self.input_doc['threshold'] = 'threshold on Ipk/I(window) for being counted as a peak: set to zero to deactivate'
-        self.input_src['x'] = opmod.wf_input
-        self.input_src['y'] = opmod.wf_input
-        self.input_src['windowsize'] = opmod.text_input
-        self.input_src['threshold'] = opmod.text_input
-        self.input_type['x'] = opmod.ref_type
-        self.input_type['y'] = opmod.ref_type
-        self.input_type['windowsize'] = opmod.int_type
-        self.input_type['threshold'] = opmod.float_type
+        self.input_type['x'] = opmod.workflow_item
+        self.input_type['y'] = opmod.workflow_item
         self.inputs['windowsize'] = 10
         self.inputs['threshold'] = 0 
         self.output_doc['pk_idx'] = 'q values of found peaks'
@@ -35,22 +31,15 @@ class FindPeaksByWindow(Operation):
 
     def run(self):
         x = self.inputs['x']
-        y = self.inputs['y']
+        y = np.asarray(self.inputs['y'])
         w = self.inputs['windowsize']
         thr = self.inputs['threshold']
-        pk_idx = []
-        for idx in range(w,len(y)-w-1):
-            pkflag = False
-            ywin = y[idx-w:idx+w+1]
-            if np.argmax(ywin) == w:
-                if thr:
-                    pkflag = ywin[w]/np.mean(ywin) > thr
-                else:
-                    pkflag = True
-            if pkflag:
-                pk_idx.append(idx)
-        self.outputs['pk_idx'] = np.array(pk_idx)
-        self.outputs['x_pk'] = np.array([x[idx] for idx in pk_idx])
-        self.outputs['y_pk'] = np.array([y[idx] for idx in pk_idx])
-    
-
+        pk_idx = peaktools.window_maxima(y,w)
+        if thr:
+            # mean of y over the window around each maximum
+            y_cum = np.concatenate(([0.],np.cumsum(y)))
+            y_win_mean = (y_cum[pk_idx+w+1]-y_cum[pk_idx-w])/(2*w+1)
+            pk_idx = pk_idx[y[pk_idx]/y_win_mean > thr]
+        self.outputs['pk_idx'] = pk_idx
+        self.outputs['x_pk'] = np.asarray(x)[pk_idx]
+        self.outputs['y_pk'] = y[pk_idx]
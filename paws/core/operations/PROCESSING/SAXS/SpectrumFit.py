@@ -7,6 +7,7 @@ from scipy.optimize import curve_fit
 from ... import Operation as opmod 
 from ...Operation import Operation
 from ....tools import saxstools
+from ....tools import formfactortable
 
 class SpectrumFit(Operation):
     """
@@ -34,7 +35,7 @@ class SpectrumFit(Operation):
     """
 
     def __init__(self):
-        input_names = ['q','I','flags','params','fit_params','objfun']
+        input_names = ['q','I','flags','params','fit_params','objfun','use_lookup_table']
         output_names = ['params','q_I_opt']
         super(SpectrumFit, self).__init__(input_names, output_names)
         self.input_doc['q'] = '1d array of wave vector values in 1/Angstrom units'
@@ -45,6 +46,10 @@ class SpectrumFit(Operation):
         self.input_doc['fit_params'] = 'list of strings (keys) indicating which parameters to optimize'
         self.input_doc['objfun'] = 'string indicating objective function for optimization: '\
         + 'see documentation of saxstools.fit_spectrum() for supported objective functions'
+        self.input_doc['use_lookup_table'] = 'if true, interpolate the polydisperse sphere form factor '\
+        + 'from a precomputed table (built once, and saved in the paws scratch directory), '\
+        + 'instead of computing it for every step of the optimization. '\
+        + 'The table is built in the background, and the form factor is computed directly until it is ready'
         self.output_doc['params'] = 'dict of scattering equation parameters copied from inputs, '\
         'with values optimized for all keys specified in fit_params'
         self.output_doc['q_I_opt'] = 'n-by-2 array of q and the optimized computed intensity spectrum'
@@ -53,6 +58,7 @@ class SpectrumFit(Operation):
         self.input_type['flags'] = opmod.workflow_item
         self.input_type['params'] = opmod.workflow_item
         self.inputs['objfun'] = 'chi2log' 
+        self.inputs['use_lookup_table'] = False
 
     def run(self):
         f = self.inputs['flags']
@@ -73,8 +79,12 @@ class SpectrumFit(Operation):
         if f['form_factor_scattering'] or f['diffraction_peaks']:
             c = ['fix_I0']
 
+        table = None
+        if self.inputs['use_lookup_table']:
+            table = formfactortable.get_sphere_table(wait=False)
+
         # Fitting happens here
-        p_opt = saxstools.fit_spectrum(q,I,m,f,p,fitkeys,c)
+        p_opt = saxstools.fit_spectrum(q,I,m,f,p,fitkeys,c,table)
 
         I_opt = saxstools.compute_saxs(q,f,p_opt)
 
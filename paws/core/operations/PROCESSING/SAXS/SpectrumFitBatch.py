@@ -0,0 +1,77 @@
+import numpy as np
+
+from ... import Operation as opmod
+from ...Operation import Operation
+from ....tools import saxstools
+from ....tools import formfactortable
+
+class SpectrumFitBatch(Operation):
+    """
+    Fit a stack of measured SAXS spectra that share the same q values,
+    such as the y output of XYDataFromBatch
+    for a batch of time-resolved measurements,
+    with the same scattering populations and objective function as SpectrumFit.
+
+    Each spectrum is fit starting from the optimized parameters
+    of the previous spectrum, unless warm_start is False.
+    See saxstools.fit_spectrum_batch() for the algorithm.
+    Unlike SpectrumFit, the 'fix_I0' constraint is not applied:
+    the input params hold I(q=0) for one spectrum,
+    whereas I(q=0) generally changes through a batch.
+
+    Outputs a list of dicts of optimized parameters, one per spectrum,
+    and the stack of computed intensity spectra for those parameters.
+    """
+
+    def __init__(self):
+        input_names = ['q','I_stack','flags','params','fit_params','objfun','warm_start','use_lookup_table']
+        output_names = ['params','I_opt']
+        super(SpectrumFitBatch, self).__init__(input_names, output_names)
+        self.input_doc['q'] = '1d array of wave vector values in 1/Angstrom units, shared by all spectra'
+        self.input_doc['I_stack'] = 'n_spectra-by-n_q array (or list of 1d arrays) of intensity values I(q)'
+        self.input_doc['flags'] = 'dict of flags indicating what populations to fit'
+        self.input_doc['params'] = 'dict of initial values for the scattering equation parameters '\
+            'for each of the populations specified in the input flags'
+        self.input_doc['fit_params'] = 'list of strings (keys) indicating which parameters to optimize'
+        self.input_doc['objfun'] = 'string indicating objective function for optimization: '\
+        + 'see documentation of saxstools.fit_spectrum() for supported objective functions'
+        self.input_doc['warm_start'] = 'if true, start each fit from the optimized parameters of the previous spectrum'
+        self.input_doc['use_lookup_table'] = 'if true, interpolate the polydisperse sphere form factor '\
+        + 'from a precomputed table (see SpectrumFit)'
+        self.output_doc['params'] = 'list of dicts of scattering equation parameters copied from inputs, '\
+        'with values optimized for all keys specified in fit_params, one dict per spectrum'
+        self.output_doc['I_opt'] = 'n_spectra-by-n_q array of the optimized computed intensity spectra '\
+        + '(zeros if the spectra are not fit)'
+        self.input_type['q'] = opmod.workflow_item
+        self.input_type['I_stack'] = opmod.workflow_item
+        self.input_type['flags'] = opmod.workflow_item
+        self.input_type['params'] = opmod.workflow_item
+        self.inputs['objfun'] = 'chi2log'
+        self.inputs['warm_start'] = True
+        self.inputs['use_lookup_table'] = False
+
+    def run(self):
+        f = self.inputs['flags']
+        q = self.inputs['q']
+        I_stack = np.asarray(self.inputs['I_stack'],dtype=float)
+        if f['bad_data'] or not any([f['precursor_scattering'],f['form_factor_scattering'],f['diffraction_peaks']]):
+            self.outputs['params'] = [{} for I in I_stack]
+            self.outputs['I_opt'] = np.zeros(I_stack.shape)
+            return
+        if f['diffraction_peaks']:
+            self.outputs['params'] = [{'ERROR_MESSAGE':'diffraction peak fitting not yet supported'} for I in I_stack]
+            self.outputs['I_opt'] = np.zeros(I_stack.shape)
+            return
+
+        table = None
+        if self.inputs['use_lookup_table']:
+            table = formfactortable.get_sphere_table(wait=False)
+
+        # Fitting happens here
+        p_opt = saxstools.fit_spectrum_batch(q,I_stack,self.inputs['objfun'],f,
+        self.inputs['params'],self.inputs['fit_params'],[],table,self.inputs['warm_start'])
+
+        self.outputs['params'] = p_opt
+        # computed without the table, as in SpectrumFit
+        self.outputs['I_opt'] = np.array([saxstools.compute_saxs(q,f,p) for p in p_opt])
+
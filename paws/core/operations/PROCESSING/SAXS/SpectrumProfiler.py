@@ -18,20 +18,24 @@ class SpectrumProfiler(Operation):
     """
 
     def __init__(self):
-        input_names = ['q', 'I', 'dI']
+        input_names = ['q', 'I', 'dI', 'n_bins', 'q_bin_range']
         output_names = ['features']
         super(SpectrumProfiler, self).__init__(input_names, output_names)
         self.input_doc['q'] = '1d array of wave vector values in 1/Angstrom units'
         self.input_doc['I'] = '1d array of intensity values I(q)'
         self.input_doc['dI'] = 'optional- 1d array of intensity uncertainty values I(q)'
+        self.input_doc['n_bins'] = 'number of q bins for the binned intensity features (q_bin_strengths)'
+        self.input_doc['q_bin_range'] = '[min,max] range of q covered by the bins, in 1/Angstrom units'
         self.output_doc['features'] = str('dict profiling the input spectrum. '
         + 'See the documentation of paws.core.tools.saxstools.profile_spectrum().')
         self.input_type['q'] = opmod.workflow_item
         self.input_type['I'] = opmod.workflow_item
+        self.inputs['n_bins'] = 100
+        self.inputs['q_bin_range'] = [0.,1.]
 
     def run(self):
         q, I = self.inputs['q'], self.inputs['I']
         dI = self.inputs['dI']
-        d_r = saxstools.profile_spectrum(q,I)
+        d_r = saxstools.profile_spectrum(q,I,self.inputs['n_bins'],self.inputs['q_bin_range'])
         self.outputs['features'] = d_r 
 
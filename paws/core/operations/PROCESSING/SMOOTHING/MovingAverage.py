@@ -7,6 +7,11 @@ class MovingAverage(Operation):
     """
     Applies moving average smoothing filter to 1d array,
     optionally weighted by window shape and error values.
+    Each output point is the weighted average of the data
+    within window points on either side of it, 
+    with weights equal to the window shape times error**-2,
+    normalized by the sum of the weights.
+    Near the ends of the array, the window is cut off at the ends.
     """
 
     def __init__(self):
@@ -15,23 +20,17 @@ class MovingAverage(Operation):
         super(MovingAverage, self).__init__(input_names, output_names)
         self.input_doc['data'] = '1d array'
         self.input_doc['window'] = 'integer number of data points to average on either side'
-        self.input_doc['shape'] = 'window shape for weighting- triangular or square (default)'
+        self.input_doc['shape'] = 'window shape for weighting- triangle or square (default)'
         self.input_doc['error'] = '1d array, same shape as data, optional (default None)'
         self.output_doc['smoothdata'] = 'smoothed 1d array'
-        self.input_src['data'] = opmod.wf_input
-        self.input_src['window'] = opmod.text_input
-        self.input_src['shape'] = opmod.text_input
-        self.input_src['error'] = opmod.wf_input
-        self.input_type['data'] = opmod.ref_type
-        self.input_type['window'] = opmod.int_type
-        self.input_type['shape'] = opmod.str_type
-        self.input_type['error'] = opmod.none_type
+        self.input_type['data'] = opmod.workflow_item
+        self.input_type['error'] = opmod.workflow_item
         self.inputs['window'] = 3
         self.inputs['shape'] = 'square' 
 
     def run(self):
-        x = self.inputs['data']
-        w = self.inputs['window']
+        x = np.asarray(self.inputs['data'],dtype=float)
+        w = int(self.inputs['window'])
         err = self.inputs['error']
         nx = len(x)
         if self.inputs['shape'] == 'triangle': 
@@ -40,14 +39,16 @@ class MovingAverage(Operation):
             shape_weights = np.ones(w+1, dtype=float)
         shape_weights = np.concatenate( (shape_weights[::-1],shape_weights[1:]))
         if err is not None:
-            err_weights = err**-2
+            err_weights = np.asarray(err,dtype=float)**-2
         else:
             err_weights = np.ones(x.shape, dtype=float)
-        x_out = np.array([np.sum( 
-                            np.array(x[max(0,i-w):min(i+w,nx)],dtype=float) 
-                             * np.array(err_weights[max(0,i-w):min(i+w,nx)]) 
-                             * np.array(shape_weights[max(0,w-i):min(2*(nx-i)+1,2*w+1)]) )/
-                            float(min(i+w,nx-1)-max(0,i-w)) 
-                            for i in range(nx) ])
-        self.outputs['smoothdata'] = x_out
-
+        # the shape weights are symmetric, so convolving with them
+        # sums the weighted data over the window around each point.
+        # the full convolution is zero-padded beyond the ends of the array,
+        # which cuts off the windows there.
+        # the convolution is direct, rather than by FFT,
+        # whose round-off is relative to the largest weights,
+        # and swamps the small ones when the errors span many decades.
+        x_sum = np.convolve(x*err_weights,shape_weights)[w:w+nx]
+        weight_sum = np.convolve(err_weights,shape_weights)[w:w+nx]
+        self.outputs['smoothdata'] = x_sum/weight_sum
@@ -6,6 +6,8 @@ from ..Operation import Operation
 class BigLoad(Operation):
     """An Operation testing class, creates and outputs a big array of noise"""
 
+    cacheable = False
+
     def __init__(self):
         input_names = ['size']
         output_names = ['big_array']
@@ -1,5 +1,6 @@
 from __future__ import print_function
 import os
+import ast
 import pkgutil
 import importlib
 from collections import OrderedDict
@@ -14,6 +15,19 @@ if os.path.exists(cfg_file):
     load_flags = pawstools.load_cfg(cfg_file)
 else:
     load_flags = OrderedDict() 
+
+# check for an ops_manifest.cfg (yaml) file:
+# a cache of what is known about each Operation module 
+# without importing it, keyed by Operation uri.
+manifest_file = os.path.join(pawstools.paws_cfg_dir,'ops_manifest.cfg')
+op_manifest = OrderedDict()
+if os.path.exists(manifest_file):
+    try:
+        op_manifest.update(pawstools.load_cfg(manifest_file))
+    except Exception:
+        # a corrupted manifest is rebuilt from scratch
+        op_manifest = OrderedDict()
+manifest_changed = False
     
 def save_config():
     """
@@ -25,6 +39,7 @@ def save_config():
     for k in load_keys:
         od_load_flags[k] = load_flags[k]
     pawstools.save_cfg(od_load_flags,cfg_file)
+    save_manifest()
 
 # Keep track of keys that get loaded in this run.
 # These keys are used to remove load_flags automatically
@@ -36,6 +51,91 @@ def update_load_flags():
         if not k in load_keys:
             load_flags.pop(k)
 
+def literal_names(node,assigned):
+    """
+    Evaluate an ast node that should hold a literal list of names,
+    following a simple variable name through the dict of assigned nodes.
+    Returns None if the names can not be determined without running the code.
+    """
+    if isinstance(node,ast.Name):
+        node = assigned.get(node.id)
+    if node is None:
+        return None
+    try:
+        return [str(nm) for nm in ast.literal_eval(node)]
+    except Exception:
+        return None
+
+def scan_op_module(filepath,modname):
+    """
+    Read the source of an Operation module without importing it.
+    Returns a dict with the Operation class docstring 
+    and its input and output names,
+    which are found from the arguments passed to Operation.__init__().
+    Names that are not literal lists in the source are left as None.
+    """
+    entry = {'doc':'','inputs':None,'outputs':None}
+    with open(filepath,'r') as f:
+        tree = ast.parse(f.read(),filepath)
+    for cls in tree.body:
+        if isinstance(cls,ast.ClassDef) and cls.name == modname:
+            entry['doc'] = (ast.get_docstring(cls) or '').strip()
+            for fn in cls.body:
+                if isinstance(fn,ast.FunctionDef) and fn.name == '__init__':
+                    assigned = {}
+                    for node in ast.walk(fn):
+                        if isinstance(node,ast.Assign):
+                            for tgt in node.targets:
+                                if isinstance(tgt,ast.Name):
+                                    assigned[tgt.id] = node.value
+                        elif (isinstance(node,ast.Call) 
+                        and isinstance(node.func,ast.Attribute) 
+                        and node.func.attr == '__init__'
+                        and len(node.args) >= 2):
+                            entry['inputs'] = literal_names(node.args[0],assigned)
+                            entry['outputs'] = literal_names(node.args[1],assigned)
+    return entry
+
+def update_manifest(op_uri,filepath,modpath):
+    """
+    Make sure op_manifest[op_uri] is up to date
+    with the source file of its module,
+    scanning the file only if it has changed since the last scan.
+    """
+    global manifest_changed
+    if not os.path.isfile(filepath):
+        return
+    mtime = os.path.getmtime(filepath)
+    entry = op_manifest.get(op_uri)
+    if entry and entry.get('mtime') == mtime and entry.get('module') == modpath:
+        return
+    try:
+        entry = scan_op_module(filepath,op_uri.split('.')[-1])
+    except Exception as ex:
+        entry = {'doc':'','inputs':None,'outputs':None,
+        'error':'failed to scan {}: {}'.format(filepath,ex)}
+    entry['module'] = modpath
+    entry['mtime'] = mtime
+    op_manifest[op_uri] = entry
+    manifest_changed = True
+
+def save_manifest():
+    """
+    Write op_manifest to the cfg directory, if anything changed. 
+    Failure to write is not an error: 
+    the manifest is only a cache, and will be rebuilt next time.
+    """
+    global manifest_changed
+    if manifest_changed:
+        for k in list(op_manifest.keys()):
+            if not k in load_keys:
+                op_manifest.pop(k)
+        try:
+            pawstools.save_cfg(dict(op_manifest),manifest_file)
+            manifest_changed = False
+        except Exception:
+            pass
+
 def load_ops_from_path(path_,pkg,cat_root=''):
     ops = []
     cats = []
@@ -70,6 +170,7 @@ def load_ops_from_path(path_,pkg,cat_root=''):
             # assume that there is an Operation in this module
             # whose class name is the same as the module name.
             ops.append( (cat_root,modname) )
+            update_manifest(mod_root,os.path.join(path_[0],modname+'.py'),pkg+'.'+modname)
             if not cat_root in cats:
                 cats.append(cat_root)
     return ops, cats
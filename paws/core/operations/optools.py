@@ -2,31 +2,67 @@
 Various tools for working with Workflows and Operations
 """
 
-import glob
 import copy
-from collections import Iterator
 from collections import OrderedDict
+try:
+    from collections.abc import Iterator
+except ImportError:
+    from collections import Iterator
 
 from . import Operation as opmod 
+from ..tools import filewatch
 
 class FileSystemIterator(Iterator):
+    """
+    Iterator over new files in dirpath
+    whose names match the glob-style pattern regex.
+    Each call to next() waits up to timeout seconds for a new file,
+    and returns [path] for the next new file, or [None] if there is none yet.
+    next_batch() returns all of the new files that are ready, as a list of paths.
+    New files are detected by inotify where available,
+    otherwise by scanning the directory,
+    and are only returned once they are completely written:
+    closed by their writer, or unchanged for settle_time seconds,
+    and (if header_ext is given) accompanied by a header file
+    with the same name and extension header_ext.
+    The checks run on a background thread (see tools.filewatch).
+    """
 
-    def __init__(self,dirpath,regex,include_existing_files=True):
+    def __init__(self,dirpath,regex,include_existing_files=True,timeout=0.1,
+        settle_time=0.2,header_ext=None):
         self.dirpath = dirpath
         self.rx = regex
-        self.paths_done = []
-        if not include_existing_files:
-            self.paths_done = glob.glob(self.dirpath+'/'+self.rx)
+        self.timeout = timeout
+        # ready paths that have not been returned by next() yet
+        self.paths_ready = []
+        watcher = filewatch.make_watcher(dirpath,regex,include_existing_files)
+        self.feed = filewatch.ReadyFileFeed(watcher,settle_time,header_ext)
         super(FileSystemIterator,self).__init__()
 
     def next(self):
-        batch_list = glob.glob(self.dirpath+'/'+self.rx)
-        for path in batch_list:
-            if not path in self.paths_done:
-                self.paths_done.append(path)
-                return [path]
+        if not self.paths_ready:
+            self.paths_ready = self.feed.get_batch(self.timeout)
+        if self.paths_ready:
+            return [self.paths_ready.pop(0)]
         return [None]
 
+    __next__ = next
+
+    def next_batch(self):
+        """
+        Return a (possibly empty) list of the paths of all new files that are ready,
+        waiting up to timeout seconds for at least one.
+        """
+        if self.paths_ready:
+            batch = self.paths_ready + self.feed.get_batch(0.)
+        else:
+            batch = self.feed.get_batch(self.timeout)
+        self.paths_ready = []
+        return batch
+
+    def close(self):
+        self.feed.close()
+
 class ExecutionError(Exception):
     def __init__(self,msg):
         super(ExecutionError,self).__init__(self,msg)
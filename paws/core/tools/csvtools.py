@@ -0,0 +1,70 @@
+"""
+Tools for reading delimited text files.
+"""
+import numpy as np
+
+def is_numeric_line(line,delimiter=','):
+    try:
+        [float(v) for v in line.split(delimiter)]
+        return True
+    except ValueError:
+        return False
+
+def read_csv_columns(path,delimiter=','):
+    """
+    Read a delimited text file of floats in a single pass.
+    A delimiter of whitespace (e.g. ' ' or '\t') matches any run of whitespace.
+    Leading lines that are comments (#) or not numeric are taken as the header,
+    and the column names are taken from the last header line
+    if it has one name per column.
+    Returns a tuple of (list of column names or None,
+    n_rows-by-n_columns array of data).
+    The data are parsed in one vectorized call
+    if every data line has the same number of fields,
+    falling back to np.loadtxt for comments or irregular lines in the data.
+    Raises a ValueError if the file has no data rows.
+    """
+    if not delimiter.strip():
+        delimiter = None
+    with open(path,'r') as f:
+        text = f.read()
+    # find the end of the header
+    pos = 0
+    header_line = None
+    first_line = None
+    while pos < len(text):
+        end = text.find('\n',pos)
+        if end == -1:
+            end = len(text)
+        line = text[pos:end].strip()
+        if line and not line.startswith('#') and is_numeric_line(line,delimiter):
+            first_line = line
+            break
+        if line:
+            header_line = line
+        pos = end+1
+    if first_line is None:
+        raise ValueError('no rows of data in {}'.format(path))
+    body = text[pos:]
+    n_cols = len(first_line.split(delimiter))
+    lines = [l for l in body.splitlines() if l.strip()]
+    data = None
+    if not '#' in body and all([len(l.split(delimiter)) == n_cols for l in lines]):
+        if delimiter is not None:
+            body = body.replace(delimiter,' ')
+        data = np.fromstring(body,dtype=float,sep=' ')
+        if data.size == len(lines)*n_cols:
+            data = data.reshape(len(lines),n_cols)
+        else:
+            data = None
+    if data is None:
+        # irregular rows, comments or junk in the data
+        data = np.loadtxt(path,dtype=float,delimiter=delimiter,ndmin=2,
+        skiprows=text.count('\n',0,pos))
+    names = None
+    if header_line is not None:
+        names = [nm.strip() for nm in header_line.lstrip('#').split(delimiter)]
+        if len(names) != data.shape[1]:
+            names = None
+    return names,data
+
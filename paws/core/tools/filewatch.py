@@ -0,0 +1,442 @@
+"""
+Tools for watching a directory for newly written files.
+
+make_watcher() returns an InotifyWatcher where inotify is available (Linux),
+and a PollingWatcher everywhere else.
+Both report batches of new file paths whose names match a glob-style pattern.
+ReadyFileFeed runs a watcher on a background thread,
+and queues each new file once it is completely written.
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+import errno
+import fnmatch
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from collections import OrderedDict
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+# inotify constants, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_event_header = struct.Struct('iIII')
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+        return libc
+    except (OSError,AttributeError):
+        return None
+
+_libc = _load_libc()
+
+def _decode(name):
+    if isinstance(name,bytes) and not isinstance(name,str):
+        return name.decode(sys.getfilesystemencoding() or 'utf-8','replace')
+    return name
+
+def _encode(path):
+    if isinstance(path,bytes):
+        return path
+    return path.encode(sys.getfilesystemencoding() or 'utf-8')
+
+def list_dir(dirpath):
+    """
+    Return a list of (name,is_file) for the entries of dirpath,
+    using scandir where available to avoid a stat() per entry.
+    """
+    if scandir is not None:
+        return [(e.name,e.is_file()) for e in scandir(dirpath)]
+    return [(nm,os.path.isfile(os.path.join(dirpath,nm))) for nm in os.listdir(dirpath)]
+
+class PollingWatcher(object):
+    """
+    Watch dirpath for new files whose names match pattern,
+    by scanning the directory every poll_interval seconds.
+    Names that have been reported are kept in a set,
+    so each scan costs one membership test per directory entry.
+    The directory's modification time is used as a watermark:
+    scans are skipped while the directory has not changed.
+    New files are reported as soon as they appear,
+    whether or not their writers have closed them.
+    """
+
+    def __init__(self,dirpath,pattern='*',include_existing_files=True,poll_interval=0.05):
+        super(PollingWatcher,self).__init__()
+        self.dirpath = dirpath
+        self.pattern = pattern
+        self.poll_interval = poll_interval
+        self.seen = set()
+        self.dir_mtime = None
+        # whether the files in the last batch from poll() 
+        # are known to be closed by their writers
+        self.last_batch_closed = False
+        self._pending = []
+        if include_existing_files:
+            self._pending = self.scan()
+        else:
+            self.scan()
+
+    def matches(self,name):
+        return fnmatch.fnmatch(name,self.pattern)
+
+    def dir_changed(self):
+        """
+        Return whether dirpath may have new entries since the last scan.
+        Directory mtimes can be coarse (1 second or worse),
+        so a directory modified within the last two seconds
+        is always considered changed.
+        """
+        mtime = os.stat(self.dirpath).st_mtime
+        changed = (mtime != self.dir_mtime or time.time() - mtime < 2.)
+        self.dir_mtime = mtime
+        return changed
+
+    def scan(self):
+        """
+        Return the paths of files in dirpath that match the pattern
+        and have not been seen before, ordered by modification time.
+        """
+        if not self.dir_changed():
+            return []
+        new_paths = []
+        for name,is_file in list_dir(self.dirpath):
+            if is_file and not name in self.seen and self.matches(name):
+                self.seen.add(name)
+                new_paths.append(os.path.join(self.dirpath,name))
+        if len(new_paths) > 1:
+            new_paths.sort(key=_mtime_key)
+        return new_paths
+
+    def poll(self,timeout=None):
+        """
+        Return a list of paths of new files,
+        waiting up to timeout seconds (forever if None) for at least one.
+        Returns an empty list if nothing arrived before the timeout.
+        """
+        self.last_batch_closed = False
+        if self._pending:
+            paths = self._pending
+            self._pending = []
+            return paths
+        t_end = None if timeout is None else time.time() + timeout
+        while True:
+            paths = self.scan()
+            if paths:
+                return paths
+            if t_end is not None:
+                t_left = t_end - time.time()
+                if t_left <= 0:
+                    return []
+                time.sleep(min(self.poll_interval,t_left))
+            else:
+                time.sleep(self.poll_interval)
+
+    def fileno(self):
+        return None
+
+    def close(self):
+        pass
+
+def _mtime_key(path):
+    try:
+        return (os.path.getmtime(path),path)
+    except OSError:
+        return (0.,path)
+
+class InotifyWatcher(PollingWatcher):
+    """
+    Watch dirpath for files whose names match pattern,
+    using inotify to report each file when it is closed after writing
+    (or moved into dirpath).
+    Events are read as they arrive, with no polling delay.
+    A file that is re-written is reported again,
+    but repeated events for a file whose modification time and size
+    have not changed since it was last reported are ignored.
+    If the kernel event queue overflows,
+    the directory is re-scanned to pick up any missed files.
+    """
+
+    def __init__(self,dirpath,pattern='*',include_existing_files=True,poll_interval=0.05):
+        if _libc is None:
+            raise OSError(errno.ENOSYS,'inotify is not available')
+        fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err,os.strerror(err))
+        wd = _libc.inotify_add_watch(fd,ctypes.c_char_p(_encode(dirpath)),IN_CLOSE_WRITE | IN_MOVED_TO)
+        if wd < 0:
+            err = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(err,os.strerror(err))
+        self.fd = fd
+        # dict of file names to the (mtime,size) they were last reported with
+        self.signatures = {}
+        # the watch is added before the initial scan,
+        # so that no file slips between the two
+        super(InotifyWatcher,self).__init__(dirpath,pattern,include_existing_files,poll_interval)
+
+    def dir_changed(self):
+        # scans are only done at startup and after a queue overflow
+        return True
+
+    def scan(self):
+        """
+        Reimplemented PollingWatcher.scan()
+        to record the (mtime,size) of each new file,
+        so that a file found by the scan while it was being written
+        is not reported again when its writer closes it.
+        """
+        new_paths = super(InotifyWatcher,self).scan()
+        for path in new_paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            self.signatures[os.path.basename(path)] = (st.st_mtime,st.st_size)
+        return new_paths
+
+    def read_events(self):
+        """Read all available events, and return the paths of new matching files."""
+        paths = []
+        overflow = False
+        while True:
+            try:
+                buf = os.read(self.fd,65536)
+            except OSError as ex:
+                if ex.errno in (errno.EAGAIN,errno.EWOULDBLOCK):
+                    break
+                raise
+            if not buf:
+                break
+            pos = 0
+            while pos < len(buf):
+                wd,mask,cookie,name_len = _event_header.unpack_from(buf,pos)
+                pos += _event_header.size
+                name = _decode(buf[pos:pos+name_len].rstrip(b'\0'))
+                pos += name_len
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                elif mask & (IN_ISDIR | IN_IGNORED) or not name:
+                    continue
+                elif self.matches(name):
+                    path = os.path.join(self.dirpath,name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        # removed since the event
+                        continue
+                    sig = (st.st_mtime,st.st_size)
+                    if self.signatures.get(name) == sig:
+                        continue
+                    self.signatures[name] = sig
+                    self.seen.add(name)
+                    if not path in paths:
+                        paths.append(path)
+        self.last_batch_closed = True
+        if overflow:
+            paths.extend([p for p in self.scan() if not p in paths])
+            self.last_batch_closed = False
+        return paths
+
+    def poll(self,timeout=None):
+        self.last_batch_closed = False
+        if self._pending:
+            paths = self._pending
+            self._pending = []
+            return paths
+        t_end = None if timeout is None else time.time() + timeout
+        while True:
+            t_left = None if t_end is None else max(t_end - time.time(),0.)
+            try:
+                ready,_,_ = select.select([self.fd],[],[],t_left)
+            except (OSError,select.error) as ex:
+                if ex.args[0] == errno.EINTR:
+                    continue
+                raise
+            if ready:
+                paths = self.read_events()
+                if paths:
+                    return paths
+                self.last_batch_closed = False
+            if t_end is not None and time.time() >= t_end:
+                return []
+
+    def fileno(self):
+        return self.fd
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+def make_watcher(dirpath,pattern='*',include_existing_files=True,poll_interval=0.05):
+    """
+    Return an InotifyWatcher for dirpath if inotify is available,
+    otherwise a PollingWatcher that scans every poll_interval seconds.
+    """
+    try:
+        return InotifyWatcher(dirpath,pattern,include_existing_files,poll_interval)
+    except OSError:
+        return PollingWatcher(dirpath,pattern,include_existing_files,poll_interval)
+
+class WriteCompletionTracker(object):
+    """
+    Keep track of files that are being written,
+    and tell when each one is complete.
+    A file is complete when its writer has closed it (if this is known),
+    or when its size (nonzero) and modification time 
+    have not changed for settle_time seconds.
+    If header_ext is given (e.g. '.txt' for SSRL beamline 1-5),
+    a file is only complete once a header file with the same name
+    and this extension also exists, and has also settled.
+    """
+
+    def __init__(self,settle_time=0.2,header_ext=None):
+        super(WriteCompletionTracker,self).__init__()
+        self.settle_time = settle_time
+        self.header_ext = header_ext
+        # path: [closed,signature,time when signature last changed]
+        self.pending = OrderedDict()
+
+    def add(self,paths,closed=False):
+        for path in paths:
+            self.pending[path] = [closed,None,None]
+
+    def header_path(self,path):
+        return os.path.splitext(path)[0] + self.header_ext
+
+    def signature(self,path):
+        st = os.stat(path)
+        sig = (st.st_size,st.st_mtime)
+        if self.header_ext is not None:
+            hst = os.stat(self.header_path(path))
+            sig = sig + (hst.st_size,hst.st_mtime)
+        return sig
+
+    def pop_ready(self):
+        """
+        Remove and return the list of pending paths that are complete.
+        Paths whose files have been removed are dropped.
+        """
+        now = time.time()
+        ready = []
+        dropped = []
+        for path,state in list(self.pending.items()):
+            closed,old_sig,t_changed = state
+            if closed and self.header_ext is None:
+                ready.append(path)
+                continue
+            if not os.path.exists(path):
+                # the file was removed while it was pending
+                dropped.append(path)
+                continue
+            try:
+                sig = self.signature(path)
+            except OSError:
+                # the header is not there (yet)
+                state[1:] = [None,now]
+                continue
+            if sig != old_sig:
+                state[1:] = [sig,now]
+                t_changed = now
+            if sig[0] > 0 and (closed or now - t_changed >= self.settle_time):
+                ready.append(path)
+        for path in ready + dropped:
+            self.pending.pop(path)
+        return ready
+
+    def n_pending(self):
+        return len(self.pending)
+
+class ReadyFileFeed(object):
+    """
+    Run a watcher (see make_watcher()) on a background thread,
+    check new files with a WriteCompletionTracker,
+    and queue the paths of complete files in the order they complete.
+    Consumers collect batches of ready paths with get_batch(),
+    and are never blocked by the completion checks.
+    Call close() to stop the thread and close the watcher.
+    """
+
+    def __init__(self,watcher,settle_time=0.2,header_ext=None,check_interval=0.02):
+        super(ReadyFileFeed,self).__init__()
+        self.watcher = watcher
+        self.tracker = WriteCompletionTracker(settle_time,header_ext)
+        self.check_interval = check_interval
+        self.ready = queue.Queue()
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run,name='ReadyFileFeed')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                # wake up often while files are settling 
+                if self.tracker.n_pending():
+                    timeout = self.check_interval
+                else:
+                    timeout = 0.1
+                paths = self.watcher.poll(timeout)
+                self.tracker.add(paths,self.watcher.last_batch_closed)
+                for path in self.tracker.pop_ready():
+                    self.ready.put(path)
+        except Exception as ex:
+            self.error = ex
+
+    def get_batch(self,timeout=None):
+        """
+        Return a list of paths of complete files,
+        waiting up to timeout seconds (forever if None) for at least one.
+        Returns an empty list if nothing was ready before the timeout.
+        Raises any exception that stopped the background thread.
+        """
+        batch = []
+        try:
+            batch.append(self.ready.get(True,timeout))
+            while True:
+                batch.append(self.ready.get_nowait())
+        except queue.Empty:
+            pass
+        if not batch and self.error is not None:
+            raise self.error
+        return batch
+
+    def close(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.watcher.close()
@@ -0,0 +1,197 @@
+"""
+Interpolation tables of the normalized SAXS intensity
+of spheres with normal size distributions.
+"""
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from .. import pawstools
+from . import saxstools
+
+class SphereFormFactorTable(object):
+    """
+    A table of log(I(q)/I(0)) for spheres of mean radius r0
+    and relative size-distribution width sigma (as computed by
+    saxstools.compute_spherical_normal_saxs()).
+    The normalized intensity depends only on u = q*r0 and sigma,
+    so a single table on a (u,log(sigma)) grid serves all q and r0.
+    Values are interpolated with cubic (Catmull-Rom) splines in u
+    and linearly in log(sigma), for 0 <= u <= u_max
+    and sigma_min <= sigma <= sigma_max.
+    The maximum relative error of the interpolation
+    is estimated when the table is built,
+    at every midpoint of the grid, and kept as max_error.
+    """
+
+    def __init__(self,u_max=100.,du=0.01,sigma_min=0.01,sigma_max=0.5,n_sigma=100):
+        super(SphereFormFactorTable,self).__init__()
+        self.u_max = float(u_max)
+        self.du = float(du)
+        self.sigma_min = float(sigma_min)
+        self.sigma_max = float(sigma_max)
+        self.n_sigma = int(n_sigma)
+        # one point of padding below u=0 (log(I) is even in u) and above u_max
+        self.n_u = int(np.ceil(self.u_max/self.du))+3
+        self.u_vals = (np.arange(self.n_u)-1)*self.du
+        self.log_sigma_vals = np.linspace(np.log(self.sigma_min),np.log(self.sigma_max),self.n_sigma)
+        self.dlog_sigma = self.log_sigma_vals[1]-self.log_sigma_vals[0]
+        self.log_I = None
+        self.max_error = None
+
+    def file_path(self,dirpath=None):
+        if dirpath is None:
+            dirpath = pawstools.paws_scratch_dir
+        fname = 'sphere_ff_table_u{}_du{}_s{}_{}_{}.npz'.format(
+        self.u_max,self.du,self.sigma_min,self.sigma_max,self.n_sigma)
+        return os.path.join(dirpath,fname)
+
+    def build(self):
+        """Compute the table and estimate its interpolation error."""
+        self.log_I = np.array([np.log(self.compute(self.u_vals,np.exp(ls)))
+        for ls in self.log_sigma_vals])
+        # the interpolation error peaks between grid points:
+        # check all sigma midpoints, at all u midpoints
+        u_mid = self.u_vals[1:-2]+0.5*self.du
+        err = 0.
+        for i in range(self.n_sigma-1):
+            sigma = np.exp(self.log_sigma_vals[i]+0.5*self.dlog_sigma)
+            I_mid = self.compute(u_mid,sigma)
+            err = max(err,np.max(np.abs(self.interpolate(u_mid,sigma)/I_mid-1.)))
+        self.max_error = err
+
+    @staticmethod
+    def compute(u,sigma):
+        return saxstools.compute_spherical_normal_saxs(u,1.,sigma)
+
+    def save(self,dirpath=None):
+        """
+        Save the table to dirpath.
+        The table is written to a temporary file that is then renamed,
+        so that other processes never load a partially written table.
+        """
+        path = self.file_path(dirpath)
+        fd,tmp_path = tempfile.mkstemp(suffix='.npz',dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd,'wb') as f:
+                np.savez(f,log_I=self.log_I,max_error=self.max_error)
+            os.rename(tmp_path,path)
+        except:
+            os.remove(tmp_path)
+            raise
+
+    def load(self,dirpath=None):
+        """
+        Load the table from dirpath,
+        returning False if it is not there or can not be read.
+        """
+        path = self.file_path(dirpath)
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path) as d:
+                log_I = d['log_I']
+                max_error = float(d['max_error'])
+        except Exception:
+            return False
+        if not log_I.shape == (self.n_sigma,self.n_u):
+            return False
+        self.log_I = log_I
+        self.max_error = max_error
+        return True
+
+    def covers(self,q,r0,sigma):
+        """True if the table covers sigma and q*r0 for all q."""
+        return (self.sigma_min <= sigma <= self.sigma_max
+        and np.all(np.abs(q)*r0 <= self.u_max))
+
+    def interpolate(self,u,sigma):
+        """
+        Interpolate I(u)/I(0) at sigma, for an array of 0 <= u <= u_max.
+        Costs O(len(u)), independent of the size-distribution grid.
+        """
+        f_s = (np.log(sigma)-self.log_sigma_vals[0])/self.dlog_sigma
+        i_s = min(max(int(f_s),0),self.n_sigma-2)
+        a_s = f_s-i_s
+        row = (1.-a_s)*self.log_I[i_s] + a_s*self.log_I[i_s+1]
+        f_u = np.abs(u)/self.du+1.
+        i_u = np.clip(f_u.astype(int),1,self.n_u-3)
+        a = f_u-i_u
+        p0 = row[i_u-1]
+        p1 = row[i_u]
+        p2 = row[i_u+1]
+        p3 = row[i_u+2]
+        log_I = p1 + 0.5*a*(p2-p0 + a*(2.*p0-5.*p1+4.*p2-p3 + a*(3.*(p1-p2)+p3-p0)))
+        return np.exp(log_I)
+
+    def lookup(self,q,r0,sigma):
+        """
+        Return the normalized intensity for q, r0, and sigma,
+        or None if they are not covered by the table.
+        """
+        if not self.covers(q,r0,sigma):
+            return None
+        return self.interpolate(np.asarray(q,dtype=float)*r0,sigma)
+
+# Process-wide cache of SphereFormFactorTables,
+# and the threads building the tables that are not ready yet
+_tables = {}
+_builders = {}
+_build_errors = {}
+_tables_lock = threading.Lock()
+
+def get_sphere_table(dirpath=None,wait=True,**grid_params):
+    """
+    Return a SphereFormFactorTable for the given grid parameters
+    (see SphereFormFactorTable.__init__()).
+    The table is loaded from dirpath (default: the paws scratch directory),
+    or built and saved there if it has not been built before,
+    and is kept in memory for later calls.
+    Building a table takes a while (about 20 seconds for the default grid),
+    and is done on a background thread.
+    If wait is False, None is returned until the table is ready.
+    """
+    key = (dirpath,tuple(sorted(grid_params.items())))
+    with _tables_lock:
+        table = _tables.get(key)
+        if table is not None:
+            return table
+        builder = _builders.get(key)
+        if builder is None:
+            table = SphereFormFactorTable(**grid_params)
+            if table.load(dirpath):
+                _tables[key] = table
+                return table
+            builder = threading.Thread(target=_build_table,args=(key,table,dirpath),
+            name='SphereFormFactorTable')
+            builder.daemon = True
+            _builders[key] = builder
+            _build_errors.pop(key,None)
+            builder.start()
+    if not wait:
+        return None
+    builder.join()
+    with _tables_lock:
+        if key in _build_errors:
+            raise _build_errors[key]
+        return _tables[key]
+
+def _build_table(key,table,dirpath):
+    try:
+        table.build()
+        try:
+            table.save(dirpath)
+        except Exception:
+            # the table is still good for this process
+            pass
+        with _tables_lock:
+            _tables[key] = table
+    except Exception as ex:
+        with _tables_lock:
+            _build_errors[key] = ex
+    finally:
+        with _tables_lock:
+            _builders.pop(key,None)
+
@@ -0,0 +1,141 @@
+"""
+Tools for reading and writing stacks of frames in HDF5 files.
+h5py (and hdf5plugin, for lz4 or blosc compression) are imported on first use.
+"""
+import os
+import atexit
+import threading
+from collections import OrderedDict
+
+# Process-wide cache of open h5py.Files,
+# so that Operations reading or writing one frame at a time
+# do not reopen the file for every frame.
+# Files open for reading are kept with the (mtime,size) of the file
+# when they were opened, and are reopened if the file has changed since,
+# so that frames appended by other processes are seen.
+max_open_files = 16
+_files = OrderedDict()
+_signatures = {}
+_files_lock = threading.RLock()
+
+def file_signature(path):
+    st = os.stat(path)
+    return (st.st_mtime,st.st_size)
+
+def open_h5(path,mode='r'):
+    """
+    Return an open h5py.File for path from the cache, opening it if needed.
+    mode 'r' reuses a file that is already open for writing,
+    or a file open for reading that has not been modified since it was opened.
+    mode 'a' reopens a file that is only open for reading.
+    Call close_h5() to close cached files.
+    """
+    import h5py
+    with _files_lock:
+        f = _files.pop(path,None)
+        if f is not None and f.id.valid and f.mode == 'r':
+            if mode != 'r' or file_signature(path) != _signatures.get(path):
+                f.close()
+        if f is not None and not f.id.valid:
+            f = None
+        if f is None:
+            if mode == 'r':
+                _signatures[path] = file_signature(path)
+            f = h5py.File(path,mode)
+        _files[path] = f
+        while len(_files) > max_open_files:
+            old_path,old_f = _files.popitem(last=False)
+            _signatures.pop(old_path,None)
+            old_f.close()
+        return f
+
+def close_h5(path=None):
+    """Close the cached file for path (or all cached files, if path is None)."""
+    with _files_lock:
+        paths = list(_files.keys()) if path is None else [path]
+        for p in paths:
+            f = _files.pop(p,None)
+            _signatures.pop(p,None)
+            if f is not None and f.id.valid:
+                f.close()
+
+atexit.register(close_h5)
+
+def frame_index(index,n_frames=None):
+    """
+    Convert index to something that can index the first axis of a dataset:
+    None (all frames), an int,
+    a [start,stop,step] list, or a 'start:stop:step' string.
+    If n_frames is given, a negative int counts back from the last frame,
+    and an int outside the n_frames frames raises an IndexError.
+    """
+    if index is None:
+        return slice(None)
+    if isinstance(index,(str,type(u''))):
+        parts = [int(p) if p.strip() else None for p in index.split(':')]
+        if len(parts) > 1:
+            return slice(*parts)
+        index = parts[0]
+    elif isinstance(index,(list,tuple)):
+        return slice(*index)
+    idx = int(index)
+    if n_frames is not None:
+        if idx < 0:
+            idx += n_frames
+        if not 0 <= idx < n_frames:
+            raise IndexError('frame {} is out of range for {} frames'.format(index,n_frames))
+    return idx
+
+def read_frames(path,dataset,index=None):
+    """
+    Read the frame(s) at index (see frame_index())
+    from dataset in the HDF5 file at path.
+    Only the chunks that hold the requested frames are read.
+    """
+    with _files_lock:
+        dset = open_h5(path,'r')[dataset]
+        return dset[frame_index(index,dset.shape[0])]
+
+def n_frames(path,dataset):
+    with _files_lock:
+        return open_h5(path,'r')[dataset].shape[0]
+
+def compression_args(compression):
+    """
+    Return a dict of h5py.Group.create_dataset() keyword arguments
+    for compression None, 'gzip', 'lzf', 'lz4', or 'blosc'.
+    """
+    if compression is None:
+        return {}
+    if compression in ['gzip','lzf']:
+        return {'compression':compression}
+    import hdf5plugin
+    if compression == 'lz4':
+        return dict(hdf5plugin.LZ4())
+    elif compression == 'blosc':
+        return dict(hdf5plugin.Blosc())
+    raise ValueError('unsupported compression {}'.format(compression))
+
+def append_frames(path,dataset,frames,compression=None):
+    """
+    Append an array of frames (first axis indexes the frames)
+    to dataset in the HDF5 file at path.
+    The dataset is created on first write,
+    chunked with one frame per chunk, and extendable along the first axis.
+    Returns the number of frames in the dataset.
+    """
+    with _files_lock:
+        f = open_h5(path,'a')
+        if dataset in f:
+            dset = f[dataset]
+        else:
+            frame_shape = frames.shape[1:]
+            dset = f.create_dataset(dataset,shape=(0,)+frame_shape,dtype=frames.dtype,
+            maxshape=(None,)+frame_shape,chunks=(1,)+frame_shape,
+            **compression_args(compression))
+        n = dset.shape[0]
+        dset.resize(n+frames.shape[0],axis=0)
+        dset[n:] = frames
+        f.flush()
+        return dset.shape[0]
+
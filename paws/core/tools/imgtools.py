@@ -0,0 +1,194 @@
+"""
+Tools for reading image files.
+"""
+import os
+import threading
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+# numpy dtypes for EDF DataType header values
+edf_dtypes = {
+    'unsignedbyte':'u1','signedbyte':'i1',
+    'unsignedshort':'u2','signedshort':'i2',
+    'unsignedinteger':'u4','signedinteger':'i4',
+    'unsignedlong':'u4','signedlong':'i4',
+    'unsigned64':'u8','signed64':'i8',
+    'floatvalue':'f4','float':'f4','realvalue':'f4',
+    'doublevalue':'f8','double':'f8'}
+
+# Image readers are imported on first use.
+def read_tifffile(path):
+    """Read a .tif file with tifffile, as LoadTif does."""
+    import tifffile
+    return tifffile.imread(path)
+
+def read_fabio(path):
+    """Read an image file with fabio, as FabIOOpen does."""
+    import fabio
+    return fabio.open(path).data
+
+def read_pil(path):
+    """
+    Read an image file with PIL, as LoadTif_PIL does.
+    Returns a tuple of (image data,dict of image metadata).
+    """
+    from PIL import Image
+    pil_img = Image.open(path)
+    return np.array(pil_img),pil_img.info
+
+image_readers = OrderedDict([('tifffile',read_tifffile),('fabio',read_fabio),('PIL',read_pil)])
+
+def read_image(path,memmap=False):
+    """
+    Read the image data from the file at path into a numpy array.
+    .tif files are read with tifffile, everything else with fabio.
+    If memmap is True, uncompressed .tif and .edf files
+    are returned as read-only numpy.memmaps (see memmap_image()).
+    """
+    if memmap:
+        img = memmap_image(path)
+        if img is not None:
+            return img
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ['.tif','.tiff']:
+        return read_tifffile(path)
+    else:
+        return read_fabio(path)
+
+def memmap_image(path):
+    """
+    Return a read-only numpy.memmap of the image data in the file at path,
+    or None if the file is not an uncompressed single-frame .tif or .edf.
+    The data are read from the page cache as they are accessed,
+    instead of being copied into memory up front.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ['.tif','.tiff']:
+        return memmap_tif(path)
+    elif ext == '.edf':
+        return memmap_edf(path)
+    return None
+
+def memmap_tif(path):
+    """
+    Return a read-only numpy.memmap of a .tif file,
+    or None if the image data are compressed or not contiguous in the file.
+    """
+    import tifffile
+    try:
+        return tifffile.memmap(path,mode='r')
+    except (ValueError,AttributeError):
+        return None
+
+def read_edf_header(path):
+    """
+    Read the header of an .edf file.
+    Returns a tuple of (dict of header keys and values,size of header in bytes).
+    """
+    with open(path,'rb') as f:
+        hdr = b''
+        while not b'}' in hdr:
+            block = f.read(512)
+            if not block:
+                raise ValueError('no end of header found in {}'.format(path))
+            hdr += block
+    hdr_size = hdr.index(b'}') + 1
+    # the header ends with a newline after the closing brace
+    if hdr[hdr_size:hdr_size+1] == b'\n':
+        hdr_size += 1
+    d = {}
+    for line in hdr[:hdr_size].decode('ascii','replace').split(';'):
+        if '=' in line:
+            k,v = line.split('=',1)
+            d[k.strip().strip('{').strip()] = v.strip()
+    return d,hdr_size
+
+def memmap_edf(path):
+    """
+    Return a read-only numpy.memmap of a single-frame .edf file,
+    or None if the image data are compressed.
+    """
+    hdr,hdr_size = read_edf_header(path)
+    if hdr.get('Compression','None').lower() not in ['none','']:
+        return None
+    dtype = edf_dtypes.get(hdr.get('DataType','').lower())
+    if dtype is None or not 'Dim_1' in hdr:
+        return None
+    if hdr.get('ByteOrder','LowByteFirst') == 'HighByteFirst':
+        dtype = '>'+dtype
+    else:
+        dtype = '<'+dtype
+    shape = (int(hdr.get('Dim_2',1)),int(hdr['Dim_1']))
+    # the data of a single frame fill the file after the header
+    if hdr_size + shape[0]*shape[1]*np.dtype(dtype).itemsize != os.path.getsize(path):
+        return None
+    return np.memmap(path,dtype=dtype,mode='r',offset=hdr_size,shape=shape)
+
+class ImagePrefetcher(object):
+    """
+    Read images ahead of time on a pool of threads,
+    while earlier images are being processed.
+    For each index i passed to advance(),
+    the images at paths[i] through paths[i+depth] are read
+    (or queued for reading) with image_readers[reader],
+    and the caller collects each image with take().
+    Images that are skipped over are discarded. 
+    Call start() before advance(), and close() when finished.
+    """
+
+    def __init__(self,paths,reader='tifffile',depth=4,n_workers=None):
+        super(ImagePrefetcher,self).__init__()
+        if not reader in image_readers:
+            raise ValueError('image reader {} not in {}'.format(reader,list(image_readers.keys())))
+        self.paths = list(paths)
+        self.reader = reader
+        self.depth = max(int(depth),0)
+        self.n_workers = n_workers or min(max(self.depth,1),4)
+        self._pool = None
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_idx = 0
+
+    def start(self):
+        self._pool = ThreadPool(self.n_workers)
+        return self
+
+    def advance(self,i):
+        """
+        Discard images before paths[i],
+        and queue reads of paths[i] through paths[i+depth].
+        """
+        read = image_readers[self.reader]
+        with self._lock:
+            keep = set(self.paths[i:i+self.depth+1])
+            for path in list(self._results.keys()):
+                if not path in keep:
+                    self._results.pop(path)
+            self._next_idx = max(self._next_idx,i)
+            while self._next_idx < min(i+self.depth+1,len(self.paths)):
+                path = self.paths[self._next_idx]
+                if not path in self._results:
+                    self._results[path] = self._pool.apply_async(read,(path,))
+                self._next_idx += 1
+
+    def take(self,path):
+        """
+        Wait for and return the prefetched image for path,
+        reading it now if it was not prefetched.
+        Raises any exception raised by the reader.
+        """
+        with self._lock:
+            result = self._results.pop(path,None)
+        if result is None:
+            return image_readers[self.reader](path)
+        return result.get()
+
+    def close(self):
+        with self._lock:
+            self._results = OrderedDict()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
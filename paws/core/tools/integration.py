@@ -0,0 +1,83 @@
+"""
+Tools for integrating images with pyFAI.
+"""
+from collections import OrderedDict
+import threading
+
+import numpy as np
+import pyFAI
+
+# Process-wide cache of pyFAI.AzimuthalIntegrators,
+# so that consecutive frames with the same calibration
+# reuse the geometry arrays and lookup tables
+# that pyFAI builds on the first integration.
+max_integrators = 8
+_integrators = OrderedDict()
+_integrators_lock = threading.Lock()
+
+def integrator_key(poni_dict,shape=None,**integration_params):
+    """
+    Build a hashable key from a dict of .poni calibration parameters,
+    an image shape, and keyword integration parameters.
+    """
+    poni_key = tuple(sorted([(k,repr(v)) for k,v in poni_dict.items()]))
+    params_key = tuple(sorted([(k,repr(v)) for k,v in integration_params.items()]))
+    return (poni_key,tuple(shape or ()),params_key)
+
+def get_integrator(poni_dict,shape=None,**integration_params):
+    """
+    Return a pyFAI.AzimuthalIntegrator set up with poni_dict,
+    for integrating images of the given shape
+    with the given integration parameters (npt, unit, radial_range, etc.),
+    along with a threading.Lock that must be held while integrating with it.
+    The integrator is cached and returned again for the same arguments,
+    keeping up to max_integrators integrators in memory.
+    """
+    key = integrator_key(poni_dict,shape,**integration_params)
+    with _integrators_lock:
+        if key in _integrators:
+            p_lock = _integrators.pop(key)
+        else:
+            p = pyFAI.AzimuthalIntegrator()
+            p.setPyFAI(**poni_dict)
+            p_lock = (p,threading.Lock())
+        _integrators[key] = p_lock
+        while len(_integrators) > max_integrators:
+            _integrators.popitem(last=False)
+    return p_lock
+
+def screen_nonpositive(img):
+    """
+    Return a copy of img with non-positive pixels set to zero,
+    to be screened out of integration as pyFAI dummy values (dummy=0).
+    Screening by value keeps the integrator's mask unchanged from frame to frame,
+    whereas a new per-frame mask makes pyFAI rebuild its lookup tables.
+    """
+    return np.where(img > 0,img,0)
+
+def integrate1d(poni_dict,img,npt,polarization_factor=None,**integration_params):
+    """
+    Integrate img to npt points of I(q) with a cached integrator (see get_integrator()),
+    screening out non-positive pixels.
+    Returns the (q, I) result of pyFAI.AzimuthalIntegrator.integrate1d().
+    """
+    p,lock = get_integrator(poni_dict,img.shape,npt=npt,**integration_params)
+    with lock:
+        return p.integrate1d(screen_nonpositive(img),npt,dummy=0.,
+        polarization_factor=polarization_factor,**integration_params)
+
+def integrate2d(poni_dict,img,npt,polarization_factor=None,**integration_params):
+    """
+    Integrate img to I(chi,q) at npt radial points with a cached integrator
+    (see get_integrator()), screening out non-positive pixels.
+    Returns the (I, q, chi) result of pyFAI.AzimuthalIntegrator.integrate2d().
+    """
+    p,lock = get_integrator(poni_dict,img.shape,npt=npt,**integration_params)
+    with lock:
+        return p.integrate2d(screen_nonpositive(img),npt,dummy=0.,
+        polarization_factor=polarization_factor,**integration_params)
+
+def clear_integrators():
+    with _integrators_lock:
+        _integrators.clear()
+
@@ -0,0 +1,45 @@
+"""
+Tools for finding peaks and other local extrema in 1d data.
+"""
+import numpy as np
+from scipy.ndimage import maximum_filter1d
+
+def window_maxima(y,w):
+    """
+    Find the points of y that are maxima of the windows 
+    of w points on either side of them,
+    for indices w <= idx < len(y)-w.
+    A point is a window maximum if it is the first occurrence
+    of the maximum of y[idx-w:idx+w+1], 
+    i.e. if np.argmax(y[idx-w:idx+w+1]) == w.
+    Runs in O(len(y)), with sliding-window maximum filters.
+    Returns an array of the indices of the window maxima.
+    """
+    y = np.asarray(y,dtype=float)
+    w = int(w)
+    if w < 1:
+        raise ValueError('window half-width must be at least 1, got {}'.format(w))
+    if len(y) < 2*w+1:
+        return np.zeros(0,dtype=int)
+    idx = np.arange(w,len(y)-w)
+    y_idx = y[idx]
+    # maximum_filter1d(y,n)[j] is the maximum of y[j-n//2:j-n//2+n]
+    win_max = maximum_filter1d(y,2*w+1)[idx]
+    left_max = maximum_filter1d(y,w)[idx-w+w//2]
+    return idx[(y_idx >= win_max) & (y_idx > left_max)]
+
+def window_minima(y,w):
+    """
+    Find the points of y that are minima of the windows
+    of w points on either side of them (see window_maxima()).
+    Returns an array of the indices of the window minima.
+    """
+    return window_maxima(-1*np.asarray(y,dtype=float),w)
+
+def window_extrema(y,w):
+    """
+    Find the window maxima and minima of y (see window_maxima()).
+    Returns a tuple of arrays of the indices of the maxima and the minima.
+    """
+    return window_maxima(y,w),window_minima(y,w)
+
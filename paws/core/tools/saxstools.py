@@ -4,12 +4,17 @@ import copy
 
 import numpy as np
 from scipy.optimize import minimize as scipimin
+from scipy.optimize import least_squares
 
-def compute_saxs(q,flags,params):
+from . import peaktools
+
+def compute_saxs(q,flags,params,table=None):
     """
     Given q, a dict of population flags,
     and a dict of scattering equation parameters,
     compute the saxs spectrum.
+    If a formfactortable.SphereFormFactorTable is given as table,
+    it is used for the form factor of polydisperse spheres.
     Supported parameters are... TODO: fill in 
 
     TODO: Document the equation.
@@ -33,15 +38,18 @@ def compute_saxs(q,flags,params):
             I0_sph = params['I0_sphere']
             r0_sph = params['r0_sphere']
             sigma_sph = params['sigma_sphere']
-            I_sph = compute_spherical_normal_saxs(q,r0_sph,sigma_sph)
+            I_sph = compute_spherical_normal_saxs(q,r0_sph,sigma_sph,table)
             I += I0_sph*I_sph
     return I
 
-def profile_spectrum(q,I):
+def profile_spectrum(q,I,n_bins=100,q_bin_range=(0.,1.)):
     """
     Profile a saxs spectrum (q,I) 
     by taking several fast numerical metrics 
     from the measured data.
+    The q values are expected in increasing order.
+    For the binned intensity metrics, 
+    the q range q_bin_range is divided into n_bins bins of equal width.
 
     :returns: dictionary of scalar metrics.
     Dict keys and descriptions: 
@@ -54,7 +62,8 @@ def profile_spectrum(q,I):
     - 'Imax_sharpness': maximum intensity divided by 
         the mean intensity in the range 0.9*q_Imax<q<1.1*q_Imax.
     - 'q_bin_edges' : array of q-values to use as upper bin limits for intensity integration. 
-    - 'q_bin_strengths' : array of integrated log(I) within the bins specified by q_bin_edges.
+    - 'q_bin_strengths' : array of integrated intensity within the bins specified by q_bin_edges,
+        (trapezoids between points in the same bin), divided by the integral over all q.
     - 'log_fluctuation': Integrated fluctuation of log(I): 
         sum of difference in log(I) between adjacent points, 
         taken only where this difference changes sign, 
@@ -112,21 +121,15 @@ def profile_spectrum(q,I):
     log_fluctuation = fluc/logI_max
 
     ### bin-integrated log(intensity) analysis
-    nbins = 100
-    qbinmax = float(1.)
-    qbinstep = qbinmax/nbins
-    q_bin_edges = np.arange(qbinstep,qbinmax+qbinstep,qbinstep)
-    q_bin_strengths = np.zeros(q_bin_edges.shape) 
-    binfloor = 0
-    for ibin,binmax in zip(range(nbins),q_bin_edges):
-        binidx = ((q>=binfloor) & (q<binmax))
-        if any(binidx):
-            qbin = q[ binidx ]
-            Ibin = I[ binidx ]
-            dqbin = qbin[1:]-qbin[:-1]
-            Ibin = (Ibin[1:]+Ibin[:-1])/2
-            q_bin_strengths[ibin] = np.sum(Ibin * dqbin) / I_integral 
-        binfloor = binmax
+    q_bin_edges = np.linspace(q_bin_range[0],q_bin_range[1],n_bins+1)[1:]
+    # bin index of each point: bin i holds q_bin_edges[i-1] <= q < q_bin_edges[i],
+    # points below the range get -1, and points above get n_bins
+    ibin = np.searchsorted(q_bin_edges,q,side='right')
+    ibin[q < q_bin_range[0]] = -1
+    # integrate each bin over the trapezoids between neighboring points in the bin
+    in_bin = ((ibin[1:] == ibin[:-1]) & (ibin[:-1] >= 0) & (ibin[:-1] < n_bins))
+    q_bin_strengths = np.bincount(ibin[:-1][in_bin],weights=(dq*I_trap)[in_bin],
+        minlength=n_bins)[:n_bins] / I_integral
     d = OrderedDict()
     d['q_Imax'] = q_Imax
     d['Imax_over_Imean'] = Imax_over_Imean
@@ -264,31 +267,13 @@ def parameterize_spectrum(q,I,flags,fixed_params={}):
     d['chi2log_guess'] = compute_chi2(logI_nz_s,logIguess_nz_s)
     return d
 
-def fit_spectrum(q,I,objfun,flags,params,fit_params,constraints=[]):
+def setup_fit(flags,params,fit_params,constraints=[]):
     """
-    Fit a saxs spectrum (I(q) vs q) to the theoretical spectrum 
-    for one or several scattering populations.
-    Input objfun (string) specifies objective function to use in optimization.
-    Inputs flags (dict) and params (dict) describe flagged scatterer populations
-    and initial guesses for the corresponding parameters for the scattering equation.
-    Input fit_params (list of strings) indicate the parameters that will be optimized. 
-    Input constraints (list of strings) to specify constraints.
-    
-    Supported objective functions: 
-    (1) 'chi2': sum of difference squared across entire q range. 
-    (2) 'chi2log': sum of difference of logarithm, squared, across entire q range. 
-    (3) 'chi2norm': sum of difference divided by measured value, squared, aross entire q range. 
-    (4) 'low_q_chi2': sum of difference squared in only the lowest half of measured q range. 
-    (5) 'low_q_chi2log': sum of difference of logarithm, squared, in lowest half of measured q range. 
-    (6) 'pearson': pearson correlation between measured and modeled spectra. 
-    (7) 'pearson_log': pearson correlation between logarithms of measured and modeled spectra.
-    (8) 'low_q_pearson': pearson correlation between measured and modeled spectra. 
-    (9) 'low_q_pearson_log': pearson correlation between logarithms of measured and modeled spectra. 
-
-    Supported constraints: 
-    (1) 'fix_I0': keeps I(q=0) fixed to the value specified in the input params.
-
-    TODO: document the objective functions, etc.
+    Trim the fit_params of fit_spectrum() down to the parameters
+    of the flagged populations, and apply the constraints.
+    Returns the trimmed list of fit_params,
+    lists of their initial values and (min,max) bounds,
+    and a list of constraint dicts for scipy.optimize.minimize().
     """
     pre_flag = flags['precursor_scattering']
     form_flag = flags['form_factor_scattering']
@@ -356,36 +341,164 @@ def fit_spectrum(q,I,objfun,flags,params,fit_params,constraints=[]):
             x_bounds.append((0.0,None))
         elif k in ['sigma_sphere']:
             x_bounds.append((0.0,0.5))
+    return fit_params,x_init,x_bounds,c
+
+# Objective functions of fit_spectrum() that are sums of squared residuals:
+# fit_spectrum_batch() minimizes these with scipy.optimize.least_squares()
+residual_objectives = ['chi2','chi2log','chi2norm','low_q_chi2','low_q_chi2log']
+
+class FitObjective(object):
+    """
+    The objective function of fit_spectrum(),
+    for one measured spectrum, one choice of objfun,
+    and the fit_params to be optimized.
+    Called with a vector of values for the fit_params,
+    it returns the objective evaluated for the model spectrum
+    computed by compute_saxs() with those values substituted into params.
+
+    The q values, masks, and measured (log) intensities used by objfun
+    are selected once, when the objective is built.
+    The parameter values are substituted into a single dict,
+    the model spectrum is accumulated in preallocated buffers,
+    and the form factor of each population is only recomputed 
+    when its size parameters change.
+    """
+
+    def __init__(self,q,I,objfun,flags,params,fit_params,table=None):
+        super(FitObjective,self).__init__()
+        if not objfun in residual_objectives+['pearson','low_q_pearson','pearson_log','low_q_pearson_log']:
+            msg = 'objective function {} not supported'.format(objfun)
+            raise ValueError(msg)
+        self.objfun = objfun
+        self.flags = flags
+        self.params = dict(params)
+        self.fit_params = list(fit_params)
+        self.table = table
+        idx = np.ones(len(q),dtype=bool)
+        if objfun in ['chi2log','chi2norm','low_q_chi2log','pearson_log','low_q_pearson_log']:
+            idx = idx & (I>0)
+        if objfun in ['low_q_chi2','low_q_chi2log','low_q_pearson','low_q_pearson_log']:
+            idx = idx & (q<0.4)
+        self.q = q[idx]
+        self.log_flag = objfun in ['chi2log','low_q_chi2log','pearson_log','low_q_pearson_log']
+        self.pearson_flag = not objfun in residual_objectives
+        y = I[idx]
+        if self.log_flag:
+            y = np.log(y)
+        self.y = y
+        self.sqrt_w = None
+        if objfun == 'chi2norm':
+            w = float(1)/I[idx]
+            self.sqrt_w = np.sqrt(w/np.sum(w))
+        if self.pearson_flag:
+            self.y_centered = y-np.mean(y)
+            self.y_norm = np.sqrt(np.dot(self.y_centered,self.y_centered))
+        n_q = len(self.q)
+        self.I_buf = np.zeros(n_q)
+        self.tmp_buf = np.zeros(n_q)
+        self.log_buf = np.zeros(n_q)
+        self.res_buf = np.zeros(n_q)
+        # (r0,sigma,normalized intensity) for each population
+        self._form_factors = {}
+
+    def set_x(self,x):
+        for k,xk in zip(self.fit_params,x):
+            self.params[k] = xk
+
+    def form_factor(self,population,r0,sigma):
+        ff = self._form_factors.get(population)
+        if ff is None or ff[0] != r0 or ff[1] != sigma:
+            ff = (r0,sigma,compute_spherical_normal_saxs(self.q,r0,sigma,self.table))
+            self._form_factors[population] = ff
+        return ff[2]
+
+    def model(self):
+        """Compute the model spectrum for the current params (as compute_saxs())."""
+        p = self.params
+        f = self.flags
+        I = self.I_buf
+        if f['bad_data'] or f['diffraction_peaks']:
+            I.fill(0.)
+            return I
+        I.fill(p['I0_floor'])
+        if f['precursor_scattering']:
+            np.multiply(self.form_factor('precursor',p['r0_precursor'],0),p['I0_precursor'],out=self.tmp_buf)
+            I += self.tmp_buf
+        if f['form_factor_scattering']:
+            np.multiply(self.form_factor('sphere',p['r0_sphere'],p['sigma_sphere']),p['I0_sphere'],out=self.tmp_buf)
+            I += self.tmp_buf
+        return I
+
+    def residuals(self):
+        """
+        Compute the residuals for the current params, 
+        for the objective functions in residual_objectives:
+        the objective is the sum of the squared residuals.
+        """
+        I = self.model()
+        if self.log_flag:
+            I = np.log(I,out=self.log_buf)
+        r = np.subtract(I,self.y,out=self.res_buf)
+        if self.sqrt_w is not None:
+            r *= self.sqrt_w
+        return r
+
+    def jacobian(self):
+        """Compute the derivatives of residuals() with respect to the fit_params."""
+        I,J = compute_saxs_jacobian(self.q,self.flags,self.params,self.fit_params,self.table)
+        if self.log_flag:
+            J /= I[:,np.newaxis]
+        elif self.sqrt_w is not None:
+            J *= self.sqrt_w[:,np.newaxis]
+        return J
+
+    def __call__(self,x):
+        self.set_x(x)
+        if not self.pearson_flag:
+            r = self.residuals()
+            return np.dot(r,r)
+        I = self.model()
+        if self.log_flag:
+            I = np.log(I,out=self.log_buf)
+        I_c = np.subtract(I,np.mean(I),out=self.res_buf)
+        return -1*np.dot(I_c,self.y_centered)/(np.sqrt(np.dot(I_c,I_c))*self.y_norm)
+
+def fit_spectrum(q,I,objfun,flags,params,fit_params,constraints=[],table=None):
+    """
+    Fit a saxs spectrum (I(q) vs q) to the theoretical spectrum 
+    for one or several scattering populations.
+    Input objfun (string) specifies objective function to use in optimization.
+    Inputs flags (dict) and params (dict) describe flagged scatterer populations
+    and initial guesses for the corresponding parameters for the scattering equation.
+    Input fit_params (list of strings) indicate the parameters that will be optimized. 
+    Input constraints (list of strings) to specify constraints.
+    Input table (formfactortable.SphereFormFactorTable, optional)
+    is used to interpolate the form factor of polydisperse spheres,
+    instead of computing it for every evaluation of the objective.
+    
+    Supported objective functions: 
+    (1) 'chi2': sum of difference squared across entire q range. 
+    (2) 'chi2log': sum of difference of logarithm, squared, across entire q range. 
+    (3) 'chi2norm': sum of difference divided by measured value, squared, aross entire q range. 
+    (4) 'low_q_chi2': sum of difference squared in only the lowest half of measured q range. 
+    (5) 'low_q_chi2log': sum of difference of logarithm, squared, in lowest half of measured q range. 
+    (6) 'pearson': pearson correlation between measured and modeled spectra. 
+    (7) 'pearson_log': pearson correlation between logarithms of measured and modeled spectra.
+    (8) 'low_q_pearson': pearson correlation between measured and modeled spectra. 
+    (9) 'low_q_pearson_log': pearson correlation between logarithms of measured and modeled spectra. 
+
+    Supported constraints: 
+    (1) 'fix_I0': keeps I(q=0) fixed to the value specified in the input params.
+
+    TODO: document the objective functions, etc.
+    """
+    fit_params,x_init,x_bounds,c = setup_fit(flags,params,fit_params,constraints)
 
     d_opt = copy.deepcopy(params) 
     x_opt = []
     # Only proceed if there is still work to do.
     if any(x_init):
-        saxs_fun = lambda q,x,d: compute_saxs_with_substitutions(q,flags,d,fit_params,x)
-        I_nz = (I>0)
-        n_q = len(q)
-        idx_lowq = (q<0.4)
-        if objfun == 'chi2':
-            fit_obj = lambda x: compute_chi2( saxs_fun(q,x,params) , I )
-        elif objfun == 'chi2log':
-            fit_obj = lambda x: compute_chi2( np.log(saxs_fun(q[I_nz],x,params)) , np.log(I[I_nz]) )
-        elif objfun == 'chi2norm':
-            fit_obj = lambda x: compute_chi2( saxs_fun(q[I_nz],x,params) , I[I_nz] , weights=float(1)/I[I_nz] )
-        elif objfun == 'low_q_chi2':
-            fit_obj = lambda x: compute_chi2( saxs_fun(q[idx_lowq],x,params) , I[idx_lowq] )
-        elif objfun == 'pearson':
-            fit_obj = lambda x: -1*compute_pearson( saxs_fun(q,x,params) , I )
-        elif objfun == 'low_q_pearson':
-            fit_obj = lambda x: -1*compute_pearson( saxs_fun(q[idx_lowq],x,params) , I[idx_lowq] )
-        elif objfun == 'low_q_chi2log':
-            fit_obj = lambda x: compute_chi2( np.log(saxs_fun(q[I_nz][idx_lowq[I_nz]],x,params)) , np.log(I[I_nz][idx_lowq[I_nz]]) ) 
-        elif objfun == 'pearson_log':
-            fit_obj = lambda x: -1*compute_pearson( np.log(saxs_fun(q[I_nz],x,params)) , np.log(I[I_nz]) ) 
-        elif objfun == 'low_q_pearson_log':
-            fit_obj = lambda x: -1*compute_pearson( np.log(saxs_fun(q[I_nz][idx_lowq[I_nz]],x,params)) , np.log(I[I_nz][idx_lowq[I_nz]]) ) 
-        else:
-            msg = 'objective function {} not supported'.format(objfun)
-            raise ValueError(msg)
+        fit_obj = FitObjective(q,I,objfun,flags,params,fit_params,table)
         d_opt['objective_before'] = fit_obj(x_init)
         #try:
         res = scipimin(fit_obj,x_init,bounds=x_bounds,constraints=c)
@@ -403,7 +516,209 @@ def fit_spectrum(q,I,objfun,flags,params,fit_params,constraints=[]):
             d_opt[k] = xk
     return d_opt    
 
-def compute_spherical_normal_saxs(q,r0,sigma):
+# Relative step sizes (and the smallest absolute steps) for the 
+# forward-difference derivatives in compute_saxs_jacobian()
+fd_rel_step = 1E-6
+fd_min_step = {'r0_sphere':1E-6,'sigma_sphere':1E-8}
+
+def fit_spectrum_batch(q,I_stack,objfun,flags,params,fit_params,constraints=[],table=None,warm_start=True):
+    """
+    Fit a stack of saxs spectra that share the same q values,
+    one spectrum I(q) per row of I_stack,
+    with the same model, objective functions, and constraints as fit_spectrum().
+    Each spectrum is fit starting from the optimized parameters 
+    of the previous spectrum if warm_start is True,
+    or from the input params otherwise.
+
+    For the least-squares objective functions (see residual_objectives),
+    the residuals are minimized by scipy.optimize.least_squares(),
+    with derivatives from compute_saxs_jacobian().
+    The 'fix_I0' constraint keeps I(q=0) of every spectrum
+    at the value given by the input params.
+    On two intensity parameters, it is satisfied
+    by eliminating the first of them.
+    Other objective functions, and 'fix_I0' on three intensity parameters,
+    fall back to fit_spectrum() for each spectrum.
+
+    Returns a list of dicts of optimized parameters, one per spectrum,
+    in the format returned by fit_spectrum().
+    """
+    I_stack = np.asarray(I_stack,dtype=float)
+    fit_keys,x_init,x_bounds,c = setup_fit(flags,params,fit_params,constraints)
+    elim_key = None
+    if len(c) > 0:
+        I_keys = [k for k in ['I0_floor','I0_precursor','I0_sphere'] if k in fit_keys]
+        if len(I_keys) == 2:
+            elim_key,I_key = I_keys
+            I_cons = params[elim_key]+params[I_key]
+    if not objfun in residual_objectives or (len(c) > 0 and elim_key is None):
+        p_fit = params
+        results = []
+        for I in I_stack:
+            d_opt = fit_spectrum(q,I,objfun,flags,p_fit,fit_params,constraints,table)
+            results.append(d_opt)
+            if warm_start:
+                p_fit = d_opt
+        return results
+
+    bounds = dict(zip(fit_keys,[(-np.inf if b[0] is None else b[0],np.inf if b[1] is None else b[1])
+        for b in x_bounds]))
+    x_keys = [k for k in fit_keys if k != elim_key]
+    x_cols = [fit_keys.index(k) for k in x_keys]
+    lb = np.array([bounds[k][0] for k in x_keys])
+    ub = np.array([bounds[k][1] for k in x_keys])
+    if elim_key is not None:
+        # keep the eliminated parameter within its bounds
+        i = x_keys.index(I_key)
+        lb[i] = max(lb[i],I_cons-bounds[elim_key][1])
+        ub[i] = min(ub[i],I_cons-bounds[elim_key][0])
+
+    def set_params(obj,x):
+        for k,xk in zip(x_keys,x):
+            obj.params[k] = xk
+        if elim_key is not None:
+            obj.params[elim_key] = I_cons-obj.params[I_key]
+
+    x_init = np.clip(np.array([params[k] for k in x_keys],dtype=float),lb,ub)
+    x_start = x_init
+    results = []
+    for I in I_stack:
+        fit_obj = FitObjective(q,I,objfun,flags,params,fit_keys,table)
+        set_params(fit_obj,x_start)
+        d_opt = copy.deepcopy(fit_obj.params)
+        # Only proceed if there is still work to do.
+        if not any([fit_obj.params[k] for k in fit_keys]):
+            results.append(d_opt)
+            continue
+
+        def residuals(x):
+            set_params(fit_obj,x)
+            # least_squares() keeps earlier residuals: copy them out of the buffer
+            return np.array(fit_obj.residuals())
+
+        def jacobian(x):
+            set_params(fit_obj,x)
+            J = fit_obj.jacobian()
+            if elim_key is not None:
+                J[:,fit_keys.index(I_key)] -= J[:,fit_keys.index(elim_key)]
+            return J[:,x_cols]
+
+        obj_before = np.sum(residuals(x_start)**2)
+        res = least_squares(residuals,x_start,jac=jacobian,bounds=(lb,ub),x_scale='jac')
+        x_opt = res.x
+        obj_after = 2*res.cost
+        if obj_after > obj_before:
+            x_opt = x_start
+            obj_after = obj_before
+        set_params(fit_obj,x_opt)
+        for k in fit_keys:
+            d_opt[k] = fit_obj.params[k]
+        d_opt['objective_before'] = obj_before
+        d_opt['objective_after'] = obj_after
+        results.append(d_opt)
+        if warm_start:
+            x_start = np.array(x_opt)
+    return results
+
+def compute_saxs_jacobian(q,flags,params,fit_params,table=None):
+    """
+    Compute the saxs spectrum (as compute_saxs()),
+    and its derivatives with respect to the parameters named in fit_params.
+    Returns the spectrum and an n_q-by-len(fit_params) array of derivatives.
+    Derivatives with respect to the intensity parameters and r0_precursor
+    are computed analytically, 
+    and those with respect to r0_sphere and sigma_sphere 
+    are computed by forward differences.
+    """
+    n_q = len(q)
+    J = np.zeros((n_q,len(fit_params)))
+    if flags['bad_data'] or flags['diffraction_peaks']:
+        return np.zeros(n_q),J
+    cols = dict([(k,i) for i,k in enumerate(fit_params)])
+    I = params['I0_floor']*np.ones(n_q)
+    if 'I0_floor' in cols:
+        J[:,cols['I0_floor']] = 1.
+    if flags['precursor_scattering']:
+        I0_pre = params['I0_precursor']
+        r0_pre = params['r0_precursor']
+        I_pre = compute_spherical_normal_saxs(q,r0_pre,0)
+        I += I0_pre*I_pre
+        if 'I0_precursor' in cols:
+            J[:,cols['I0_precursor']] = I_pre
+        if 'r0_precursor' in cols:
+            q_nz = (q != 0)
+            J[q_nz,cols['r0_precursor']] = \
+            I0_pre*q[q_nz]*spherical_form_factor_derivative(q[q_nz]*r0_pre)
+    if flags['form_factor_scattering']:
+        I0_sph = params['I0_sphere']
+        p_sph = {'r0_sphere':params['r0_sphere'],'sigma_sphere':params['sigma_sphere']}
+        I_sph = compute_spherical_normal_saxs(q,p_sph['r0_sphere'],p_sph['sigma_sphere'],table)
+        I += I0_sph*I_sph
+        if 'I0_sphere' in cols:
+            J[:,cols['I0_sphere']] = I_sph
+        for k in ['r0_sphere','sigma_sphere']:
+            if k in cols:
+                h = max(fd_rel_step*abs(p_sph[k]),fd_min_step[k])
+                if k == 'sigma_sphere' and p_sph[k]+h > 0.5:
+                    # step backwards from the upper bound of sigma
+                    h = -h
+                p_h = dict(p_sph)
+                p_h[k] += h
+                I_h = compute_spherical_normal_saxs(q,p_h['r0_sphere'],p_h['sigma_sphere'],table)
+                J[:,cols[k]] = I0_sph*(I_h-I_sph)/h
+    return I,J
+
+# Upper bound on the memory (in bytes) used by the (r,q) grids 
+# in compute_spherical_normal_saxs()
+max_kernel_bytes = 32000000
+
+def spherical_form_factor(x):
+    """
+    Compute the normalized form factor of a sphere,
+    (3*(sin(x)-x*cos(x))/x**3)**2, for x = q*r > 0.
+    """
+    return (3.*(np.sin(x)-x*np.cos(x))/(x*x*x))**2
+
+def spherical_form_factor_derivative(x):
+    """
+    Compute the derivative of spherical_form_factor() with respect to x, for x > 0.
+    """
+    f = 3.*(np.sin(x)-x*np.cos(x))/(x*x*x)
+    return 2.*f*(3.*np.sin(x)/(x*x)-3.*f/x)
+
+def weighted_spherical_form_factor(q,rmin,dr,w):
+    """
+    Compute the sum over i of w[i]*spherical_form_factor(q*r[i])
+    for the uniform grid of radii r[i] = rmin + i*dr, for all q > 0 at once.
+    The grid is split into blocks of about sqrt(len(w)) radii,
+    and sin(q*r) and cos(q*r) are built by angle addition
+    from their values at the block starts and at the offsets within a block,
+    so that only O(sqrt(len(w))) sines and cosines are evaluated for each q.
+    Blocks are limited to max_kernel_bytes of (r,q) grid.
+    """
+    n_r = w.size
+    # about six (block,q) temporaries are alive at once
+    n_blk = int(np.ceil(np.sqrt(n_r)))
+    n_blk = max(min(n_blk,int(max_kernel_bytes/(6*8*max(q.size,1)))),1)
+    offsets = np.outer(np.arange(n_blk)*dr,q)
+    sin_off = np.sin(offsets)
+    cos_off = np.cos(offsets)
+    I = np.zeros(q.shape)
+    for i in range(0,n_r,n_blk):
+        n = min(n_blk,n_r-i)
+        r_blk = rmin + (i+np.arange(n))*dr
+        qr_start = q*r_blk[0]
+        sin_start = np.sin(qr_start)
+        cos_start = np.cos(qr_start)
+        # sin(a+b) = sin(a)cos(b)+cos(a)sin(b), cos(a+b) = cos(a)cos(b)-sin(a)sin(b)
+        sin_x = sin_start*cos_off[:n] + cos_start*sin_off[:n]
+        cos_x = cos_start*cos_off[:n] - sin_start*sin_off[:n]
+        x = np.outer(r_blk,q)
+        F = 3.*(sin_x-x*cos_x)/(x*x*x)
+        I += np.dot(w[i:i+n],F*F)
+    return I
+
+def compute_spherical_normal_saxs(q,r0,sigma,table=None):
     """
     Given q, a mean radius r0, 
     and the fractional standard deviation of radius sigma,
@@ -411,28 +726,39 @@ def compute_spherical_normal_saxs(q,r0,sigma):
     with normal size distribution.
     The returned intensity is normalized 
     such that I(q=0) is equal to 1.
+    The size distribution is integrated over a uniform grid of radii,
+    evaluated against all q at once 
+    (see weighted_spherical_form_factor()).
+    If a formfactortable.SphereFormFactorTable is given as table,
+    and it covers q*r0 and sigma, the intensity is interpolated from the table.
     """
+    if table is not None and sigma >= 1E-9:
+        I = table.lookup(q,r0,sigma)
+        if I is not None:
+            return I
     q_zero = (q == 0)
     q_nz = np.invert(q_zero) 
     I = np.zeros(q.shape)
     if sigma < 1E-9:
         x = q*r0
         V_r0 = float(4)/3*np.pi*r0**3
-        I[q_nz] = V_r0**2 * (3.*(np.sin(x[q_nz])-x[q_nz]*np.cos(x[q_nz]))*x[q_nz]**-3)**2
+        I[q_nz] = V_r0**2 * spherical_form_factor(x[q_nz])
         I_zero = V_r0**2 
     else:
         sigma_r = sigma*r0
         dr = sigma_r*0.02
         rmin = np.max([r0-5*sigma_r,dr])
         rmax = r0+5*sigma_r
-        I_zero = 0
-        for ri in np.arange(rmin,rmax,dr):
-            xi = q*ri
-            V_ri = float(4)/3*np.pi*ri**3
-            # The normal-distributed density of particles with radius r_i:
-            rhoi = 1./(np.sqrt(2*np.pi)*sigma_r)*np.exp(-1*(r0-ri)**2/(2*sigma_r**2))
-            I_zero += V_ri**2 * rhoi*dr
-            I[q_nz] += V_ri**2 * rhoi*dr*(3.*(np.sin(xi[q_nz])-xi[q_nz]*np.cos(xi[q_nz]))*xi[q_nz]**-3)**2
+        # np.arange(rmin,rmax,dr) can gain or lose its last point to rounding,
+        # which makes I(q) jump as r0 varies: fix the number of radii instead
+        n_r = int(np.ceil(np.round((rmax-rmin)/dr,6)))
+        r = rmin + dr*np.arange(n_r)
+        V_r = float(4)/3*np.pi*r**3
+        # The normal-distributed density of particles with radius r:
+        rho = 1./(np.sqrt(2*np.pi)*sigma_r)*np.exp(-1*(r0-r)**2/(2*sigma_r**2))
+        w = V_r**2 * rho*dr
+        I_zero = np.sum(w)
+        I[q_nz] = weighted_spherical_form_factor(q[q_nz],rmin,dr,w)
     if any(q_zero):
         I[q_zero] = I_zero
     I = I/I_zero 
@@ -547,15 +873,12 @@ def saxs_Iq4_metrics(q,I):
     # A greater value of w filters out smaller extrema.
     w = 10
     idxmax1, idxmin1 = 0,0
-    stop_idx = len(q)-w-1
-    test_range = iter(range(w,stop_idx))
-    idx = test_range.next() 
-    while any([idxmax1==0,idxmin1==0]) and idx < stop_idx-1:
-        if np.argmax(Iqqqq[idx-w:idx+w+1]) == w and idxmax1 == 0:
-            idxmax1 = idx
-        if np.argmin(Iqqqq[idx-w:idx+w+1]) == w and idxmin1 == 0 and not idxmax1 == 0:
-            idxmin1 = idx
-        idx = test_range.next()
+    idx_max,idx_min = peaktools.window_extrema(Iqqqq,w)
+    if len(idx_max) > 0:
+        idxmax1 = idx_max[0]
+        idx_min = idx_min[idx_min > idxmax1]
+        if len(idx_min) > 0:
+            idxmin1 = idx_min[0]
     if idxmin1 == 0 or idxmax1 == 0:
         ex_msg = str('unable to find first maximum and minimum of I*q^4 '
         + 'by scanning for local extrema with a window width of {} points'.format(w))
@@ -606,11 +929,11 @@ def saxs_Iq4_metrics(q,I):
     #######
     return d
 
-def compute_saxs_with_substitutions(q,flags,params,x_keys,x_vals):
-    p_sub = copy.deepcopy(params)
+def compute_saxs_with_substitutions(q,flags,params,x_keys,x_vals,table=None):
+    p_sub = dict(params)
     for k,v in zip(x_keys,x_vals):
-        p_sub[k] = copy.copy(v)
-    return compute_saxs(q,flags,p_sub)
+        p_sub[k] = v
+    return compute_saxs(q,flags,p_sub,table)
 
 def compute_chi2(y1,y2,weights=None):
     """
@@ -0,0 +1,171 @@
+"""
+An append-only, column-oriented store of spectra.
+
+The store needs only numpy, whereas h5py is an optional dependency
+(see h5tools, for stacks of frames in HDF5 files).
+Each column is a plain .npy file, so readers in other processes
+can memmap the rows appended so far without locking or SWMR support.
+Writers in several processes take turns with an exclusive lock (fcntl),
+where it is available- elsewhere, only one process may append to a store.
+"""
+import os
+import glob
+import struct
+from collections import OrderedDict
+
+import numpy as np
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Column files are .npy files with a fixed-size header,
+# so that the row count in the header can be rewritten in place
+# after each append, and np.load(mmap_mode='r') can read them.
+npy_magic = b'\x93NUMPY\x01\x00'
+npy_header_size = 256
+
+def npy_header(dtype,shape):
+    d = "{{'descr': {!r}, 'fortran_order': False, 'shape': {!r}, }}".format(
+    str(np.dtype(dtype).str),tuple(shape))
+    hlen = npy_header_size - len(npy_magic) - 2
+    return npy_magic + struct.pack('<H',hlen) + (d.ljust(hlen-1)+'\n').encode('latin1')
+
+class SpectrumStore(object):
+    """
+    A directory of column files, one .npy file per column,
+    with one row per frame (e.g. q, I, dI, time, temperature).
+    The columns, and the dtype and shape of their rows,
+    are fixed by the first row appended.
+    Rows are appended with append(), in the order the appends happen,
+    read by index with row() in constant time,
+    and whole columns are read as read-only memmaps with column().
+    """
+
+    def __init__(self,dirpath):
+        super(SpectrumStore,self).__init__()
+        self.dirpath = dirpath
+        if not os.path.isdir(dirpath):
+            os.makedirs(dirpath)
+        # open column files and their (dtype,row shape,number of rows)
+        self._files = {}
+        self._info = {}
+
+    def column_path(self,name):
+        return os.path.join(self.dirpath,name+'.npy')
+
+    def column_names(self):
+        return sorted([os.path.splitext(os.path.basename(p))[0]
+        for p in glob.glob(os.path.join(self.dirpath,'*.npy'))])
+
+    def column_info(self,name):
+        """Return (dtype,row shape,number of rows) for column name, from its header."""
+        if name in self._info:
+            return self._info[name]
+        with open(self.column_path(name),'rb') as f:
+            np.lib.format.read_magic(f)
+            shape,fortran_order,dtype = np.lib.format.read_array_header_1_0(f)
+        return dtype,tuple(shape[1:]),shape[0]
+
+    def n_rows(self):
+        """Number of complete rows: the length of the shortest column."""
+        names = self.column_names()
+        if not names:
+            return 0
+        return min([self.column_info(name)[2] for name in names])
+
+    def column(self,name,complete_rows_only=True):
+        """Return column name as a read-only memmap, indexed by row first."""
+        col = np.load(self.column_path(name),mmap_mode='r')
+        if complete_rows_only:
+            col = col[:self.n_rows()]
+        return col
+
+    def row(self,idx):
+        """
+        Return an OrderedDict of the values of every column in row idx.
+        Negative indices count back from n_rows().
+        Raises IndexError if idx is not a complete row.
+        """
+        n = self.n_rows()
+        if idx < 0:
+            idx += n
+        if not 0 <= idx < n:
+            raise IndexError('row {} is out of range for spectrum store {} with {} rows'
+            .format(idx,self.dirpath,n))
+        d = OrderedDict()
+        for name in self.column_names():
+            d[name] = np.array(self.column(name,False)[idx])
+        return d
+
+    def append(self,row_dict):
+        """
+        Append a row, given a dict of column names and values.
+        Values of None are skipped when the columns are created by the first row,
+        and are stored as NaN (or zero, for integer columns) afterwards.
+        Returns the index of the new row.
+        """
+        with open(os.path.join(self.dirpath,'.lock'),'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(),fcntl.LOCK_EX)
+            # other processes may have appended since the headers were read
+            self._info = {}
+            return self._append(row_dict)
+
+    def _append(self,row_dict):
+        names = self.column_names()
+        idx = self.n_rows()
+        if not names:
+            names = [name for name,val in row_dict.items() if val is not None]
+            if not names:
+                raise ValueError('can not start a spectrum store from an empty row')
+        else:
+            extra = [name for name,val in row_dict.items() if not name in names and val is not None]
+            if extra:
+                raise ValueError('columns {} are not in spectrum store {}'.format(extra,self.dirpath))
+        for name in names:
+            self.append_value(name,row_dict.get(name),idx)
+        return idx
+
+    def append_value(self,name,val,idx):
+        f = self._files.get(name)
+        if f is None:
+            path = self.column_path(name)
+            if os.path.exists(path):
+                f = open(path,'r+b')
+            else:
+                if val is None:
+                    raise ValueError('column {} can not be created from None'.format(name))
+                arr = np.asarray(val)
+                f = open(path,'w+b')
+                f.write(npy_header(arr.dtype,(0,)+arr.shape))
+                self._info[name] = (arr.dtype,arr.shape,0)
+            self._files[name] = f
+        if not name in self._info:
+            self._info[name] = self.column_info(name)
+        dtype,row_shape,n = self._info[name]
+        if val is None:
+            arr = np.zeros(row_shape,dtype=dtype)
+            if dtype.kind in 'fc':
+                arr[...] = np.nan
+        else:
+            arr = np.asarray(val,dtype=dtype)
+            if arr.shape != row_shape:
+                raise ValueError('column {} expects rows of shape {}, got {}'
+                .format(name,row_shape,arr.shape))
+        # write at row idx, overwriting any rows beyond the complete ones
+        # (left over from an interrupted append)
+        f.seek(npy_header_size + idx*arr.nbytes)
+        f.write(np.ascontiguousarray(arr).tobytes())
+        f.truncate()
+        f.seek(0)
+        f.write(npy_header(dtype,(idx+1,)+row_shape))
+        f.flush()
+        self._info[name] = (dtype,row_shape,idx+1)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+        self._info = {}
+
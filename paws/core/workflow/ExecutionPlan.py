@@ -0,0 +1,132 @@
+from collections import OrderedDict
+import traceback
+
+from ..operations import Operation as opmod
+from ..operations import optools
+
+# kinds of input bindings in an ExecutionPlan
+const_binding = 0
+item_binding = 1
+plugin_binding = 2
+
+class ExecutionPlan(object):
+    """
+    A frozen plan for repeated execution of a Workflow,
+    built by Workflow.compile().
+    The plan holds the Operations in execution order,
+    the bindings of each Operation input to its data,
+    and the locations of the workflow inputs and outputs.
+    Workflow uris are resolved once, when the plan is built,
+    and the workflow tree is not updated while the plan runs.
+    Call ExecutionPlan.store() when finished
+    to write the final state of the Operations back to the workflow tree.
+    A plan goes stale if the workflow is edited: compile a new one.
+    """
+
+    def __init__(self,wf):
+        super(ExecutionPlan,self).__init__()
+        self.wf = wf
+        stk,diag = wf.execution_stack()
+        self.op_tags = [op_tag for lst in stk for op_tag in lst]
+        self.ops = OrderedDict([(op_tag,wf.get_data_from_uri(op_tag)) for op_tag in self.op_tags])
+        self.bindings = OrderedDict()
+        for op_tag,op in self.ops.items():
+            self.bindings[op_tag] = OrderedDict()
+            for name,il in op.input_locator.items():
+                self.bindings[op_tag][name] = self.bind(il)
+        self.input_slots = OrderedDict()
+        for wf_input_name,uri in wf.inputs.items():
+            path = uri.split('.')
+            self.input_slots[wf_input_name] = (path[0],path[2])
+        self.output_slots = OrderedDict()
+        for wf_output_name,uri in wf.outputs.items():
+            self.output_slots[wf_output_name] = self.item_path(uri)
+
+    def bind(self,il):
+        """
+        Resolve InputLocator il to a binding tuple (kind,target).
+        Constants are resolved immediately,
+        workflow items are resolved to (Operation,keys) paths,
+        and plugin items are left to be fetched at run time.
+        """
+        if il is None or il.tp == opmod.no_input or il.val is None:
+            return (const_binding,None)
+        elif il.tp == opmod.workflow_item:
+            if isinstance(il.val,list):
+                return (item_binding,[self.item_path(uri) for uri in il.val])
+            else:
+                return (item_binding,self.item_path(il.val))
+        elif il.tp == opmod.plugin_item:
+            return (plugin_binding,il)
+        else:
+            return (const_binding,optools.locate_input(il,self.wf,self.wf.wf_manager))
+
+    def item_path(self,uri):
+        path = uri.split('.')
+        return (self.wf.get_data_from_uri(path[0]),path[1:])
+
+    @staticmethod
+    def fetch_item(item_path):
+        itm,keys = item_path
+        for k in keys:
+            if isinstance(itm,list):
+                itm = itm[int(k)]
+            else:
+                itm = itm[k]
+        return itm
+
+    def fetch(self,binding):
+        kind,target = binding
+        if kind == const_binding:
+            return target
+        elif kind == item_binding:
+            if isinstance(target,list):
+                return [self.fetch_item(p) for p in target]
+            else:
+                return self.fetch_item(target)
+        else:
+            return optools.locate_input(target,self.wf,self.wf.wf_manager,
+            self.wf.wf_manager.plugin_manager)
+
+    def set_input(self,wf_input_name,val):
+        """
+        Set the value of a workflow input for subsequent runs of the plan.
+        """
+        op_tag,name = self.input_slots[wf_input_name]
+        il = self.ops[op_tag].input_locator[name]
+        self.bindings[op_tag][name] = self.bind(opmod.InputLocator(il.tp,val))
+        if il.tp == opmod.workflow_item:
+            self.wf.invalidate_stack()
+        il.val = val
+
+    def execute(self):
+        """
+        Run every Operation in the plan once, in order.
+        Errors are logged, and execution continues with the next Operation.
+        """
+        for op_tag,op in self.ops.items():
+            try:
+                for name,binding in self.bindings[op_tag].items():
+                    op.inputs[name] = self.fetch(binding)
+                key = self.wf.result_key(op)
+                if not self.wf.restore_outputs(op,key):
+                    op.run()
+                    self.wf.cache_outputs(op,key)
+            except Exception as ex:
+                self.wf.write_log(str('Operation {} threw an error. '
+                + '\nMessage: {} \nTrace: {}').format(op_tag,ex,traceback.format_exc()))
+
+    def wf_outputs_dict(self):
+        d = OrderedDict()
+        for wf_output_name,item_path in self.output_slots.items():
+            d[wf_output_name] = self.fetch_item(item_path)
+        return d
+
+    def store(self):
+        """
+        Write the current state of the Operations in the plan
+        back to the workflow tree.
+        """
+        for op_tag,op in self.ops.items():
+            self.wf.finish_op(op_tag,op)
+
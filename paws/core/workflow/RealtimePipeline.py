@@ -0,0 +1,264 @@
+from collections import OrderedDict, deque
+import threading
+import traceback
+import time
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# backpressure policies for BoundedQueues
+block_policy = 'block'
+drop_oldest_policy = 'drop_oldest'
+latest_policy = 'latest'
+backpressure_policies = [block_policy,drop_oldest_policy,latest_policy]
+
+class BoundedQueue(object):
+    """
+    Thread-safe FIFO queue holding at most maxsize items.
+    When the queue is full, the policy decides what put() does:
+    'block' waits for room,
+    'drop_oldest' discards the oldest item to make room.
+    With policy 'latest', put() also discards the oldest items,
+    and get() returns the newest item and discards the rest,
+    so that consumers always skip ahead to the latest item.
+    Discarded items are counted in BoundedQueue.n_dropped.
+    """
+
+    def __init__(self,maxsize=8,policy=block_policy):
+        super(BoundedQueue,self).__init__()
+        if not policy in backpressure_policies:
+            raise ValueError('backpressure policy {} not in {}'
+            .format(policy,backpressure_policies))
+        self.maxsize = max(int(maxsize),1)
+        self.policy = policy
+        self.n_dropped = 0
+        self.max_depth = 0
+        self.closed = False
+        self._items = deque()
+        self._cond = threading.Condition()
+
+    def depth(self):
+        return len(self._items)
+
+    def put(self,item):
+        """
+        Add item to the queue, applying the backpressure policy if it is full.
+        Returns False (and drops item) if the queue is closed.
+        """
+        with self._cond:
+            if self.policy == block_policy:
+                while len(self._items) >= self.maxsize and not self.closed:
+                    self._cond.wait(0.1)
+            else:
+                while len(self._items) >= self.maxsize:
+                    self._items.popleft()
+                    self.n_dropped += 1
+            if self.closed:
+                return False
+            self._items.append(item)
+            self.max_depth = max(self.max_depth,len(self._items))
+            self._cond.notify_all()
+            return True
+
+    def get(self,timeout=None):
+        """
+        Remove and return an item,
+        waiting up to timeout seconds (forever if None) for one.
+        Raises queue.Empty if the queue is still empty after the timeout,
+        or if it is empty and closed.
+        """
+        t_end = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while not self._items:
+                if self.closed:
+                    raise queue.Empty
+                if t_end is None:
+                    self._cond.wait(0.1)
+                else:
+                    t_left = t_end - time.time()
+                    if t_left <= 0:
+                        raise queue.Empty
+                    self._cond.wait(min(t_left,0.1))
+            if self.policy == latest_policy:
+                item = self._items.pop()
+                self.n_dropped += len(self._items)
+                self._items.clear()
+            else:
+                item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        """Wake up and turn away all producers, let consumers drain the queue."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+class RealtimePipeline(object):
+    """
+    Realtime execution of a Workflow,
+    as a chain of stages connected by BoundedQueues:
+    file discovery (a tools.filewatch.ReadyFileFeed),
+    optional decoding of each file by reader(path) on a background thread,
+    and execution of a compiled Workflow (ExecutionPlan) in the calling thread.
+    Each file path is fed to workflow input input_name,
+    and each decoded result (if any) to workflow input data_input_name.
+    The queues hold at most queue_size items each,
+    and apply the backpressure policy (see BoundedQueue) when they fill up:
+    'block' processes every file,
+    'drop_oldest' and 'latest' keep the workflow close to the newest file.
+    """
+
+    def __init__(self,feed,plan,input_name,reader=None,data_input_name=None,
+        queue_size=8,policy=block_policy,logmethod=None):
+        super(RealtimePipeline,self).__init__()
+        self.feed = feed
+        self.plan = plan
+        self.input_name = input_name
+        self.reader = reader
+        self.data_input_name = data_input_name
+        self.logmethod = logmethod
+        self.file_queue = BoundedQueue(queue_size,policy)
+        if reader is not None:
+            self.data_queue = BoundedQueue(queue_size,policy)
+        else:
+            self.data_queue = self.file_queue
+        self.n_discovered = 0
+        self.n_decoded = 0
+        self.n_processed = 0
+        self.n_failed = 0
+        self.lags = deque(maxlen=100)
+        self.max_lag = 0.
+        self._stop = threading.Event()
+        self._threads = []
+
+    def write_log(self,msg):
+        if self.logmethod is not None:
+            self.logmethod(msg)
+
+    def start(self):
+        """Start the discovery and decoding threads."""
+        self._threads = [threading.Thread(target=self._discover,name='RealtimeDiscover')]
+        if self.reader is not None:
+            self._threads.append(threading.Thread(target=self._decode,name='RealtimeDecode'))
+        for th in self._threads:
+            th.daemon = True
+            th.start()
+
+    def request_stop(self):
+        """
+        Ask the pipeline to stop, from any thread:
+        the background threads finish, and process_next() returns None.
+        The thread that runs process_next() should then call stop().
+        """
+        self._stop.set()
+        self.file_queue.close()
+        self.data_queue.close()
+
+    def stop_requested(self):
+        return self._stop.is_set()
+
+    def stop(self):
+        """Stop the background threads and close the file feed."""
+        self._stop.set()
+        self.file_queue.close()
+        self.data_queue.close()
+        for th in self._threads:
+            th.join()
+        self._threads = []
+        self.feed.close()
+
+    def _discover(self):
+        try:
+            while not self._stop.is_set():
+                for path in self.feed.get_batch(0.1):
+                    self.n_discovered += 1
+                    # items are (path,time when the file was ready,data,error message)
+                    self.file_queue.put((path,time.time(),None,None))
+        except Exception as ex:
+            self.write_log('REALTIME file discovery stopped. \nMessage: {} \nTrace: {}'
+            .format(ex,traceback.format_exc()))
+        finally:
+            self.file_queue.close()
+
+    def _decode(self):
+        try:
+            while not self._stop.is_set():
+                try:
+                    path,t_ready,data,msg = self.file_queue.get(0.1)
+                except queue.Empty:
+                    if self.file_queue.closed:
+                        break
+                    continue
+                try:
+                    data = self.reader(path)
+                    self.n_decoded += 1
+                except Exception as ex:
+                    msg = 'Message: {} \nTrace: {}'.format(ex,traceback.format_exc())
+                self.data_queue.put((path,t_ready,data,msg))
+        finally:
+            self.data_queue.close()
+
+    def process_next(self,timeout=None):
+        """
+        Wait up to timeout seconds for the next file,
+        and execute the workflow on it.
+        Returns a tuple of (workflow inputs dict,workflow outputs dict),
+        where the outputs dict is None if the file could not be decoded,
+        or None if no file arrived before the timeout,
+        or if the pipeline has been asked to stop (see request_stop()).
+        """
+        if self._stop.is_set():
+            return None
+        try:
+            path,t_ready,data,msg = self.data_queue.get(timeout)
+        except queue.Empty:
+            return None
+        inp_dict = OrderedDict()
+        inp_dict[self.input_name] = path
+        if msg is not None:
+            self.n_failed += 1
+            self.write_log('REALTIME failed to read {}. \n{}'.format(path,msg))
+            return inp_dict,None
+        self.plan.set_input(self.input_name,path)
+        if self.data_input_name is not None:
+            self.plan.set_input(self.data_input_name,data)
+        self.plan.execute()
+        self.n_processed += 1
+        lag = time.time() - t_ready
+        self.lags.append(lag)
+        self.max_lag = max(self.max_lag,lag)
+        return inp_dict,self.plan.wf_outputs_dict()
+
+    def metrics(self):
+        """
+        Return a dict of pipeline metrics:
+        counts of files discovered, decoded, processed, failed and dropped,
+        the current and maximum depths of the queues,
+        the number of ready files waiting to enter the pipeline,
+        and the lag (seconds from file ready to workflow finished)
+        of the last file and over the last 100 files.
+        """
+        m = OrderedDict()
+        m['n_discovered'] = self.n_discovered
+        m['n_decoded'] = self.n_decoded
+        m['n_processed'] = self.n_processed
+        m['n_failed'] = self.n_failed
+        m['n_dropped'] = self.file_queue.n_dropped
+        m['feed_backlog'] = self.feed.ready.qsize()
+        m['file_queue_depth'] = self.file_queue.depth()
+        m['file_queue_max_depth'] = self.file_queue.max_depth
+        if self.data_queue is not self.file_queue:
+            m['n_dropped'] += self.data_queue.n_dropped
+            m['data_queue_depth'] = self.data_queue.depth()
+            m['data_queue_max_depth'] = self.data_queue.max_depth
+        if self.lags:
+            m['last_lag'] = self.lags[-1]
+            m['mean_lag'] = sum(self.lags)/len(self.lags)
+        else:
+            m['last_lag'] = None
+            m['mean_lag'] = None
+        m['max_lag'] = self.max_lag
+        return m
+
@@ -202,7 +202,39 @@ class WfManager(object):
             if isinstance(op,Operation):
                 self.workflows[wfname].set_item(opname,op)
             else:
-                self.write_log('[{}] Failed to load {}.'.format(uri))
+                self.write_log('[{}] Failed to load {}.'.format(__name__,opname))
+
+    def wf_setup_dict(self,wf):
+        """
+        Describe Workflow wf by a dict 
+        that can be used to rebuild it with self.load_wf_setup(),
+        e.g. in another process.
+        """
+        dct = OrderedDict()
+        dct['OPERATIONS'] = OrderedDict()
+        dct['DISABLED'] = []
+        for op_tag in wf.list_op_tags():
+            dct['OPERATIONS'][op_tag] = self.op_setup_dict(wf.get_data_from_uri(op_tag))
+            if not wf.is_op_enabled(op_tag):
+                dct['DISABLED'].append(op_tag)
+        dct['INPUTS'] = OrderedDict(wf.inputs)
+        dct['OUTPUTS'] = OrderedDict(wf.outputs)
+        return dct
+
+    def load_wf_setup(self,wfname,opman,wf_setup):
+        """
+        Create a workflow with name wfname 
+        from a dict built by self.wf_setup_dict().
+        If wfname is not unique, self.workflows[wfname] is overwritten.
+        """
+        self.load_from_dict(wfname,opman,wf_setup['OPERATIONS'])
+        wf = self.workflows[wfname]
+        for op_tag in wf_setup['DISABLED']:
+            wf.set_op_enabled(op_tag,False)
+        for wf_input_name,uri in wf_setup['INPUTS'].items():
+            wf.connect_wf_input(wf_input_name,uri)
+        for wf_output_name,uri in wf_setup['OUTPUTS'].items():
+            wf.connect_wf_output(wf_output_name,uri)
 
     def op_setup_dict(self,op):
         op_modulename = op.__module__[op.__module__.find('operations'):]
@@ -212,7 +244,7 @@ class WfManager(object):
         inp_dct = OrderedDict() 
         for name in op.inputs.keys():
             il = op.input_locator[name]
-            inp_dct[name] = {'src':copy.copy(il.src),'tp':copy.copy(il.tp),'val':copy.copy(il.val)}
+            inp_dct[name] = {'tp':copy.copy(il.tp),'val':copy.copy(il.val)}
         dct[opmod.inputs_tag] = inp_dct 
         return dct
 
@@ -220,22 +252,16 @@ class WfManager(object):
         op_uri = op_setup['op_module']
         if not ops.load_flags[op_uri]:
             opman.set_op_enabled(op_uri)
-        op = opman.get_data_from_uri(op_uri)
+        op = opman.get_op(op_uri)
         if issubclass(op,Operation):
             op = op()
             op.load_defaults()
             il_setup_dict = op_setup[opmod.inputs_tag]
             for name in op.inputs.keys():
                 if name in il_setup_dict.keys():
-                    src = il_setup_dict[name]['src']
-                    #if 'tp' in il_setup_dict[name].keys():
                     tp = il_setup_dict[name]['tp']
                     val = il_setup_dict[name]['val']
-                    if tp in opmod.invalid_types[src]:
-                        il = opmod.InputLocator(src,opmod.none_type,None)
-                    else:
-                        il = opmod.InputLocator(src,tp,val)
-                    op.input_locator[name] = il
+                    op.input_locator[name] = opmod.InputLocator(tp,val)
                     # dereference any existing inputs
                     # LAP: commented out bc it should be handled in op.load_defaults()
                     #op.inputs[name] = None
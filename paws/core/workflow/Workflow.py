@@ -2,11 +2,17 @@ from collections import OrderedDict
 import copy
 from functools import partial
 import traceback
+try:
+    import Queue as queue
+except ImportError:
+    import queue
 
 from ..models.TreeModel import TreeModel
 from ..operations import Operation as opmod
 from ..operations.Operation import Operation#, Batch, Realtime
 from ..operations import optools
+from .wftools import SerialExecutor
+from .ExecutionPlan import ExecutionPlan
 
 class Workflow(TreeModel):
     """
@@ -21,6 +27,13 @@ class Workflow(TreeModel):
         self.wf_manager = wfman
         self.inputs = OrderedDict()
         self.outputs = OrderedDict()
+        self.executor = SerialExecutor()
+        self.result_cache = None
+        # dependency graph and execution stack are cached,
+        # and invalidated whenever an Operation or InputLocator changes
+        self._dependency_graph = None
+        self._execution_stack = None
+        self._stack_diagnostics = None
         #self.wfman = wfman
 
     def __getitem__(self,key):
@@ -49,6 +62,7 @@ class Workflow(TreeModel):
         Set workflow tree data at op_tag to new_op.
         """
         self.set_item(op_tag,new_op)
+        self.invalidate_stack()
 
     def remove_op(self,op_tag):
         """
@@ -56,6 +70,46 @@ class Workflow(TreeModel):
         """
         self.remove_item(op_tag)
 
+    def set_item(self,itm_uri,itm_data=None):
+        """
+        Reimplemented TreeModel.set_item()
+        so that storing an Operation at the top level
+        invalidates the cached execution stack.
+        This includes storing the same Operation again,
+        since its input_locator may have been edited in place.
+        """
+        if not '.' in itm_uri:
+            self.invalidate_stack()
+        super(Workflow,self).set_item(itm_uri,itm_data)
+        if isinstance(itm_data,Operation):
+            # the whole Operation has just been indexed
+            for io_dict in [itm_data.inputs,itm_data.outputs]:
+                if isinstance(io_dict,opmod.TrackedDict):
+                    io_dict.pop_changed()
+
+    def remove_item(self,itm_uri):
+        super(Workflow,self).remove_item(itm_uri)
+        self.invalidate_stack()
+
+    def set_input_locator(self,op_tag,input_name,il):
+        """
+        Set the InputLocator for input input_name of the Operation at op_tag.
+        InputLocators of Operations in the workflow should be set here
+        (rather than directly in Operation.input_locator)
+        so that the cached execution stack stays valid.
+        """
+        op = self.get_data_from_uri(op_tag)
+        op.input_locator[input_name] = il
+        self.invalidate_stack()
+
+    def invalidate_stack(self):
+        """
+        Clear the cached dependency graph and execution stack.
+        """
+        self._dependency_graph = None
+        self._execution_stack = None
+        self._stack_diagnostics = None
+
     def build_tree(self,x):
         """
         Reimplemented TreeModel.build_tree() 
@@ -69,28 +123,192 @@ class Workflow(TreeModel):
         else:
             return super(Workflow,self).build_tree(x) 
 
+    def set_executor(self,executor):
+        """
+        Set the executor used by Workflow.execute() to run Operations.
+        See paws.core.workflow.wftools for available executors.
+        """
+        self.executor = executor
+
+    def set_result_cache(self,cache):
+        """
+        Set a cache of Operation results (see wftools.ResultCache),
+        or None to disable result caching.
+        Operations whose inputs match a cached result
+        have their outputs restored from the cache instead of running.
+        """
+        self.result_cache = cache
+
+    def restore_outputs(self,op,key):
+        """
+        If self.result_cache holds outputs for key,
+        restore them to op.outputs and return True. 
+        Else, return False.
+        """
+        if key is None:
+            return False
+        outputs = self.result_cache.get(key)
+        if outputs is None:
+            return False
+        for name,val in outputs.items():
+            op.outputs[name] = val
+        return True
+
+    def cache_outputs(self,op,key):
+        if key is not None:
+            self.result_cache.put(key,op.outputs)
+
+    def result_key(self,op):
+        if self.result_cache is None:
+            return None
+        return self.result_cache.key(op)
+
     def execute(self):
-        stk,diag = self.execution_stack()
-        #self.write_log('beginning execution. execution stack: \n'+optools.print_stack(stk))
-        for lst in stk:
-            self.write_log('running: {}'.format(lst))
-            for op_tag in lst: 
+        """
+        Run all enabled Operations whose dependencies can be satisfied.
+        Each Operation is submitted to self.executor 
+        as soon as all of the Operations it depends on have finished.
+        """
+        upstream = self.op_dependencies()
+        downstream = OrderedDict([(op_tag,[]) for op_tag in upstream.keys()])
+        n_waiting = OrderedDict()
+        for op_tag,up_tags in upstream.items():
+            n_waiting[op_tag] = len(up_tags)
+            for up_tag in up_tags:
+                if up_tag in downstream:
+                    downstream[up_tag].append(op_tag)
+        ops_rdy = [op_tag for op_tag,n in n_waiting.items() if n == 0]
+        done_queue = queue.Queue()
+        op_done = lambda op_tag,outputs,msg: done_queue.put((op_tag,outputs,msg))
+        op_keys = {}
+        n_running = 0
+        while any(ops_rdy) or n_running > 0:
+            for op_tag in ops_rdy:
                 try:
-                    #op = self.get_data_from_uri(op_tag) 
-                    #self.load_inputs(op,self.wf_manager,self.wf_manager.plugin_manager)
-                    #op.run() 
-                    self.execute_op(op_tag)
+                    op = self.load_op(op_tag)
+                    op_keys[op_tag] = self.result_key(op)
                 except Exception as ex:
-                    tb = traceback.format_exc()
-                    self.write_log(str('Operation {} threw an error. '
-                    + '\nMessage: {} \nTrace: {}').format(op_tag,ex.message,tb)) 
+                    op_done(op_tag,None,'Message: {} \nTrace: {}'.format(ex,traceback.format_exc()))
+                else:
+                    if self.restore_outputs(op,op_keys[op_tag]):
+                        self.write_log('restored from cache: {}'.format(op_tag))
+                        op_done(op_tag,op.outputs,None)
+                    else:
+                        self.write_log('running: {}'.format(op_tag))
+                        try:
+                            self.executor.submit(op_tag,op,op_done)
+                        except Exception as ex:
+                            op_done(op_tag,None,'Message: {} \nTrace: {}'.format(ex,traceback.format_exc()))
+                n_running += 1
+            ops_rdy = []
+            op_tag,outputs,msg = done_queue.get()
+            n_running -= 1
+            if msg is not None:
+                self.write_log('Operation {} threw an error. \n{}'.format(op_tag,msg))
+            else:
+                op = self.get_data_from_uri(op_tag)
+                op.outputs = outputs
+                self.cache_outputs(op,op_keys[op_tag])
+                self.finish_op(op_tag,op)
+            for dn_tag in downstream[op_tag]:
+                n_waiting[dn_tag] -= 1
+                if n_waiting[dn_tag] == 0:
+                    ops_rdy.append(dn_tag)
         self.write_log('execution finished')
 
+    def compile(self):
+        """
+        Build an ExecutionPlan for repeated execution of this workflow,
+        e.g. by batch Operations.
+        See paws.core.workflow.ExecutionPlan.
+        """
+        return ExecutionPlan(self)
+
     def execute_op(self,op_tag):
+        op = self.load_op(op_tag)
+        key = self.result_key(op)
+        if not self.restore_outputs(op,key):
+            op.run() 
+            self.cache_outputs(op,key)
+        self.finish_op(op_tag,op)
+
+    def load_op(self,op_tag):
+        """
+        Fetch the Operation at op_tag and load its inputs, 
+        in preparation for op.run().
+        """
         op = self.get_data_from_uri(op_tag) 
         self.load_inputs(op,self.wf_manager,self.wf_manager.plugin_manager)
-        op.run() 
-        self.set_item(op_tag,op)
+        return op
+
+    def finish_op(self,op_tag,op):
+        """
+        Update the tree after op.run() has finished.
+        Only the inputs and outputs that were set to new objects
+        (as tracked by Operation.inputs and Operation.outputs)
+        are re-indexed.
+        """
+        if not (self.contains_uri(op_tag) and self.get_data_from_uri(op_tag) is op):
+            self.set_item(op_tag,op)
+            return
+        for io_tag,io_dict in [(opmod.inputs_tag,op.inputs),(opmod.outputs_tag,op.outputs)]:
+            io_uri = op_tag+'.'+io_tag
+            if not isinstance(io_dict,opmod.TrackedDict):
+                self.set_item(io_uri,io_dict)
+                continue
+            changed_keys = io_dict.pop_changed()
+            if any([not k in io_dict for k in changed_keys]):
+                # keys were removed: re-index the whole dict
+                self.set_item(io_uri,io_dict)
+            else:
+                for k in changed_keys:
+                    self.set_item(io_uri+'.'+k,io_dict[k])
+
+    def op_dependencies(self):
+        """
+        Build an OrderedDict of the Operations in the execution stack,
+        where each Operation tag is mapped to a list of the tags
+        of the Operations that it takes workflow_item inputs from.
+        """
+        stk,diag = self.execution_stack()
+        stk_tags = set([op_tag for lst in stk for op_tag in lst])
+        graph = self.dependency_graph()
+        upstream = OrderedDict()
+        for op_tag in self.list_op_tags():
+            if op_tag in stk_tags:
+                upstream[op_tag] = graph[op_tag]
+        return upstream
+
+    def dependency_graph(self):
+        """
+        Return an OrderedDict mapping every Operation tag in the workflow
+        to a list of the tags of the Operations it takes workflow_item inputs from.
+        The graph is cached until an Operation or InputLocator is changed.
+        """
+        if self._dependency_graph is None:
+            graph = OrderedDict()
+            for op_tag in self.list_op_tags():
+                graph[op_tag] = self.op_upstream_tags(self.get_data_from_uri(op_tag))
+            self._dependency_graph = graph
+        return self._dependency_graph
+
+    @staticmethod
+    def op_upstream_tags(op):
+        """
+        Return a list of the tags of the Operations 
+        that provide workflow_item inputs to Operation op.
+        """
+        up_tags = []
+        for name,il in op.input_locator.items():
+            if il is not None and il.tp == opmod.workflow_item and il.val is not None:
+                uris = il.val
+                if not isinstance(uris,list):
+                    uris = [uris]
+                for uri in uris:
+                    up_tag = uri.split('.')[0]
+                    if not up_tag in up_tags:
+                        up_tags.append(up_tag)
+        return up_tags
 
     def load_inputs(self,op,wf_manager=None,plugin_manager=None):
         """
@@ -152,6 +370,8 @@ class Workflow(TreeModel):
         inpname = path[2]
         uri = opname+'.'+opmod.inputs_tag+'.'+inpname
         op = self.get_data_from_uri(opname)
+        if op.input_locator[inpname].tp == opmod.workflow_item:
+            self.invalidate_stack()
         op.input_locator[inpname].val = val
         #op.input_locator[inpname].data = val
         #op.inputs[inpname] = val
@@ -160,6 +380,7 @@ class Workflow(TreeModel):
     def set_op_enabled(self,opname,flag=True):
         op_item = self.get_from_uri(opname)
         op_item.flags['enable'] = flag
+        self.invalidate_stack()
 
     def is_op_enabled(self,opname):
         op_item = self.get_from_uri(opname)
@@ -170,113 +391,61 @@ class Workflow(TreeModel):
         Build a stack (list) of lists of Operation uris,
         such that each list indicates a set of Operations
         whose dependencies are satisfied by the Operations above them.
+        Also returns a dict of diagnostic messages 
+        for Operations (and their inputs) that can not be executed.
+        The stack is built from self.dependency_graph() by Kahn's algorithm,
+        and cached until an Operation or InputLocator is changed.
         """
-        stk = []
-        valid_wf_inputs = [] 
-        diagnostics = {}
-        continue_flag = True
-        while not self.stack_size(stk) == self.n_ops() and continue_flag:
-            ops_rdy = []
-            ops_not_rdy = []
-            for op_tag in self.list_op_tags():
-                if not self.is_op_enabled(op_tag):
-                    op_rdy = False
-                    op_diag = {op_tag:'Operation is disabled'}
-                elif not self.stack_contains(op_tag,stk):
-                    op_rdy,op_diag = self.is_op_ready(op_tag,valid_wf_inputs)
-                    diagnostics.update(op_diag)
-                    if op_rdy:
-                        ops_rdy.append(op_tag)
-                    else:
-                        ops_not_rdy.append(op_tag)
-            if any(ops_rdy):
+        if self._execution_stack is None:
+            graph = self.dependency_graph()
+            op_rows = dict([(op_tag,row) for row,op_tag in enumerate(graph.keys())])
+            enabled = set([op_tag for op_tag in graph.keys() if self.is_op_enabled(op_tag)])
+            n_waiting = dict.fromkeys(enabled,0)
+            downstream = dict([(op_tag,[]) for op_tag in enabled])
+            for op_tag in enabled:
+                for up_tag in graph[op_tag]:
+                    n_waiting[op_tag] += 1
+                    if up_tag in enabled and not up_tag == op_tag:
+                        downstream[up_tag].append(op_tag)
+            stk = []
+            ops_rdy = [op_tag for op_tag in graph.keys() if op_tag in enabled and n_waiting[op_tag] == 0]
+            while any(ops_rdy):
                 stk.append(ops_rdy)
+                next_rdy = []
                 for op_tag in ops_rdy:
-                    op = self.get_data_from_uri(op_tag)
-                    valid_wf_inputs += self.get_valid_wf_inputs(op_tag,op)
-            else:
-                continue_flag = False
-        return stk,diagnostics
-        # Finished building list of ops currently ready. Now filter these into stack.
-        #if any(ops_rdy):
-        #     Which of these are not Batch/Realtime ops?
-        #    non_batch_rdy = []
-        #    for op_tag in ops_rdy:
-        #        op = wf.get_data_from_uri(op_tag)
-        #        if not any([op._batch_flag,op._realtime_flag]):
-        #            non_batch_rdy.append(op_tag)
-        #    if any(non_batch_rdy):
-        #        ops_rdy = non_batch_rdy
-        #        stk.append(ops_rdy)
-        #        for op_tag in ops_rdy:
-        #            op = wf.get_data_from_uri(op_tag)
-        #            valid_wf_inputs += get_valid_wf_inputs(op_tag,op)
-        #    else:
-        #        batch_tag = ops_rdy[0]
-        #        ops_rdy = [batch_tag]
-        #        batch_op = wf.get_data_from_uri(batch_tag)
-        #        batch_stk,batch_rdy,batch_diag = batch_op_stack(
-        #        wf,batch_tag,valid_wf_inputs)
-        #        diagnostics.update(batch_diag)
-        #        stk.append([batch_tag,batch_stk])
-        #        valid_wf_inputs += get_valid_wf_inputs(batch_tag,batch_op)
-        #else:
-        #    continue_flag = False
-
-    @staticmethod
-    def stack_contains(itm,stk):
-        for lst in stk:
-            if itm in lst:
-                return True
-            for lst_itm in lst:
-                if isinstance(lst_itm,list):
-                    if stack_contains(itm,lst_itm):
-                        return True
-        return False
-
-    @staticmethod
-    def stack_size(stk):
-        sz = 0
-        for lst in stk:
-            for lst_itm in lst:
-                if isinstance(lst_itm,list):
-                    sz += stack_size(lst_itm)
-                else:
-                    sz += 1
-        return sz
+                    for dn_tag in downstream[op_tag]:
+                        n_waiting[dn_tag] -= 1
+                        if n_waiting[dn_tag] == 0:
+                            next_rdy.append(dn_tag)
+                ops_rdy = sorted(next_rdy,key=op_rows.get)
+            self._execution_stack = stk
+            self._stack_diagnostics = self.stack_diagnostics(stk)
+        return self._execution_stack,self._stack_diagnostics
 
-    def is_op_ready(self,op_tag,valid_wf_inputs):
-        op = self.get_data_from_uri(op_tag)
-        inputs_rdy = []
-        diagnostics = {} 
-        for name,il in op.input_locator.items():
-            msg = ''
-            if (il.tp == opmod.workflow_item 
-            and not il.val in valid_wf_inputs): 
-                inp_rdy = False
-                msg = str('Operation input {}.inputs.{} (={}) '.format(op_tag,name,il.val)
-                + 'not found in valid Workflow input list: {}'.format(valid_wf_inputs)
-                + 'or in workflows: {}'.format(self.wf_manager.workflows.keys()))
-            else:
-                inp_rdy = True
-            inputs_rdy.append(inp_rdy)
-            diagnostics[op_tag+'.'+opmod.inputs_tag+'.'+name] = msg
-        if all(inputs_rdy):
-            op_rdy = True
-        else:
-            op_rdy = False
-        return op_rdy,diagnostics 
-
-    @staticmethod
-    def get_valid_wf_inputs(op_tag,op):
+    def stack_diagnostics(self,stk):
         """
-        Return the TreeModel uris of the op and its inputs/outputs 
-        that are eligible as downstream inputs in the workflow.
+        Build a dict of diagnostic messages, keyed by uri,
+        for the Operations and inputs that were left out of stack stk.
         """
-        # valid_wf_inputs should be the operation, its input and output dicts, and their respective entries
-        valid_wf_inputs = [op_tag,op_tag+'.'+opmod.inputs_tag,op_tag+'.'+opmod.outputs_tag]
-        valid_wf_inputs += [op_tag+'.'+opmod.outputs_tag+'.'+k for k in op.outputs.keys()]
-        valid_wf_inputs += [op_tag+'.'+opmod.inputs_tag+'.'+k for k in op.inputs.keys()]
-        return valid_wf_inputs
-    
+        stk_tags = set([op_tag for lst in stk for op_tag in lst])
+        diagnostics = {}
+        for op_tag in self.list_op_tags():
+            if not self.is_op_enabled(op_tag):
+                diagnostics[op_tag] = 'Operation is disabled'
+                continue
+            op = self.get_data_from_uri(op_tag)
+            for name,il in op.input_locator.items():
+                msg = ''
+                if il is not None and il.tp == opmod.workflow_item and il.val is not None:
+                    uris = il.val
+                    if not isinstance(uris,list):
+                        uris = [uris]
+                    bad_tags = [uri.split('.')[0] for uri in uris 
+                        if uri.split('.')[0] == op_tag or not uri.split('.')[0] in stk_tags]
+                    if any(bad_tags):
+                        msg = str('Operation input {}.inputs.{} (={}) '.format(op_tag,name,il.val)
+                        + 'depends on Operation(s) {}, '.format(bad_tags)
+                        + 'which are missing, disabled, or can not be executed')
+                diagnostics[op_tag+'.'+opmod.inputs_tag+'.'+name] = msg
+        return diagnostics
 
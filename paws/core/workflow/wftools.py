@@ -0,0 +1,398 @@
+"""
+Tools for executing Workflows:
+Executors that run Operations on behalf of the Workflow scheduler.
+"""
+
+import os
+import sys
+import hashlib
+import numbers
+import traceback
+import multiprocessing
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .. import operations as ops
+from ..operations import Operation as opmod
+
+def run_op(op):
+    """
+    Call op.run() and return a tuple of (op.outputs,error_message),
+    where error_message is None if the Operation finished without error.
+    Exceptions are caught here so that a failed Operation
+    never takes down the executor that runs it.
+    """
+    try:
+        op.run()
+        return op.outputs,None
+    except Exception as ex:
+        return op.outputs,'Message: {} \nTrace: {}'.format(ex,traceback.format_exc())
+
+def run_pickled_op(op_pickle):
+    """
+    Unpickle an Operation and run it with run_op().
+    Used by ProcessPoolExecutor so that the pickling
+    happens (and can fail) in the calling process.
+    Failures to unpickle the Operation, or to pickle its outputs
+    for the trip back, are returned as errors:
+    an exception raised here would never reach the pool's callback.
+    """
+    try:
+        outputs,msg = run_op(pickle.loads(op_pickle))
+        pickle.dumps(outputs,pickle.HIGHEST_PROTOCOL)
+        return outputs,msg
+    except Exception as ex:
+        return None,'Message: {} \nTrace: {}'.format(ex,traceback.format_exc())
+
+class SerialExecutor(object):
+    """
+    Executor that runs each Operation in the calling thread,
+    immediately when it is submitted.
+    Executors keep their workers between calls to Workflow.execute(),
+    until shutdown() is called.
+    """
+
+    def submit(self,op_tag,op,callback):
+        """
+        Run op, then call callback(op_tag,outputs,error_message).
+        """
+        outputs,msg = run_op(op)
+        callback(op_tag,outputs,msg)
+
+    def shutdown(self):
+        pass
+
+class ThreadPoolExecutor(SerialExecutor):
+    """
+    Executor that runs Operations on a pool of threads.
+    Useful for Operations that spend their time in IO
+    or in numpy/scipy routines that release the GIL.
+    """
+
+    def __init__(self,n_workers=None):
+        super(ThreadPoolExecutor,self).__init__()
+        if not n_workers:
+            n_workers = multiprocessing.cpu_count()
+        self.n_workers = n_workers
+        self._pool = None
+
+    def submit(self,op_tag,op,callback):
+        if self._pool is None:
+            self._pool = ThreadPool(self.n_workers)
+        self._pool.apply_async(run_op,(op,),
+        callback=lambda result: callback(op_tag,*result))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+class ProcessPoolExecutor(ThreadPoolExecutor):
+    """
+    Executor that runs Operations on a pool of worker processes.
+    Operations are pickled (along with their loaded inputs)
+    and sent to the workers, and their outputs are pickled back.
+    Operations that take an entire workflow or a plugin as input,
+    or that can not be pickled, are run in the calling thread.
+    """
+
+    def submit(self,op_tag,op,callback):
+        op_pickle = None
+        if self.can_fork(op):
+            try:
+                op_pickle = pickle.dumps(op,pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                op_pickle = None
+        if op_pickle is None:
+            super(ThreadPoolExecutor,self).submit(op_tag,op,callback)
+        else:
+            if self._pool is None:
+                self._pool = multiprocessing.Pool(self.n_workers)
+            self._pool.apply_async(run_pickled_op,(op_pickle,),
+            callback=lambda result: callback(op_tag,*result))
+
+    @staticmethod
+    def can_fork(op):
+        for il in op.input_locator.values():
+            if il is not None and il.tp in [opmod.entire_workflow,opmod.plugin_item]:
+                return False
+        return True
+
+class UnhashableInputError(Exception):
+    pass
+
+def fingerprint(x,h=None):
+    """
+    Return a hex digest that identifies the value of x.
+    Supports None, numbers, strings, numpy arrays,
+    and dicts, lists and tuples of these.
+    Strings that are paths to existing files 
+    also fingerprint the modification time and size of the file.
+    Raises an UnhashableInputError for anything else.
+    """
+    top = h is None
+    if top:
+        h = hashlib.sha1()
+    if x is None or isinstance(x,(bool,numbers.Number)):
+        h.update(repr(x).encode())
+    elif isinstance(x,(str,type(u''))):
+        h.update(repr(x).encode())
+        if os.path.isfile(x):
+            st = os.stat(x)
+            h.update('|{}|{}'.format(st.st_mtime,st.st_size).encode())
+    elif np is not None and isinstance(x,np.ndarray) and not x.dtype.hasobject:
+        h.update('ndarray|{}|{}'.format(x.dtype.str,x.shape).encode())
+        h.update(np.ascontiguousarray(x).data)
+    elif isinstance(x,dict):
+        h.update('dict|{}'.format(len(x)).encode())
+        for k,v in x.items():
+            fingerprint(k,h)
+            fingerprint(v,h)
+    elif isinstance(x,(list,tuple)):
+        h.update('{}|{}'.format(type(x).__name__,len(x)).encode())
+        for v in x:
+            fingerprint(v,h)
+    else:
+        raise UnhashableInputError('can not fingerprint object of type {}'.format(type(x)))
+    if top:
+        return h.hexdigest()
+
+def estimate_size(x):
+    """Estimate the memory footprint of x in bytes."""
+    if np is not None and isinstance(x,np.ndarray):
+        return x.nbytes
+    elif isinstance(x,dict):
+        return sys.getsizeof(x) + sum([estimate_size(k)+estimate_size(v) for k,v in x.items()])
+    elif isinstance(x,(list,tuple)):
+        return sys.getsizeof(x) + sum([estimate_size(v) for v in x])
+    else:
+        return sys.getsizeof(x)
+
+class ResultCache(object):
+    """
+    Least-recently-used cache of Operation outputs,
+    keyed by Operation class and a fingerprint of the Operation inputs,
+    holding at most max_bytes (estimated) of outputs.
+    Set it with Workflow.set_result_cache() to skip re-running Operations 
+    whose inputs have not changed.
+    Operations with Operation.cacheable == False,
+    or with inputs that can not be fingerprinted, are never cached.
+    Cached outputs are shared with the Operations they are restored to, not copied.
+    """
+
+    def __init__(self,max_bytes=1000000000):
+        super(ResultCache,self).__init__()
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self._entries = OrderedDict()
+
+    def key(self,op):
+        """Return the cache key for op, or None if op can not be cached."""
+        if not op.cacheable:
+            return None
+        try:
+            return (type(op).__module__+'.'+type(op).__name__,fingerprint(op.inputs))
+        except UnhashableInputError:
+            return None
+
+    def get(self,key):
+        """Return the outputs cached for key (or None), and mark them as recently used."""
+        if not key in self._entries:
+            return None
+        entry = self._entries.pop(key)
+        self._entries[key] = entry
+        return entry[0]
+
+    def put(self,key,outputs):
+        """Cache a copy of the outputs dict for key, evicting old entries as needed."""
+        if key in self._entries:
+            self.n_bytes -= self._entries.pop(key)[1]
+        sz = estimate_size(outputs)
+        if sz > self.max_bytes:
+            return
+        self._entries[key] = (OrderedDict(outputs),sz)
+        self.n_bytes += sz
+        while self.n_bytes > self.max_bytes:
+            old_key,(old_outputs,old_sz) = self._entries.popitem(last=False)
+            self.n_bytes -= old_sz
+
+    def clear(self):
+        self._entries = OrderedDict()
+        self.n_bytes = 0
+
+# Workflow replica for batch worker processes, 
+# built once per worker by init_batch_worker()
+_batch_worker = {}
+
+def init_batch_worker(wf_setup):
+    """
+    Pool initializer for run_batch():
+    rebuild a workflow from wf_setup (see WfManager.wf_setup_dict()) 
+    and compile it into an ExecutionPlan.
+    Errors are saved and reported for each batch item,
+    so that a broken worker does not hang the pool.
+    """
+    # imported here to avoid circular imports with the Workflow module
+    from ..operations.OpManager import OpManager
+    from ..plugins.PluginManager import PluginManager
+    from .WfManager import WfManager
+    logs = []
+    _batch_worker['logs'] = logs
+    try:
+        opman = OpManager()
+        opman.logmethod = lambda msg: None
+        opman.load_cats(ops.cat_list)
+        opman.load_ops(ops.cat_op_list)
+        wfman = WfManager(PluginManager())
+        wfman.logmethod = logs.append
+        wfman.load_wf_setup('batch',opman,wf_setup)
+        _batch_worker['plan'] = wfman.workflows['batch'].compile()
+        _batch_worker['error'] = None
+    except Exception as ex:
+        _batch_worker['error'] = 'Message: {} \nTrace: {}'.format(ex,traceback.format_exc())
+
+def run_batch_input(inp_dict):
+    """
+    Run the worker's ExecutionPlan once, with workflow inputs from inp_dict.
+    Returns a tuple of (workflow outputs dict,list of log messages,error message),
+    where the outputs dict is None if the run failed.
+    """
+    logs = _batch_worker['logs']
+    del logs[:]
+    if _batch_worker['error'] is not None:
+        return None,[],_batch_worker['error']
+    plan = _batch_worker['plan']
+    try:
+        for wf_input_name,val in inp_dict.items():
+            plan.set_input(wf_input_name,val)
+        plan.execute()
+        outputs = plan.wf_outputs_dict()
+        # outputs that can not be pickled back to the parent process
+        # would otherwise raise there, and end the whole batch
+        pickle.dumps(outputs,pickle.HIGHEST_PROTOCOL)
+        return outputs,list(logs),None
+    except Exception as ex:
+        return None,list(logs),'Message: {} \nTrace: {}'.format(ex,traceback.format_exc())
+
+def run_batch_chunk(inp_dicts):
+    """Run the worker's ExecutionPlan for each of inp_dicts (see run_batch_input())."""
+    return [run_batch_input(inp_dict) for inp_dict in inp_dicts]
+
+def run_batch(wf,inp_dicts,n_workers=None,chunk_size=1,timeout=3600.):
+    """
+    Execute Workflow wf once for each of the dicts of workflow inputs
+    in inp_dicts, on a pool of n_workers worker processes.
+    Each worker rebuilds the workflow once from its setup dict,
+    and then runs chunks of chunk_size inputs at a time.
+    Returns the list of workflow outputs dicts, in the order of inp_dicts.
+    Runs that fail are logged, and their outputs are None.
+    A chunk that takes longer than timeout seconds to come back
+    (e.g. because its worker process died) is counted as failed.
+    The Operations of wf itself are not run or updated.
+    """
+    if not n_workers:
+        n_workers = multiprocessing.cpu_count()
+    chunk_size = max(int(chunk_size),1)
+    wf_setup = wf.wf_manager.wf_setup_dict(wf)
+    n_batch = len(inp_dicts)
+    output_dicts = []
+    pool = multiprocessing.Pool(n_workers,init_batch_worker,(wf_setup,))
+    timed_out = False
+    try:
+        chunks = [list(inp_dicts[i:i+chunk_size]) for i in range(0,n_batch,chunk_size)]
+        async_results = [pool.apply_async(run_batch_chunk,(chunk,)) for chunk in chunks]
+        for chunk,res in zip(chunks,async_results):
+            try:
+                results = res.get(timeout)
+            except multiprocessing.TimeoutError:
+                timed_out = True
+                msg = 'no result from the worker process after {} seconds'.format(timeout)
+                results = [(None,[],msg) for inp_dict in chunk]
+            except Exception as ex:
+                msg = 'Message: {} \nTrace: {}'.format(ex,traceback.format_exc())
+                results = [(None,[],msg) for inp_dict in chunk]
+            for outputs,logs,msg in results:
+                i = len(output_dicts)
+                for log_msg in logs:
+                    wf.write_log(log_msg)
+                if msg is not None:
+                    wf.write_log('BATCH RUN {} / {} failed. \n{}'.format(i+1,n_batch,msg))
+                else:
+                    wf.write_log('BATCH RUN {} / {}'.format(i+1,n_batch))
+                output_dicts.append(outputs)
+    finally:
+        if timed_out:
+            # a hung worker would block join()
+            pool.terminate()
+        else:
+            pool.close()
+        pool.join()
+    return output_dicts
+
+def run_file_batch(wf,file_list,input_name,n_workers=1,chunk_size=1,
+    data_input_name=None,prefetch=0,prefetch_reader='tifffile'):
+    """
+    Execute Workflow wf once for each of the file paths in file_list,
+    feeding the path to the workflow input input_name,
+    as for the batch Operations BatchFromFiles and BatchFromDirectory.
+    If n_workers is greater than 1, the runs are distributed
+    over worker processes with run_batch().
+    Otherwise the workflow is compiled and run in this process.
+    If data_input_name is given (only if n_workers is 1),
+    each file is also read by the imgtools.image_readers reader prefetch_reader,
+    up to prefetch files ahead on background threads,
+    and the result is fed to the workflow input data_input_name.
+    Returns a tuple of (list of dicts of workflow inputs,
+    list of dicts of workflow outputs).
+    Runs whose files fail to read are logged, and their outputs are None.
+    """
+    if data_input_name is not None and n_workers > 1:
+        raise ValueError('data_input_name is only supported for batches with n_workers = 1')
+    input_dict_list = []
+    output_dict_list = []
+    n_batch = len(file_list)
+    wf.write_log('STARTING BATCH')
+    for filename in file_list:
+        inp_dict = OrderedDict() 
+        inp_dict[input_name] = filename
+        input_dict_list.append(inp_dict)
+    if n_workers > 1:
+        output_dict_list = run_batch(wf,input_dict_list,n_workers,chunk_size)
+    else:
+        plan = wf.compile()
+        prefetcher = None
+        if data_input_name is not None:
+            # imported here, so that importing paws.api does not load the image readers
+            from ..tools import imgtools
+            prefetcher = imgtools.ImagePrefetcher(file_list,prefetch_reader,prefetch).start()
+        try:
+            for i,inp_dict in zip(range(n_batch),input_dict_list):
+                path = inp_dict[input_name]
+                if prefetcher is not None:
+                    prefetcher.advance(i)
+                    try:
+                        plan.set_input(data_input_name,prefetcher.take(path))
+                    except Exception as ex:
+                        wf.write_log('BATCH RUN {} / {} failed to read {}. \nMessage: {} \nTrace: {}'
+                        .format(i+1,n_batch,path,ex,traceback.format_exc()))
+                        output_dict_list.append(None)
+                        continue
+                plan.set_input(input_name,path)
+                wf.write_log('BATCH RUN {} / {}'.format(i+1,n_batch))
+                plan.execute()
+                output_dict_list.append(plan.wf_outputs_dict())
+        finally:
+            if prefetcher is not None:
+                prefetcher.close()
+        plan.store()
+    wf.write_log('BATCH FINISHED')
+    return input_dict_list,output_dict_list
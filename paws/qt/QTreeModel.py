@@ -65,13 +65,11 @@ class QTreeModel(TreeModel,QtCore.QAbstractItemModel):
         idx = self.root_index()
         for k in path[:-1]:
             itm = self.get_from_index(idx)
-            child_keys = [c.tag for c in itm.children]
-            idx = self.index(child_keys.index(k),0,idx)
+            idx = self.index(itm.child_row(k),0,idx)
         k = path[-1]
         if k:
             itm = self.get_from_index(idx)
-            child_keys = [c.tag for c in itm.children]
-            return self.index(child_keys.index(k),0,idx)
+            return self.index(itm.child_row(k),0,idx)
         elif k == '':
             return idx 
 
@@ -115,30 +113,28 @@ class QTreeModel(TreeModel,QtCore.QAbstractItemModel):
         self.tree_update(parent_itm,itm_tag,self.build_tree(itm_data))        
 
     def tree_update(self,parent_itm,itm_tag,treedata):
-        child_keys = [c.tag for c in parent_itm.children]
         parent_idx = self.get_index_of_item(parent_itm)
-        if itm_tag in child_keys:
+        if parent_itm.has_child(itm_tag):
             # Find existing itm under parent.
-            itm_row = child_keys.index(itm_tag)
+            itm_row = parent_itm.child_row(itm_tag)
             itm = parent_itm.children[itm_row]
             idx = self.index(itm_row,0,parent_idx)
             # Remove any children that do not represent the new itm_tree data
-            new_keys = []
+            new_keys = {}
             if isinstance(treedata,dict):
-                new_keys = treedata.keys()
+                new_keys = treedata
             for gc_row in range(itm.n_children())[::-1]:
                 gc_itm = itm.children[gc_row]
                 if not gc_itm.tag in new_keys:
-                    #rm_row = [gc.tag for gc in itm.children].index(grandchild_itm.tag)
                     self.beginRemoveRows(idx,gc_row,gc_row)
-                    itm.children.pop(gc_row) 
+                    itm.pop_child(gc_row) 
                     self.endRemoveRows()
         else:
             # Else, put a new TreeItem at the end row
             itm_row = parent_itm.n_children()
             itm = self.create_tree_item(parent_itm,itm_tag)
             self.beginInsertRows(parent_idx,itm_row,itm_row)
-            parent_itm.children.insert(itm_row,itm)
+            parent_itm.insert_child(itm,itm_row)
             self.endInsertRows()
         # If needed, get the index of the new item and recurse 
         if isinstance(treedata,dict):
@@ -151,11 +147,10 @@ class QTreeModel(TreeModel,QtCore.QAbstractItemModel):
         parent_idx = self.get_index_of_item(parent_itm) 
         if parent_idx is None:
             parent_idx = self.root_index()
-        child_keys = [c.tag for c in parent_itm.children]
-        rm_row = child_keys.index(itm_tag)
+        rm_row = parent_itm.child_row(itm.tag)
         rm_idx = self.index(rm_row,0,parent_idx)
         self.beginRemoveRows(parent_idx,rm_row,rm_row)
-        parent_itm.children.pop(rm_row)
+        parent_itm.pop_child(rm_row)
         self.endRemoveRows()
         self.dataChanged.emit(rm_idx,rm_idx)
         self.tree_dataChanged(parent_idx)
@@ -179,11 +174,9 @@ class QTreeModel(TreeModel,QtCore.QAbstractItemModel):
         parent_itm = itm.parent
         if parent_itm == self.root_item():
             return self.root_index()
-        parent_tag = parent_itm.tag
         grandparent_itm = parent_itm.parent
-        parent_keys = [p.tag for p in grandparent_itm.children]
-        parent_row = parent_keys.index(parent_tag)
-        return self.createIndex(parent_row,0,grandparent_itm.children[parent_row])
+        parent_row = grandparent_itm.child_row(parent_itm.tag)
+        return self.createIndex(parent_row,0,parent_itm)
         
     # Subclass of QAbstractItemModel must implement rowCount()
     def rowCount(self,parent_idx=QtCore.QModelIndex()):
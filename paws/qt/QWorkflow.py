@@ -24,12 +24,13 @@ class QWorkflow(Workflow,QTreeSelectionModel):
 
     opFinished = QtCore.Signal(str)
 
-    def execute_op(self,op_tag):
-        op = self.get_data_from_uri(op_tag) 
-        self.load_inputs(op,self.wf_manager,self.wf_manager.plugin_manager)
+    def load_op(self,op_tag):
+        op = super(QWorkflow,self).load_op(op_tag)
         self.opChanged.emit(op_tag)
-        op.run() 
-        self.set_item(op_tag,op)
+        return op
+
+    def finish_op(self,op_tag,op):
+        super(QWorkflow,self).finish_op(op_tag,op)
         self.opChanged.emit(op_tag)
         self.opFinished.emit(op_tag)
 
@@ -7,6 +7,7 @@ from PySide import QtCore, QtGui, QtUiTools
 from . import uitools
 from ..core import pawstools
 from ..core.operations.Operation import Operation
+from ..core.operations.OpManager import OpSpec
 
 class OpUiManager(QtCore.QObject):
 
@@ -35,6 +36,8 @@ class OpUiManager(QtCore.QObject):
 
     def get_op(self,idx):
         x = self.qopman.get_data_from_index(idx)
+        if isinstance(x,OpSpec):
+            x = self.qopman.get_op(self.qopman.get_uri_of_index(idx))
         try:
             op_flag = issubclass(x,Operation)
         except:
@@ -256,8 +256,9 @@ class UiManager(QtCore.QObject):
                 + '{}: '.format(itm_uri)) 
                 t = t + self.paw._op_manager.print_cat(itm_uri) 
             else:
-                # the only remaining case is an enabled Operation
-                op = itm_data()
+                # the only remaining case is an enabled Operation,
+                # which may not have been imported yet
+                op = self.paw._op_manager.get_op(itm_uri)()
                 t = op.description()
                 op_widg = widgets.make_widget(op)
             w = QtGui.QTextEdit()
@@ -3,6 +3,7 @@ from functools import partial
 from PySide import QtCore, QtGui, QtUiTools
 
 from ..core.operations import Operation as opmod
+from ..core.operations.OpManager import OpSpec
 from ..core import pawstools
 from ..core.models.ListModel import ListModel
 from .InputLoader import InputLoader
@@ -65,6 +66,8 @@ class WfUiManager(QtCore.QObject):
         if src_qtree is None:
             src_qtree = self.current_wf()
         x = src_qtree.get_data_from_index(itm_idx)
+        if isinstance(x,OpSpec):
+            x = src_qtree.get_op(src_qtree.get_uri_of_index(itm_idx))
         if x is not None:
             try:
                 new_op_flag = issubclass(x,opmod.Operation)
@@ -124,7 +127,7 @@ class WfUiManager(QtCore.QObject):
             self.set_input(name)
         tag = str(self.ui.tag_entry.text())
         if self.current_wf()._tree.is_tag_valid(tag):
-            self.current_wf().set_item(tag,self.op)
+            self.current_wf().set_op(tag,self.op)
             #import pdb; pdb.set_trace()
         else:
             # Request a different tag 
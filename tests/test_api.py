@@ -1,3 +1,6 @@
+import os
+import sys
+import subprocess
 import unittest
 
 class TestAPI(unittest.TestCase):
@@ -8,6 +11,28 @@ class TestAPI(unittest.TestCase):
         paw = paws.api.start()
         self.assertIsInstance(paw,paws.api.PawsAPI)
 
+    def test_lazy_op_import(self):
+        import paws.api
+        from paws.core import operations as ops
+        paw = paws.api.start()
+        paw.set_logmethod(lambda msg: None)
+        modname = ops.__name__+'.TESTS.Identity'
+        sys.modules.pop(modname,None)
+        paw.activate_op('TESTS.Identity')
+        entry = ops.op_manifest['TESTS.Identity']
+        self.assertEqual(entry['inputs'],['data'])
+        self.assertEqual(entry['outputs'],['data'])
+        self.assertNotIn(modname,sys.modules)
+        paw.add_wf('test')
+        paw.add_op('ident','TESTS.Identity','test')
+        self.assertIn(modname,sys.modules)
+        self.assertEqual(type(paw.get_op('ident','test')).__name__,'Identity')
+
+    def test_import_does_not_load_image_tools(self):
+        # check in a fresh interpreter, since other tests import imgtools
+        script = 'import sys, paws.api; sys.exit("paws.core.tools.imgtools" in sys.modules)'
+        env = dict(os.environ,PYTHONPATH=os.pathsep.join(sys.path))
+        self.assertEqual(subprocess.call([sys.executable,'-c',script],env=env),0)
+
 if __name__ == '__main__':
     unittest.main()
-
@@ -0,0 +1,48 @@
+import unittest
+
+from paws.core.models.TreeModel import TreeModel
+from paws.core.models.DictTree import DictTree
+
+class TestTreeModel(unittest.TestCase):
+
+    def setUp(self):
+        self.tree = TreeModel()
+        self.tree.set_item('a',{'x':1,'y':[10,20,30]})
+        self.tree.set_item('b',{'z':None})
+
+    def test_get_from_uri(self):
+        self.assertEqual(self.tree.get_from_uri('a.y.2').tag,'2')
+        self.assertEqual(self.tree.get_from_uri('b').child_row('z'),0)
+        self.assertRaises(ValueError,self.tree.get_from_uri,'a.w')
+
+    def test_tree_update(self):
+        self.tree.set_item('a',{'y':[10],'w':2})
+        a_itm = self.tree.get_from_uri('a')
+        self.assertEqual([c.tag for c in a_itm.children],['y','w'])
+        self.assertEqual(a_itm.child_row('w'),1)
+        self.assertFalse(a_itm.has_child('x'))
+        self.assertEqual(a_itm.child('y').n_children(),1)
+
+    def test_remove_item(self):
+        self.tree.remove_item('a')
+        root = self.tree.get_from_uri('')
+        self.assertEqual([c.tag for c in root.children],['b'])
+        self.assertEqual(root.child_row('b'),0)
+
+class TestDictTree(unittest.TestCase):
+
+    def test_delete_uri(self):
+        tree = DictTree()
+        tree.set_uri('a',{'x':{}})
+        tree.set_uri('a.x.y',1)
+        tree.set_uri('ba',{'a':2})
+        tree.set_uri('ba.a',2)
+        tree.delete_uri('a')
+        self.assertFalse(tree.contains_uri('a.x.y'))
+        # uris that only contain the deleted uri as a substring are kept
+        self.assertTrue(tree.contains_uri('ba.a'))
+        self.assertEqual(tree.make_unique_uri('ba'),'ba_0')
+
+if __name__ == '__main__':
+    unittest.main()
+
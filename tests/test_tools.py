@@ -0,0 +1,575 @@
+import os
+import sys
+import time
+import shutil
+import multiprocessing
+import subprocess
+import tempfile
+import unittest
+
+import numpy as np
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+from paws.core.tools import filewatch
+from paws.core.tools import imgtools
+from paws.core.tools import csvtools
+from paws.core.tools.spectrumstore import SpectrumStore
+from paws.core.tools import h5tools
+from paws.core.tools import saxstools
+from paws.core.tools import formfactortable
+from paws.core.tools import peaktools
+from paws.core.operations.IO.CSV.ReadCSV_q_I_dI import ReadCSV_q_I_dI
+from paws.core.operations.IO.CSV.CSVToArray import CSVToArray
+from paws.core.operations.PROCESSING.BASIC.Rotation import Rotation
+from paws.core.operations.PROCESSING.PEAKS.FindPeaksByWindow import FindPeaksByWindow
+from paws.core.operations.PROCESSING.SAXS.SpectrumFitBatch import SpectrumFitBatch
+from paws.core.operations.PROCESSING.SMOOTHING.MovingAverage import MovingAverage
+from paws.core.operations import optools
+
+def write_file(path,data='x'):
+    with open(path,'w') as f:
+        f.write(data)
+
+class TestFileWatch(unittest.TestCase):
+
+    def setUp(self):
+        self.dirpath = tempfile.mkdtemp()
+        write_file(os.path.join(self.dirpath,'old.tif'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dirpath)
+
+    def check_watcher(self,watcher_class):
+        watcher = watcher_class(self.dirpath,'*.tif',include_existing_files=False,poll_interval=0.01)
+        self.assertEqual(watcher.poll(0.05),[])
+        for nm in ['a.tif','b.tif','c.txt']:
+            write_file(os.path.join(self.dirpath,nm))
+        t0 = time.time()
+        paths = watcher.poll(1.)
+        self.assertLess(time.time()-t0,0.1)
+        self.assertEqual(sorted(paths),[os.path.join(self.dirpath,nm) for nm in ['a.tif','b.tif']])
+        self.assertEqual(watcher.poll(0.05),[])
+        # closing a file without changing it does not report it again
+        open(os.path.join(self.dirpath,'a.tif'),'a').close()
+        self.assertEqual(watcher.poll(0.05),[])
+        watcher.close()
+
+    def test_polling_watcher(self):
+        self.check_watcher(filewatch.PollingWatcher)
+
+    @unittest.skipIf(filewatch._libc is None,'inotify is not available')
+    def test_inotify_watcher(self):
+        self.check_watcher(filewatch.InotifyWatcher)
+
+    @unittest.skipIf(filewatch._libc is None,'inotify is not available')
+    def test_inotify_watcher_open_at_start(self):
+        path = os.path.join(self.dirpath,'open.tif')
+        f = open(path,'w')
+        f.write('x')
+        f.flush()
+        watcher = filewatch.InotifyWatcher(self.dirpath,'*.tif',include_existing_files=True)
+        self.assertEqual(sorted(watcher.poll(0.05)),[os.path.join(self.dirpath,nm) for nm in ['old.tif','open.tif']])
+        # the writer closes the file that was found by the initial scan
+        f.close()
+        self.assertEqual(watcher.poll(0.05),[])
+        watcher.close()
+
+    def test_write_completion(self):
+        tracker = filewatch.WriteCompletionTracker(settle_time=0.1,header_ext='.txt')
+        path = os.path.join(self.dirpath,'old.tif')
+        tracker.add([path])
+        # no header yet
+        self.assertEqual(tracker.pop_ready(),[])
+        time.sleep(0.15)
+        self.assertEqual(tracker.pop_ready(),[])
+        write_file(os.path.join(self.dirpath,'old.txt'))
+        self.assertEqual(tracker.pop_ready(),[])
+        time.sleep(0.15)
+        self.assertEqual(tracker.pop_ready(),[path])
+        self.assertEqual(tracker.n_pending(),0)
+
+    def test_write_completion_removed(self):
+        tracker = filewatch.WriteCompletionTracker(settle_time=0.1)
+        path = os.path.join(self.dirpath,'gone.tif')
+        write_file(path)
+        tracker.add([path])
+        self.assertEqual(tracker.pop_ready(),[])
+        os.remove(path)
+        self.assertEqual(tracker.pop_ready(),[])
+        self.assertEqual(tracker.n_pending(),0)
+
+    def test_file_system_iterator(self):
+        fsi = optools.FileSystemIterator(self.dirpath,'*.tif',True,1.,settle_time=0.3)
+        self.assertEqual(next(fsi),[os.path.join(self.dirpath,'old.tif')])
+        fsi.timeout = 0.1
+        self.assertEqual(next(fsi),[None])
+        path = os.path.join(self.dirpath,'new.tif')
+        f = open(path,'w')
+        f.write('x')
+        f.flush()
+        # the file is not returned until its writer is done with it
+        self.assertEqual(next(fsi),[None])
+        f.close()
+        fsi.timeout = 1.
+        self.assertEqual(next(fsi),[path])
+        paths = [os.path.join(self.dirpath,'new{}.tif'.format(i)) for i in range(3)]
+        for p in paths:
+            write_file(p)
+        batch = []
+        while len(batch) < 3:
+            new_paths = fsi.next_batch()
+            self.assertTrue(new_paths)
+            batch.extend(new_paths)
+        self.assertEqual(sorted(batch),paths)
+        fsi.close()
+
+class TestImgTools(unittest.TestCase):
+
+    def setUp(self):
+        self.dirpath = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirpath)
+
+    def write_edf(self,path,img,compression=None):
+        hdr = str('{\nHeaderID = EH:000001:000000:000000 ;\nByteOrder = LowByteFirst ;\n'
+        + 'DataType = FloatValue ;\nDim_1 = {} ;\nDim_2 = {} ;\nSize = {} ;\n'
+        .format(img.shape[1],img.shape[0],img.nbytes))
+        if compression:
+            hdr += 'Compression = {} ;\n'.format(compression)
+        hdr = hdr + ' '*(510-len(hdr)) + '}\n'
+        with open(path,'wb') as f:
+            f.write(hdr.encode('ascii'))
+            f.write(img.astype('<f4').tobytes())
+
+    def test_memmap_edf(self):
+        img = np.arange(12,dtype=np.float32).reshape(3,4)
+        path = os.path.join(self.dirpath,'img.edf')
+        self.write_edf(path,img)
+        mm = imgtools.memmap_image(path)
+        self.assertIsInstance(mm,np.memmap)
+        self.assertFalse(mm.flags.writeable)
+        self.assertTrue(np.array_equal(mm,img))
+        self.write_edf(path,img,'gzip')
+        self.assertIsNone(imgtools.memmap_image(path))
+
+    def test_rotate_memmap(self):
+        img = np.arange(12,dtype=np.float32).reshape(3,4)
+        path = os.path.join(self.dirpath,'img.edf')
+        self.write_edf(path,img)
+        op = Rotation()
+        op.load_defaults()
+        op.inputs['image_data'] = imgtools.memmap_image(path)
+        for rot_deg in [90,180,270]:
+            op.inputs['rotation_deg'] = rot_deg
+            op.run()
+            self.assertTrue(np.array_equal(op.outputs['image_data'],np.rot90(img,rot_deg//90)))
+            # the output is a read-only view of the file data
+            self.assertFalse(op.outputs['image_data'].flags.writeable)
+        op.inputs['rotation_deg'] = 45
+        self.assertRaises(ValueError,op.run)
+
+    def test_prefetcher(self):
+        reads = []
+        def fake_reader(path):
+            reads.append(path)
+            return path.upper()
+        imgtools.image_readers['fake'] = fake_reader
+        try:
+            paths = ['a','b','c','d']
+            pf = imgtools.ImagePrefetcher(paths,'fake',depth=2).start()
+            pf.advance(0)
+            self.assertEqual(pf.take('a'),'A')
+            pf.advance(2)
+            self.assertEqual(pf.take('c'),'C')
+            self.assertEqual(pf.take('d'),'D')
+            # b was read ahead, then skipped and discarded
+            self.assertEqual(sorted(reads),paths)
+            # images that were not prefetched are read when they are taken
+            self.assertEqual(pf.take('b'),'B')
+            self.assertEqual(len(reads),5)
+            pf.close()
+        finally:
+            imgtools.image_readers.pop('fake')
+
+class TestCSVTools(unittest.TestCase):
+
+    def setUp(self):
+        self.dirpath = tempfile.mkdtemp()
+        self.path = os.path.join(self.dirpath,'spec.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.dirpath)
+
+    def test_read_csv_columns(self):
+        data = np.random.rand(50,3)
+        np.savetxt(self.path,data,delimiter=',',header='q, I, dI')
+        names,csv_data = csvtools.read_csv_columns(self.path)
+        self.assertEqual(names,['q','I','dI'])
+        self.assertTrue(np.allclose(csv_data,data))
+        # no header, irregular whitespace
+        write_file(self.path,'1,2\n\n 3, 4\n')
+        names,csv_data = csvtools.read_csv_columns(self.path)
+        self.assertIsNone(names)
+        self.assertTrue(np.array_equal(csv_data,[[1,2],[3,4]]))
+        # comment lines among the data
+        write_file(self.path,'1,2\n# 3,4\n5,6\n')
+        names,csv_data = csvtools.read_csv_columns(self.path)
+        self.assertTrue(np.array_equal(csv_data,[[1,2],[5,6]]))
+        # whitespace-delimited, with runs of spaces
+        write_file(self.path,'q   I\n1    2\n 3  4\n')
+        names,csv_data = csvtools.read_csv_columns(self.path,' ')
+        self.assertEqual(names,['q','I'])
+        self.assertTrue(np.array_equal(csv_data,[[1,2],[3,4]]))
+        # header only
+        write_file(self.path,'# q, I\n')
+        with self.assertRaises(ValueError):
+            csvtools.read_csv_columns(self.path)
+
+    def test_csv_to_array(self):
+        op = CSVToArray()
+        op.load_defaults()
+        op.inputs['path'] = self.path
+        for text in ['1,2,3\n','1\n2\n3\n','1,2\n3,4\n']:
+            write_file(self.path,text)
+            op.run()
+            self.assertEqual(op.outputs['array'].shape,np.loadtxt(self.path,delimiter=',').shape)
+
+    def test_read_csv_q_I_dI(self):
+        np.savetxt(self.path,np.array([[0.1,10.],[0.2,5.]]),delimiter=',',header='q, I')
+        op = ReadCSV_q_I_dI()
+        op.load_defaults()
+        op.inputs['path'] = self.path
+        op.run()
+        self.assertTrue(np.array_equal(op.outputs['q'],[0.1,0.2]))
+        self.assertTrue(np.array_equal(op.outputs['I'],[10.,5.]))
+        self.assertIsNone(op.outputs['dI'])
+
+def append_rows(store_path,start,stop):
+    store = SpectrumStore(store_path)
+    q = np.linspace(0.01,0.5,20)
+    for i in range(start,stop):
+        store.append({'q':q,'I':q*i,'time':float(i)})
+    store.close()
+
+class TestSpectrumStore(unittest.TestCase):
+
+    def setUp(self):
+        self.dirpath = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirpath)
+
+    def test_append_and_read(self):
+        store = SpectrumStore(os.path.join(self.dirpath,'store'))
+        q = np.linspace(0.01,0.5,20)
+        for i in range(5):
+            idx = store.append({'q':q,'I':q*i,'dI':None,'time':float(i)})
+            self.assertEqual(idx,i)
+        with self.assertRaises(ValueError):
+            store.append({'q':q,'I':q[:5]})
+        store.close()
+        # reopen
+        store = SpectrumStore(os.path.join(self.dirpath,'store'))
+        self.assertEqual(store.column_names(),['I','q','time'])
+        self.assertEqual(store.n_rows(),5)
+        store.append({'q':q,'I':q*5})
+        I = store.column('I')
+        self.assertIsInstance(I,np.memmap)
+        self.assertEqual(I.shape,(6,20))
+        self.assertTrue(np.allclose(I[3],q*3))
+        row = store.row(2)
+        self.assertTrue(np.allclose(row['I'],q*2))
+        self.assertEqual(row['time'],2.)
+        self.assertTrue(np.isnan(store.row(5)['time']))
+        self.assertTrue(np.allclose(store.row(-1)['I'],q*5))
+        for idx in [6,-7]:
+            with self.assertRaises(IndexError):
+                store.row(idx)
+        # the columns are regular .npy files
+        self.assertEqual(np.load(store.column_path('time')).shape,(6,))
+        store.close()
+
+    def test_append_from_processes(self):
+        store_path = os.path.join(self.dirpath,'store')
+        procs = [multiprocessing.Process(target=append_rows,args=(store_path,50*i,50*(i+1)))
+        for i in range(4)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        store = SpectrumStore(store_path)
+        self.assertEqual(store.n_rows(),200)
+        t = store.column('time')
+        self.assertEqual(sorted(t),list(range(200)))
+        q = store.column('q')[0]
+        I = store.column('I')
+        for idx in range(200):
+            self.assertTrue(np.allclose(I[idx],q*t[idx]))
+        store.close()
+
+class TestSaxsTools(unittest.TestCase):
+
+    def test_spherical_normal_saxs(self):
+        q = np.linspace(0.,0.6,300)
+        r0 = 30.
+        for sigma in [0.,0.05,0.2]:
+            I = saxstools.compute_spherical_normal_saxs(q,r0,sigma)
+            # reference: sum the size distribution one radius at a time
+            I_ref = np.zeros(q.shape)
+            I_ref[0] = 1.
+            if sigma == 0.:
+                x = q[1:]*r0
+                I_ref[1:] = (3.*(np.sin(x)-x*np.cos(x))*x**-3)**2
+            else:
+                sigma_r = sigma*r0
+                dr = sigma_r*0.02
+                I_zero = 0.
+                rmin = max(r0-5*sigma_r,dr)
+                for ri in rmin+dr*np.arange(int(round((r0+5*sigma_r-rmin)/dr))):
+                    xi = q[1:]*ri
+                    wi = (4./3*np.pi*ri**3)**2*np.exp(-1*(r0-ri)**2/(2*sigma_r**2))
+                    I_zero += wi
+                    I_ref[1:] += wi*(3.*(np.sin(xi)-xi*np.cos(xi))*xi**-3)**2
+                I_ref[1:] = I_ref[1:]/I_zero
+            self.assertEqual(I[0],1.)
+            self.assertTrue(np.allclose(I,I_ref,rtol=1e-9,atol=0.))
+
+    def test_form_factor_table(self):
+        dirpath = tempfile.mkdtemp()
+        try:
+            grid = dict(u_max=20.,du=0.01,sigma_min=0.05,sigma_max=0.3,n_sigma=20)
+            # the table is built in the background
+            self.assertIsNone(formfactortable.get_sphere_table(dirpath,False,**grid))
+            table = formfactortable.get_sphere_table(dirpath,**grid)
+            self.assertTrue(table.max_error < 1e-2)
+            # the table is saved, and loaded by later tables
+            table2 = formfactortable.SphereFormFactorTable(**grid)
+            self.assertTrue(table2.load(dirpath))
+            self.assertTrue(np.array_equal(table2.log_I,table.log_I))
+            q = np.linspace(0.,0.5,200)
+            I = saxstools.compute_spherical_normal_saxs(q,30.,0.12)
+            I_tab = saxstools.compute_spherical_normal_saxs(q,30.,0.12,table)
+            self.assertEqual(I_tab[0],1.)
+            self.assertTrue(np.all(np.abs(I_tab/I-1.) <= table.max_error))
+            # q*r0 beyond the table: computed directly
+            self.assertIsNone(table.lookup(q,60.,0.12))
+            I_far = saxstools.compute_spherical_normal_saxs(q,60.,0.12,table)
+            self.assertTrue(np.allclose(I_far,saxstools.compute_spherical_normal_saxs(q,60.,0.12)))
+        finally:
+            shutil.rmtree(dirpath)
+
+    def test_form_factor_table_files(self):
+        dirpath = tempfile.mkdtemp()
+        try:
+            grid = dict(u_max=2.,du=0.1,sigma_min=0.05,sigma_max=0.3,n_sigma=5)
+            # a half-written table file is a cache miss
+            table = formfactortable.SphereFormFactorTable(**grid)
+            with open(table.file_path(dirpath),'wb') as f:
+                f.write(b'PK\x03\x04')
+            self.assertFalse(table.load(dirpath))
+            table = formfactortable.get_sphere_table(dirpath,**grid)
+            self.assertTrue(formfactortable.SphereFormFactorTable(**grid).load(dirpath))
+            self.assertEqual(os.listdir(dirpath),[os.path.basename(table.file_path(dirpath))])
+            # a table that can not be saved is still kept in memory
+            bad_dirpath = os.path.join(dirpath,'missing')
+            table = formfactortable.get_sphere_table(bad_dirpath,**grid)
+            self.assertIs(formfactortable.get_sphere_table(bad_dirpath,**grid),table)
+            self.assertFalse(os.path.exists(bad_dirpath))
+        finally:
+            shutil.rmtree(dirpath)
+
+    def test_profile_spectrum_bins(self):
+        q = np.linspace(0.005,0.7,500)
+        I = np.exp(-5*q)+0.01
+        d = saxstools.profile_spectrum(q,I,n_bins=20,q_bin_range=(0.,0.5))
+        self.assertEqual(len(d['q_bin_edges']),20)
+        self.assertAlmostEqual(d['q_bin_edges'][-1],0.5)
+        # reference: integrate each bin separately
+        dq = q[1:]-q[:-1]
+        I_integral = np.sum(dq*(I[1:]+I[:-1])/2)
+        binfloor = 0.
+        for ibin,binmax in enumerate(d['q_bin_edges']):
+            qbin = q[(q>=binfloor) & (q<binmax)]
+            Ibin = I[(q>=binfloor) & (q<binmax)]
+            strength = np.sum((qbin[1:]-qbin[:-1])*(Ibin[1:]+Ibin[:-1])/2)/I_integral
+            self.assertAlmostEqual(d['q_bin_strengths'][ibin],strength)
+            binfloor = binmax
+
+    def test_fit_objective(self):
+        q = np.linspace(0.01,0.5,200)
+        flags = {'bad_data':False,'diffraction_peaks':False,
+            'precursor_scattering':True,'form_factor_scattering':True}
+        params = {'I0_floor':0.01,'I0_precursor':2.,'r0_precursor':5.,
+            'I0_sphere':100.,'r0_sphere':25.,'sigma_sphere':0.08}
+        I = saxstools.compute_saxs(q,flags,params)*np.exp(0.01*np.sin(50*q))
+        I[:5] = 0.
+        fit_keys = ['I0_sphere','r0_sphere','sigma_sphere']
+        x = [90.,24.,0.1]
+        nz = (I>0)
+        I_x = saxstools.compute_saxs_with_substitutions(q,flags,params,fit_keys,x)
+        obj = saxstools.FitObjective(q,I,'chi2log',flags,params,fit_keys)
+        self.assertAlmostEqual(obj(x),saxstools.compute_chi2(np.log(I_x[nz]),np.log(I[nz])))
+        obj = saxstools.FitObjective(q,I,'low_q_pearson',flags,params,fit_keys)
+        lowq = (q<0.4)
+        self.assertAlmostEqual(obj(x),-1*saxstools.compute_pearson(I_x[lowq],I[lowq]))
+        # the input params are not modified
+        self.assertEqual(params['r0_sphere'],25.)
+
+    def test_fit_spectrum_batch(self):
+        q = np.linspace(0.01,0.5,200)
+        flags = {'bad_data':False,'diffraction_peaks':False,
+            'precursor_scattering':False,'form_factor_scattering':True}
+        fit_keys = ['I0_floor','I0_sphere','r0_sphere','sigma_sphere']
+        p_true = [{'I0_floor':0.01,'I0_sphere':100.,'r0_sphere':25.+k,'sigma_sphere':0.08+0.01*k}
+            for k in range(3)]
+        I_stack = np.array([saxstools.compute_saxs(q,flags,p) for p in p_true])
+        # analytic and finite-difference derivatives agree with compute_saxs()
+        I,J = saxstools.compute_saxs_jacobian(q,flags,p_true[0],fit_keys)
+        self.assertTrue(np.allclose(I,I_stack[0]))
+        for i,k in enumerate(fit_keys):
+            p = dict(p_true[0])
+            h = 1e-5*p[k]
+            p[k] += h
+            dI = (saxstools.compute_saxs(q,flags,p)-I)/h
+            self.assertTrue(np.allclose(J[:,i],dI,rtol=1e-3,atol=1e-6*np.max(np.abs(dI))))
+        p_init = {'I0_floor':0.02,'I0_sphere':80.,'r0_sphere':24.,'sigma_sphere':0.1}
+        results = saxstools.fit_spectrum_batch(q,I_stack,'chi2log',flags,p_init,fit_keys)
+        self.assertEqual(len(results),3)
+        for d,p in zip(results,p_true):
+            self.assertTrue(d['objective_after'] < d['objective_before'])
+            self.assertAlmostEqual(d['r0_sphere'],p['r0_sphere'],places=3)
+            self.assertAlmostEqual(d['sigma_sphere'],p['sigma_sphere'],places=4)
+        # fix_I0 on I0_floor and I0_sphere keeps their sum fixed
+        results = saxstools.fit_spectrum_batch(q,I_stack,'chi2log',flags,p_true[0],fit_keys,['fix_I0'])
+        for d,p in zip(results,p_true):
+            self.assertAlmostEqual(d['I0_floor']+d['I0_sphere'],100.01)
+            self.assertAlmostEqual(d['r0_sphere'],p['r0_sphere'],places=3)
+        # the op does not fix I(q=0), which changes through the batch
+        scales = [1.,1.5,2.]
+        I_scaled = I_stack*np.array(scales)[:,None]
+        op = SpectrumFitBatch()
+        op.load_defaults()
+        op.inputs.update(q=q,I_stack=I_scaled,flags=flags,params=p_init,fit_params=fit_keys)
+        op.run()
+        for k,(d,p) in enumerate(zip(op.outputs['params'],p_true)):
+            self.assertAlmostEqual(d['I0_sphere']/(p['I0_sphere']*scales[k]),1.,places=3)
+            self.assertTrue(np.array_equal(op.outputs['I_opt'][k],saxstools.compute_saxs(q,flags,d)))
+        # spectra that are not fit get empty params and zero intensities
+        op = SpectrumFitBatch()
+        op.load_defaults()
+        op.inputs.update(q=q,I_stack=I_stack,flags=dict(flags,bad_data=True),
+            params=p_init,fit_params=fit_keys)
+        op.run()
+        self.assertEqual(op.outputs['params'],[{},{},{}])
+        self.assertTrue(np.array_equal(op.outputs['I_opt'],np.zeros(I_stack.shape)))
+
+class TestPeakTools(unittest.TestCase):
+
+    def test_window_extrema(self):
+        # integer values, so that windows have ties
+        y = np.round(5*np.random.RandomState(0).rand(300))
+        for w in [1,4,10]:
+            idx_max,idx_min = peaktools.window_extrema(y,w)
+            self.assertEqual(list(idx_max),
+                [i for i in range(w,len(y)-w) if np.argmax(y[i-w:i+w+1]) == w])
+            self.assertEqual(list(idx_min),
+                [i for i in range(w,len(y)-w) if np.argmin(y[i-w:i+w+1]) == w])
+        self.assertEqual(len(peaktools.window_maxima(y[:5],3)),0)
+
+    def test_find_peaks_by_window(self):
+        x = np.linspace(0.,60.,3000)
+        y = np.sin(x)+1.5
+        op = FindPeaksByWindow()
+        op.inputs['x'] = x
+        op.inputs['y'] = y
+        op.inputs['windowsize'] = 20
+        op.run()
+        self.assertTrue(np.allclose(np.sin(op.outputs['x_pk']),1.,atol=1e-3))
+        self.assertEqual(len(op.outputs['pk_idx']),10)
+        # peaks relative to the window average are about 1.0076 for x < 30
+        # and about 1.0107 for x > 30
+        op.inputs['threshold'] = 1.009
+        op.inputs['y'] = y*np.where(x>30.,1.,0.01)+0.01
+        op.run()
+        self.assertEqual(len(op.outputs['pk_idx']),5)
+        self.assertTrue(np.all(op.outputs['x_pk'] > 30.))
+
+class TestMovingAverage(unittest.TestCase):
+
+    def test_moving_average(self):
+        rng = np.random.RandomState(0)
+        self.check_moving_average(rng.rand(60),rng.rand(60)+0.5)
+
+    def test_moving_average_high_dynamic_range(self):
+        # error weights spanning 18 decades,
+        # with windows far from the largest weights
+        rng = np.random.RandomState(0)
+        err = 10.**rng.uniform(1.,3.,1000)
+        err[:100] = 1e-6
+        self.check_moving_average(rng.rand(1000),err)
+
+    def check_moving_average(self,x,err):
+        op = MovingAverage()
+        op.inputs['data'] = x
+        op.inputs['error'] = err
+        for shape,w in [('square',4),('triangle',4),('square',150),('triangle',150)]:
+            op.inputs['shape'] = shape
+            op.inputs['window'] = w
+            op.run()
+            if shape == 'triangle':
+                shape_weights = (w+1-np.abs(np.arange(-w,w+1)))/float(w+1)
+            else:
+                shape_weights = np.ones(2*w+1)
+            # reference: weighted average over each window, cut off at the ends
+            for i in range(len(x)):
+                lo,hi = max(0,i-w),min(len(x),i+w+1)
+                wts = shape_weights[lo-i+w:hi-i+w]*err[lo:hi]**-2
+                self.assertAlmostEqual(op.outputs['smoothdata'][i],np.sum(wts*x[lo:hi])/np.sum(wts))
+
+@unittest.skipIf(h5py is None,'h5py is not installed')
+class TestH5Tools(unittest.TestCase):
+
+    def setUp(self):
+        self.dirpath = tempfile.mkdtemp()
+        self.path = os.path.join(self.dirpath,'stack.h5')
+
+    def tearDown(self):
+        h5tools.close_h5()
+        shutil.rmtree(self.dirpath)
+
+    def test_append_and_read_frames(self):
+        frames = np.random.rand(5,8,6)
+        for i in range(5):
+            n = h5tools.append_frames(self.path,'entry/data/data',frames[i:i+1],'gzip')
+            self.assertEqual(n,i+1)
+        self.assertEqual(h5tools.open_h5(self.path)['entry/data/data'].chunks,(1,8,6))
+        self.assertTrue(np.array_equal(h5tools.read_frames(self.path,'entry/data/data',3),frames[3]))
+        self.assertTrue(np.array_equal(h5tools.read_frames(self.path,'entry/data/data','1:5:2'),frames[1:5:2]))
+        self.assertEqual(h5tools.n_frames(self.path,'entry/data/data'),5)
+        self.assertTrue(np.array_equal(h5tools.read_frames(self.path,'entry/data/data',-1),frames[4]))
+        self.assertRaises(IndexError,h5tools.read_frames,self.path,'entry/data/data',5)
+        self.assertEqual(h5tools.frame_index('-2',5),3)
+
+    def test_read_external_appends(self):
+        h5tools.append_frames(self.path,'entry/data/data',np.zeros((2,4,4)))
+        h5tools.close_h5(self.path)
+        self.assertEqual(h5tools.n_frames(self.path,'entry/data/data'),2)
+        # append from another process while the file is cached for reading
+        script = str('import h5py, numpy; f = h5py.File({!r},"a"); d = f["entry/data/data"]; '
+        + 'd.resize(3,axis=0); d[2] = numpy.ones((4,4)); f.close()').format(self.path)
+        env = dict(os.environ,HDF5_USE_FILE_LOCKING='FALSE')
+        subprocess.check_call([sys.executable,'-c',script],env=env)
+        # make sure the modification time changes, even on coarse-grained file systems
+        t = os.path.getmtime(self.path)+1.
+        os.utime(self.path,(t,t))
+        self.assertEqual(h5tools.n_frames(self.path,'entry/data/data'),3)
+        self.assertTrue(np.array_equal(h5tools.read_frames(self.path,'entry/data/data',2),np.ones((4,4))))
+        h5tools.close_h5(self.path)
+        self.assertFalse(self.path in h5tools._files)
+
+if __name__ == '__main__':
+    unittest.main()
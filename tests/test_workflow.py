@@ -0,0 +1,424 @@
+import os
+import shutil
+import tempfile
+import unittest
+import threading
+import time
+
+import numpy as np
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+from paws.core.operations import Operation as opmod
+from paws.core.operations.Operation import Operation
+from paws.core.plugins.PluginManager import PluginManager
+from paws.core.workflow.WfManager import WfManager
+from paws.core.workflow import wftools
+from paws.core.operations.TESTS.Identity import Identity
+from paws.core.operations.EXECUTION.BATCH.BatchFromFiles import BatchFromFiles
+from paws.core.operations.EXECUTION.REALTIME.RealtimeFromFiles import RealtimeFromFiles
+from paws.core.workflow import RealtimePipeline as rtmod
+from paws.core.operations.EXECUTION.BATCH.BatchFromHDF5Stack import BatchFromHDF5Stack
+from paws.core.tools import h5tools
+from paws.core.tools import imgtools
+
+class CountRuns(Operation):
+    """Count calls to run(), and output a copy of the input array."""
+
+    n_runs = 0
+
+    def __init__(self):
+        super(CountRuns,self).__init__(['x'],['y'])
+
+    def run(self):
+        CountRuns.n_runs += 1
+        self.outputs['y'] = np.array(self.inputs['x'])
+
+class AddOne(Operation):
+    """Add one to x, after waiting for delay seconds."""
+
+    def __init__(self):
+        super(AddOne,self).__init__(['x','delay'],['y'])
+        self.inputs['delay'] = 0.
+
+    def run(self):
+        time.sleep(self.inputs['delay'])
+        self.outputs['y'] = self.inputs['x'] + 1
+
+class LambdaOutput(Operation):
+    """Output a lambda, which can not be pickled."""
+
+    def __init__(self):
+        super(LambdaOutput,self).__init__(['x'],['y'])
+
+    def run(self):
+        self.outputs['y'] = lambda: self.inputs['x']
+
+class FailingExecutor(wftools.SerialExecutor):
+
+    def submit(self,op_tag,op,callback):
+        raise RuntimeError('can not submit {}'.format(op_tag))
+
+def make_lambda():
+    return lambda: None
+
+class UnpicklesToLambda(object):
+    """Pickles fine, but becomes a lambda (which can not be pickled) when unpickled."""
+
+    def __reduce__(self):
+        return (make_lambda,())
+
+class KillsWorker(object):
+    """Ends any process other than the test process that pickles it."""
+
+    test_pid = os.getpid()
+
+    def __reduce__(self):
+        if os.getpid() != KillsWorker.test_pid:
+            os._exit(1)
+        return (KillsWorker,())
+
+def build_wf(wfman):
+    # a -> (b1, b2, b3) -> c1 (from b1)
+    wfman.add_wf('test')
+    wf = wfman.workflows['test']
+    for op_tag in ['a','b1','b2','b3','c1']:
+        op = AddOne()
+        op.load_defaults()
+        wf.set_item(op_tag,op)
+    wf.set_input_locator('a','x',opmod.InputLocator(opmod.auto_type,0))
+    for op_tag in ['b1','b2','b3']:
+        wf.set_input_locator(op_tag,'x',opmod.InputLocator(opmod.workflow_item,'a.outputs.y'))
+        wf.set_input_locator(op_tag,'delay',opmod.InputLocator(opmod.auto_type,0.2))
+    wf.set_input_locator('c1','x',opmod.InputLocator(opmod.workflow_item,'b1.outputs.y'))
+    return wf
+
+class TestWorkflow(unittest.TestCase):
+
+    def setUp(self):
+        self.wfman = WfManager(PluginManager())
+        self.wfman.logmethod = lambda msg: None
+        self.wf = build_wf(self.wfman)
+
+    def check_outputs(self):
+        self.assertEqual(self.wf.get_data_from_uri('a.outputs.y'),1)
+        for op_tag in ['b1','b2','b3']:
+            self.assertEqual(self.wf.get_data_from_uri(op_tag+'.outputs.y'),2)
+        self.assertEqual(self.wf.get_data_from_uri('c1.outputs.y'),3)
+
+    def test_serial_execute(self):
+        self.wf.execute()
+        self.check_outputs()
+
+    def test_thread_pool_execute(self):
+        self.wf.set_executor(wftools.ThreadPoolExecutor(3))
+        t0 = time.time()
+        self.wf.execute()
+        self.wf.executor.shutdown()
+        # the three 0.2-second branches should run side by side
+        self.assertLess(time.time()-t0,0.5)
+        self.check_outputs()
+
+    def test_process_pool_execute(self):
+        self.wf.set_executor(wftools.ProcessPoolExecutor(2))
+        self.wf.execute()
+        self.wf.executor.shutdown()
+        self.check_outputs()
+
+    def test_process_pool_errors(self):
+        op = LambdaOutput()
+        op.load_defaults()
+        self.wf.set_item('d',op)
+        self.wf.set_input_locator('d','x',opmod.InputLocator(opmod.auto_type,1))
+        logs = []
+        self.wfman.logmethod = logs.append
+        self.wf.set_executor(wftools.ProcessPoolExecutor(2))
+        self.wf.execute()
+        self.wf.executor.shutdown()
+        self.check_outputs()
+        self.assertTrue(any(['Operation d threw an error' in msg for msg in logs]))
+
+    def test_submit_errors(self):
+        self.wf.set_executor(FailingExecutor())
+        self.wf.execute()
+        self.assertIsNone(self.wf.get_data_from_uri('a.outputs.y'))
+
+    def test_disabled_dependency(self):
+        self.wf.set_op_enabled('b1',False)
+        self.assertEqual(list(self.wf.op_dependencies().keys()),['a','b2','b3'])
+        self.wf.execute()
+        self.assertIsNone(self.wf.get_data_from_uri('c1.outputs.y'))
+
+    def test_execution_stack(self):
+        stk,diag = self.wf.execution_stack()
+        self.assertEqual(stk,[['a'],['b1','b2','b3'],['c1']])
+        # the stack is cached until the workflow changes 
+        self.assertIs(self.wf.execution_stack()[0],stk)
+        self.wf.execute()
+        self.assertIs(self.wf.execution_stack()[0],stk)
+        self.wf.set_input_locator('c1','x',opmod.InputLocator(opmod.workflow_item,'c1.outputs.y'))
+        stk,diag = self.wf.execution_stack()
+        self.assertEqual(stk,[['a'],['b1','b2','b3']])
+        self.assertTrue(diag['c1.inputs.x'])
+
+    def test_set_item_after_inplace_edit(self):
+        stk,diag = self.wf.execution_stack()
+        # edit an input locator in place, as the gui does, then store the same op again
+        c1 = self.wf.get_data_from_uri('c1')
+        c1.input_locator['x'] = opmod.InputLocator(opmod.workflow_item,'b2.outputs.y')
+        self.wf.set_item('c1',c1)
+        b2 = self.wf.get_data_from_uri('b2')
+        b2.input_locator['x'] = opmod.InputLocator(opmod.workflow_item,'c1.outputs.y')
+        self.wf.set_item('b2',b2)
+        stk,diag = self.wf.execution_stack()
+        self.assertEqual(stk,[['a'],['b1','b3']])
+        self.assertTrue(diag['b2.inputs.x'])
+        self.assertTrue(diag['c1.inputs.x'])
+
+    def test_compiled_plan(self):
+        self.wf.connect_wf_input('x','a.inputs.x')
+        self.wf.connect_wf_output('y','c1.outputs.y')
+        plan = self.wf.compile()
+        ys = []
+        for x in range(3):
+            plan.set_input('x',x)
+            plan.execute()
+            ys.append(plan.wf_outputs_dict()['y'])
+        self.assertEqual(ys,[3,4,5])
+        plan.store()
+        self.assertEqual(self.wf.get_data_from_uri('c1.outputs.y'),5)
+        self.assertEqual(self.wf.get_data_from_uri('a.inputs.x'),2)
+
+    def test_parallel_batch(self):
+        self.wfman.add_wf('batch_wf')
+        batch_wf = self.wfman.workflows['batch_wf']
+        ident = Identity()
+        ident.load_defaults()
+        batch_wf.set_item('ident',ident)
+        batch_wf.connect_wf_input('x','ident.inputs.data')
+        batch_wf.connect_wf_output('y','ident.outputs.data')
+        batch = BatchFromFiles()
+        batch.load_defaults()
+        self.wf.set_item('batch',batch)
+        file_list = ['file_{}.tif'.format(i) for i in range(7)]
+        for name,val in [('file_list',file_list),('input_name','x'),('n_workers',3),('chunk_size',2)]:
+            self.wf.set_input_locator('batch',name,opmod.InputLocator(opmod.auto_type,val))
+        self.wf.set_input_locator('batch','workflow',opmod.InputLocator(opmod.entire_workflow,'batch_wf'))
+        self.wf.execute_op('batch')
+        outputs = self.wf.get_data_from_uri('batch.outputs.batch_outputs')
+        self.assertEqual([d['y'] for d in outputs],file_list)
+
+    def test_parallel_batch_errors(self):
+        self.wfman.add_wf('batch_wf')
+        batch_wf = self.wfman.workflows['batch_wf']
+        ident = Identity()
+        ident.load_defaults()
+        batch_wf.set_item('ident',ident)
+        batch_wf.connect_wf_input('x','ident.inputs.data')
+        batch_wf.connect_wf_output('y','ident.outputs.data')
+        inp_dicts = [{'x':0},{'x':UnpicklesToLambda()},{'x':2},{'x':KillsWorker()},{'x':4}]
+        outputs = wftools.run_batch(batch_wf,inp_dicts,2,1,timeout=5.)
+        self.assertEqual(outputs[0],{'y':0})
+        self.assertIsNone(outputs[1])
+        self.assertEqual(outputs[2],{'y':2})
+        self.assertIsNone(outputs[3])
+        self.assertEqual(outputs[4],{'y':4})
+
+    def test_prefetched_batch(self):
+        def fake_reader(path):
+            if path == 'bad':
+                raise IOError('can not read {}'.format(path))
+            return path.upper()
+        imgtools.image_readers['fake'] = fake_reader
+        try:
+            self.wfman.add_wf('batch_wf')
+            batch_wf = self.wfman.workflows['batch_wf']
+            for op_tag in ['ident_path','ident']:
+                ident = Identity()
+                ident.load_defaults()
+                batch_wf.set_item(op_tag,ident)
+            batch_wf.connect_wf_input('path','ident_path.inputs.data')
+            batch_wf.connect_wf_input('img','ident.inputs.data')
+            batch_wf.connect_wf_output('path','ident_path.outputs.data')
+            batch_wf.connect_wf_output('img','ident.outputs.data')
+            batch = BatchFromFiles()
+            batch.load_defaults()
+            self.wf.set_item('batch',batch)
+            for name,val in [('file_list',['a','bad','c']),('input_name','path'),
+                ('data_input_name','img'),('prefetch',2),('prefetch_reader','fake')]:
+                self.wf.set_input_locator('batch',name,opmod.InputLocator(opmod.auto_type,val))
+            self.wf.set_input_locator('batch','workflow',opmod.InputLocator(opmod.entire_workflow,'batch_wf'))
+            self.wf.execute_op('batch')
+            outputs = self.wf.get_data_from_uri('batch.outputs.batch_outputs')
+            self.assertEqual(outputs[0],{'path':'a','img':'A'})
+            self.assertIsNone(outputs[1])
+            self.assertEqual(outputs[2],{'path':'c','img':'C'})
+        finally:
+            imgtools.image_readers.pop('fake')
+
+    @unittest.skipIf(h5py is None,'h5py is not installed')
+    def test_hdf5_batch(self):
+        dirpath = tempfile.mkdtemp()
+        try:
+            path = os.path.join(dirpath,'stack.h5')
+            frames = np.random.rand(6,4,4)
+            h5tools.append_frames(path,'entry/data/data',frames)
+            self.wfman.add_wf('batch_wf')
+            batch_wf = self.wfman.workflows['batch_wf']
+            for op_tag in ['ident_i','ident']:
+                ident = Identity()
+                ident.load_defaults()
+                batch_wf.set_item(op_tag,ident)
+            batch_wf.connect_wf_input('i','ident_i.inputs.data')
+            batch_wf.connect_wf_input('frame','ident.inputs.data')
+            batch_wf.connect_wf_output('i','ident_i.outputs.data')
+            batch_wf.connect_wf_output('img','ident.outputs.data')
+            batch = BatchFromHDF5Stack()
+            batch.load_defaults()
+            self.wf.set_item('batch',batch)
+            for name,val in [('file_path',path),('frames','1::2'),('input_name','i'),('data_input_name','frame')]:
+                self.wf.set_input_locator('batch',name,opmod.InputLocator(opmod.auto_type,val))
+            self.wf.set_input_locator('batch','workflow',opmod.InputLocator(opmod.entire_workflow,'batch_wf'))
+            self.wf.execute_op('batch')
+            outputs = self.wf.get_data_from_uri('batch.outputs.batch_outputs')
+            self.assertEqual(len(outputs),3)
+            for out,idx in zip(outputs,[1,3,5]):
+                self.assertEqual(out['i'],idx)
+                self.assertTrue(np.array_equal(out['img'],frames[idx]))
+        finally:
+            h5tools.close_h5()
+            shutil.rmtree(dirpath)
+
+    def test_finish_op_reindexes_changes(self):
+        ident = Identity()
+        ident.load_defaults()
+        self.wf.set_item('ident',ident)
+        self.wf.set_input_locator('ident','data',opmod.InputLocator(opmod.auto_type,{'p':1,'q':2}))
+        self.wf.execute_op('ident')
+        self.assertEqual(self.wf.get_from_uri('ident.outputs.data').n_children(),2)
+        self.assertEqual(ident.outputs.changed_keys,set())
+        self.wf.set_input_locator('ident','data',opmod.InputLocator(opmod.auto_type,[5]))
+        self.wf.execute_op('ident')
+        self.assertEqual(self.wf.get_data_from_uri('ident.outputs.data.0'),5)
+        self.assertEqual(self.wf.get_from_uri('ident.outputs.data').n_children(),1)
+
+    def test_result_cache(self):
+        self.wf.set_result_cache(wftools.ResultCache(max_bytes=10000))
+        counter = CountRuns()
+        counter.load_defaults()
+        self.wf.set_item('counter',counter)
+        CountRuns.n_runs = 0
+        for x in [np.arange(10),np.arange(10),np.arange(11),np.arange(10)]:
+            self.wf.set_input_locator('counter','x',opmod.InputLocator(opmod.auto_type,x))
+            self.wf.execute_op('counter')
+            self.assertTrue(np.array_equal(counter.outputs['y'],x))
+        self.assertEqual(CountRuns.n_runs,2)
+        # outputs bigger than the cache are never stored
+        self.wf.set_input_locator('counter','x',opmod.InputLocator(opmod.auto_type,np.zeros(2000)))
+        self.wf.execute_op('counter')
+        self.wf.execute_op('counter')
+        self.assertEqual(CountRuns.n_runs,4)
+        self.assertLessEqual(self.wf.result_cache.n_bytes,10000)
+
+    def test_realtime(self):
+        dirpath = tempfile.mkdtemp()
+        try:
+            for i in range(3):
+                with open(os.path.join(dirpath,'f{}.tif'.format(i)),'w') as f:
+                    f.write('x')
+            self.wfman.add_wf('rt_wf')
+            rt_wf = self.wfman.workflows['rt_wf']
+            ident = Identity()
+            ident.load_defaults()
+            rt_wf.set_item('ident',ident)
+            rt_wf.connect_wf_input('x','ident.inputs.data')
+            rt_wf.connect_wf_output('y','ident.outputs.data')
+            rt = RealtimeFromFiles()
+            rt.load_defaults()
+            self.wf.set_item('rt',rt)
+            for name,val in [('dir_path',dirpath),('input_name','x'),('new_files_only',False),
+                ('max_files',3),('idle_timeout',5.),('settle_time',0.05)]:
+                self.wf.set_input_locator('rt',name,opmod.InputLocator(opmod.auto_type,val))
+            self.wf.set_input_locator('rt','workflow',opmod.InputLocator(opmod.entire_workflow,'rt_wf'))
+            self.wf.execute_op('rt')
+            outputs = self.wf.get_data_from_uri('rt.outputs.realtime_outputs')
+            self.assertEqual(sorted([d['y'] for d in outputs]),
+            [os.path.join(dirpath,'f{}.tif'.format(i)) for i in range(3)])
+            metrics = self.wf.get_data_from_uri('rt.outputs.metrics')
+            self.assertEqual(metrics['n_processed'],3)
+            self.assertEqual(metrics['n_dropped'],0)
+            # only the latest max_outputs results are kept
+            self.wf.set_input_locator('rt','max_outputs',opmod.InputLocator(opmod.auto_type,2))
+            self.wf.execute_op('rt')
+            self.assertEqual(len(self.wf.get_data_from_uri('rt.outputs.realtime_outputs')),2)
+            self.assertEqual(self.wf.get_data_from_uri('rt.outputs.metrics')['n_processed'],3)
+        finally:
+            shutil.rmtree(dirpath)
+
+    def test_realtime_stop(self):
+        dirpath = tempfile.mkdtemp()
+        try:
+            self.wfman.add_wf('rt_wf')
+            rt_wf = self.wfman.workflows['rt_wf']
+            ident = Identity()
+            ident.load_defaults()
+            rt_wf.set_item('ident',ident)
+            rt_wf.connect_wf_input('x','ident.inputs.data')
+            rt_wf.connect_wf_output('y','ident.outputs.data')
+            rt = RealtimeFromFiles()
+            rt.load_defaults()
+            rt.inputs.update(dir_path=dirpath,input_name='x',workflow=rt_wf,idle_timeout=60.)
+            runner = threading.Thread(target=rt.run)
+            runner.start()
+            time.sleep(0.2)
+            t0 = time.time()
+            rt.stop()
+            runner.join(5.)
+            self.assertFalse(runner.is_alive())
+            self.assertLess(time.time()-t0,2.)
+            self.assertEqual(rt.outputs['metrics']['n_processed'],0)
+        finally:
+            shutil.rmtree(dirpath)
+
+    def test_realtime_setup_error(self):
+        dirpath = tempfile.mkdtemp()
+        try:
+            self.wfman.add_wf('rt_wf')
+            rt_wf = self.wfman.workflows['rt_wf']
+            rt = RealtimeFromFiles()
+            rt.load_defaults()
+            rt.inputs.update(dir_path=dirpath,input_name='x',workflow=rt_wf,backpressure='bogus')
+            with self.assertRaises(ValueError):
+                rt.run()
+            # the file feed is closed
+            self.assertEqual([th for th in threading.enumerate() if th.name == 'ReadyFileFeed'],[])
+        finally:
+            shutil.rmtree(dirpath)
+
+    def test_backpressure_policies(self):
+        q = rtmod.BoundedQueue(2,rtmod.drop_oldest_policy)
+        for i in range(5):
+            q.put(i)
+        self.assertEqual([q.get(0),q.get(0)],[3,4])
+        self.assertEqual(q.n_dropped,3)
+        q = rtmod.BoundedQueue(4,rtmod.latest_policy)
+        for i in range(3):
+            q.put(i)
+        self.assertEqual(q.get(0),2)
+        self.assertEqual(q.depth(),0)
+        self.assertEqual(q.n_dropped,2)
+        q = rtmod.BoundedQueue(1,rtmod.block_policy)
+        q.put(0)
+        t0 = time.time()
+        consumer = threading.Timer(0.2,q.get)
+        consumer.start()
+        q.put(1)
+        self.assertGreater(time.time()-t0,0.15)
+        self.assertEqual(q.get(0),1)
+        self.assertEqual(q.n_dropped,0)
+
+if __name__ == '__main__':
+    unittest.main()
+